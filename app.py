@@ -1,10 +1,56 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import urllib.parse
+import hashlib
+import os
+import time
 from io import BytesIO
 import plotly.express as px
 import plotly.graph_objects as go
 
+from calculo import (
+    CAMPOS_CUSTOS,
+    PARAMETROS_MAPEAVEIS,
+    PRESETS_BENEFICIOS,
+    REGIMES,
+    calcular_custos_cache,
+    componentes_rotulados,
+    estatisticas_cache_custos,
+)
+from cenarios import encontrar_cruzamentos, varrer_cenarios
+from cubo import montar_cubo
+from equilibrio import salario_bruto_para_liquido, salario_maximo_para_margem
+from historico import HistoricoCalculos
+from incremental import CalculoIncremental
+from instrumentacao import encerrar, etapa, iniciar
+from projecao import MES_DISSIDIO_PADRAO, MESES_PROJECAO_PADRAO, projetar_planilha, resumo_anual, tabela_mensal
+from processamento import (
+    COLUNA_ABA,
+    COLUNA_ARQUIVO,
+    FORMATOS_EXPORTACAO,
+    LIMITE_DOWNLOAD_DETALHAMENTO,
+    LIMITE_GRUPOS_GRAFICO,
+    MIME_XLSX,
+    TAMANHO_BLOCO_PADRAO,
+    TAMANHOS_PAGINA,
+    estatisticas_cache_leitura,
+    exportar_excel,
+    exportar_relatorio,
+    exportar_tabela,
+    ler_blocos_de_varios,
+    ler_planilhas,
+    medir_speedup,
+    pagina,
+    processar_paralelo,
+    processar_para_temporario,
+    top_n_com_outros,
+)
+from sensibilidade import ENTRADAS_SENSIBILIDADE, SAIDAS_SENSIBILIDADE, resumo_sensibilidades, sensibilidades_planilha, tabela_sensibilidades
+from simulacao import Incerteza, Incertezas, simular_planilha
+from tabelas import ANO_PADRAO, TABELAS_TRIBUTARIAS, obter_tabela
+from tarefas import CONCLUIDA, EXECUTANDO, NA_FILA, FilaTarefas, calcular_planilha_tarefa, processar_arquivo_tarefa
+
 # ---------------- CONFIGURAÇÃO ----------------
 st.set_page_config(
     page_title="Calculadora Expert de Custo de Funcionário",
@@ -12,43 +58,6 @@ st.set_page_config(
     layout="wide"
 )
 
-# ---------------- CONSTANTES ----------------
-TETO_INSS_2025 = 8157.41
-SALARIO_MINIMO_2025 = 1518.00
-
-# Presets de benefícios por área
-PRESETS_BENEFICIOS = {
-    "Personalizado": {},
-    "Tech/TI": {
-        "vr": 800,
-        "va": 400,
-        "saude": 450,
-        "odonto": 80,
-        "home": 200
-    },
-    "Comercial": {
-        "vr": 600,
-        "va": 300,
-        "saude": 350,
-        "odonto": 60,
-        "home": 0
-    },
-    "Operacional": {
-        "vr": 550,
-        "va": 250,
-        "saude": 300,
-        "odonto": 50,
-        "home": 0
-    },
-    "Administrativo": {
-        "vr": 650,
-        "va": 350,
-        "saude": 400,
-        "odonto": 70,
-        "home": 100
-    }
-}
-
 # ---------------- CSS ----------------
 st.markdown("""
 <style>
@@ -74,130 +83,102 @@ div[data-testid="stMetric"]:hover {
 </style>
 """, unsafe_allow_html=True)
 
-# ---------------- FUNÇÕES AUXILIARES ----------------
+# ---------------- CACHE DA PLANILHA ----------------
+@st.cache_data(max_entries=8, show_spinner=False)
+def calcular_planilha(hash_arquivo, coluna_salario, coluna_grupo, parametros, colunas_parametros, n_workers, _df_input):
+    """
+    Detalhamento e relatório consolidado, reaproveitados por conteúdo do arquivo e parâmetros.
+
+    Sem workers o cálculo é serial, mas nas mesmas partições do paralelo:
+    as somas por grupo seguem a mesma ordem e o resultado é idêntico.
+    """
+    return processar_paralelo(
+        _df_input, coluna_salario, coluna_grupo, parametros, n_workers or 1, colunas_parametros=colunas_parametros
+    )
+
+# ---------------- TAREFAS EM SEGUNDO PLANO ----------------
+@st.cache_resource
+def fila_de_tarefas():
+    """Uma fila por servidor: limita os cálculos simultâneos de todas as sessões"""
+    return FilaTarefas()
+
+
+def tarefas_acompanhadas():
+    """Ids das tarefas desta aba do navegador; ficam na URL para sobreviver a um refresh"""
+    return st.query_params.get_all("tarefa")
 
-def calcular_inss_funcionario(salario):
-    """Calcula INSS progressivo do funcionário"""
-    faixas = [
-        (1412.00, 0.075),
-        (2666.68, 0.09),
-        (4000.03, 0.12),
-        (TETO_INSS_2025, 0.14)
+
+def downloads_da_tarefa(dados):
+    """Botões de download do resultado de calcular_planilha_tarefa/processar_arquivo_tarefa"""
+    if dados["df_final"] is not None:
+        rotulo_formato, extensao, mime = FORMATOS_EXPORTACAO[dados["formato"]]
+        return [(
+            f"📥 Baixar Relatório Completo — {rotulo_formato}",
+            dados["exportacao"], "relatorio_custos_funcionarios" + extensao, mime
+        )]
+    return [
+        ("📥 Baixar Relatório Consolidado (Excel)",
+         dados["exportacao"], "relatorio_custos_funcionarios.xlsx", MIME_XLSX),
     ]
-    
-    inss = 0
-    salario_restante = salario
-    
-    for i, (limite, aliquota) in enumerate(faixas):
-        base_anterior = faixas[i-1][0] if i > 0 else 0
-        base_calculo = min(salario_restante, limite - base_anterior)
-        
-        if base_calculo > 0:
-            inss += base_calculo * aliquota
-            salario_restante -= base_calculo
-    
-    return min(inss, TETO_INSS_2025 * 0.14)
 
-def calcular_irrf(salario, dependentes=0):
-    """Calcula IRRF"""
-    inss = calcular_inss_funcionario(salario)
-    base = salario - inss - (dependentes * 189.59)
-    
-    if base <= 2259.20:
-        return 0
-    elif base <= 2826.65:
-        return base * 0.075 - 169.44
-    elif base <= 3751.05:
-        return base * 0.15 - 381.44
-    elif base <= 4664.68:
-        return base * 0.225 - 662.77
-    else:
-        return base * 0.275 - 896.00
 
-# ---------------- FUNÇÃO DE CÁLCULO ----------------
-def calcular_custos(salario, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0):
-    custos = {}
-    
-    if "CLT" in regime:
-        # Provisões
-        decimo = salario / 12 if incluir else 0
-        ferias = (salario / 12) + (salario / 3 / 12) if incluir else 0
-        
-        # FGTS
-        fgts = salario * 0.08
-        multa = fgts * 0.40
-
-        # Vale Transporte
-        vt_total = (n_pass * v_pass) * 22
-        desc_max = salario * 0.06
-        desc_real = min(vt_total, desc_max)
-        vt = max(0, vt_total - desc_real)
-
-        # INSS e Encargos
-        inss = 0
-        rat = 0
-        terceiros = 0
-        
-        if regime == "CLT (Lucro Presumido/Real)":
-            base_inss = min(salario, TETO_INSS_2025)
-            inss = base_inss * 0.20
-            rat = base_inss * (rat_perc / 100)
-            terceiros = base_inss * (terceiros_perc / 100)
-
-        custos = {
-            "13º Salário (Provisão Mensal)": decimo,
-            "Férias + 1/3 (Provisão Mensal)": ferias,
-            "FGTS Mensal (8%)": fgts,
-            "Provisão Multa FGTS (40%)": multa,
-            "INSS Patronal (20%)": inss,
-            f"RAT ({rat_perc}%)": rat,
-            f"Terceiros/Sistema S ({terceiros_perc}%)": terceiros,
-            "Vale Transporte (Custo Empresa)": vt,
-            "Vale Refeição": vr,
-            "Vale Alimentação": va,
-            "Plano de Saúde": saude,
-            "Plano Odontológico": odonto,
-            "Seguro de Vida": seguro,
-            "Auxílio Home Office": home,
-            "Equipamentos/EPI": epi,
-            "Outros Custos": outros,
-        }
-        
-        # Calcular salário líquido
-        inss_func = calcular_inss_funcionario(salario)
-        irrf_func = calcular_irrf(salario, dependentes)
-        salario_liquido = salario - inss_func - irrf_func - desc_real
-        
-        custos["_salario_liquido"] = salario_liquido
-        custos["_inss_funcionario"] = inss_func
-        custos["_irrf_funcionario"] = irrf_func
-        custos["_desconto_vt"] = desc_real
-
-    else:  # PJ
-        custos = {
-            "Valor Nota Fiscal (PJ)": salario,
-            "Vale Refeição": vr,
-            "Vale Alimentação": va,
-            "Plano de Saúde": saude,
-            "Plano Odontológico": odonto,
-            "Seguro de Vida": seguro,
-            "Auxílio Home Office": home,
-            "Equipamentos": epi,
-            "Outros Custos": outros,
-            "_salario_liquido": salario * 0.85,  # Estimativa
-        }
-
-    total = sum([v for k, v in custos.items() if not k.startswith("_")])
-    
-    if "CLT" in regime:
-        total_sem_salario = total - salario
-    else:
-        total_sem_salario = total
-    
-    custos["Custo Total Mensal"] = total_sem_salario
-    custos["Custo Total Anual"] = total_sem_salario * 12
+def botao_detalhamento(arquivo, chave=None):
+    """
+    Download do detalhamento do modo streaming (CSV gzip em disco).
+
+    O arquivo só é lido no clique e só é oferecido até
+    LIMITE_DOWNLOAD_DETALHAMENTO: o navegador recebe o arquivo inteiro da
+    memória do servidor. Acima disso, aponta para a CLI.
+    """
+    if arquivo.closed:
+        return
+    tamanho = os.fstat(arquivo.fileno()).st_size
+    if tamanho > LIMITE_DOWNLOAD_DETALHAMENTO:
+        st.info(
+            f"📄 O detalhamento compactado tem {tamanho / 2**20:,.1f} MB, acima do limite de "
+            f"{LIMITE_DOWNLOAD_DETALHAMENTO / 2**20:,.0f} MB para baixar pelo navegador. Para gravá-lo "
+            "direto em disco, use a linha de comando: `python cli.py planilha.csv -o detalhamento.csv "
+            "--coluna-salario ... --coluna-grupo ... --streaming`"
+        )
+        return
+
+    def ler():
+        arquivo.seek(0)
+        return arquivo.read()
 
-    return custos
+    st.download_button(
+        f"📥 Baixar Detalhamento (CSV gzip, {tamanho / 2**20:,.1f} MB)", ler,
+        "detalhamento_custos_funcionarios.csv.gz", mime="application/gzip", key=chave
+    )
+
+
+def guardar_resultado(resultado):
+    """Troca o resultado da sessão, fechando o detalhamento temporário do anterior (se não for de uma tarefa)"""
+    anterior = st.session_state.get("resultado_planilha")
+    if anterior is not None and anterior.get("detalhamento") is not None and not anterior.get("de_tarefa"):
+        anterior["detalhamento"].close()
+    st.session_state["resultado_planilha"] = resultado
+
+# ---------------- HISTÓRICO ----------------
+@st.cache_resource
+def historico_de_calculos():
+    """Um banco de histórico por servidor, compartilhado entre as sessões"""
+    return HistoricoCalculos()
+
+# ---------------- TABELAS GRANDES ----------------
+def mostrar_paginado(df, chave, hide_index=False):
+    """Mostra `df` uma página por vez: só as linhas da página vão para o navegador"""
+    if len(df) <= TAMANHOS_PAGINA[0]:
+        st.dataframe(df, use_container_width=True, hide_index=hide_index)
+        return
+
+    c1, c2, c3 = st.columns([1, 1, 2])
+    tamanho = c1.selectbox("Linhas por página", TAMANHOS_PAGINA, key=f"{chave}_tamanho")
+    numero = c2.number_input("Página", min_value=1, value=1, step=1, key=chave)
+    trecho, numero, total_paginas = pagina(df, numero, tamanho)
+    inicio = (numero - 1) * tamanho
+    c3.caption(f"Página {numero} de {total_paginas} · linhas {inicio + 1:,} a {inicio + len(trecho):,} de {len(df):,}")
+    st.dataframe(trecho, use_container_width=True, hide_index=hide_index)
 
 # ---------------- SIDEBAR ----------------
 with st.sidebar:
@@ -221,12 +202,12 @@ with st.sidebar:
 
     with st.expander("📌 Dados Contratuais", expanded=True):
         salario = st.number_input("Salário Bruto (R$)", value=3000.0, min_value=0.0, step=100.0)
-        regime = st.selectbox("Regime",
-                              ["CLT (Simples Nacional)",
-                               "CLT (Lucro Presumido/Real)",
-                               "PJ"])
+        regime = st.selectbox("Regime", REGIMES)
         incluir = st.checkbox("Provisionar Férias e 13º", True)
         dependentes = st.number_input("Número de Dependentes (IR)", value=0, min_value=0, max_value=10)
+        anos_tabela = list(TABELAS_TRIBUTARIAS)
+        ano = st.selectbox("Tabela Tributária (ano)", anos_tabela, index=anos_tabela.index(ANO_PADRAO))
+        tabela = obter_tabela(ano)
 
     # Preset de benefícios
     with st.expander("🎁 Benefícios"):
@@ -242,7 +223,7 @@ with st.sidebar:
         with st.expander("🏭 Encargos Específicos"):
             rat_perc = st.number_input("RAT - Risco Ambiental (%)", value=2.0, min_value=1.0, max_value=3.0, step=0.5)
             terceiros_perc = st.number_input("Terceiros/Sistema S (%)", value=5.8, min_value=0.0, max_value=10.0, step=0.1)
-            st.info(f"💡 Teto INSS 2025: R$ {TETO_INSS_2025:,.2f}")
+            st.info(f"💡 Teto INSS {ano}: R$ {tabela.teto_inss:,.2f}")
 
     with st.expander("🚌 Transporte e Alimentação"):
         if preset_selecionado != "Personalizado":
@@ -277,17 +258,34 @@ with st.sidebar:
         epi = st.number_input("EPI/Equipamentos (R$)", value=0.0, min_value=0.0)
         outros = st.number_input("Outros Custos (R$)", value=0.0, min_value=0.0)
 
+    with st.expander("🩺 Diagnóstico de desempenho"):
+        diagnostico = st.toggle(
+            "Medir etapas desta execução",
+            help="Tempo, chamadas e pico de memória de leitura, cálculo, concat, groupby, gráfico e exportação"
+        )
+        memoria_diagnostico = st.checkbox("Medir pico de memória", disabled=not diagnostico,
+                                          help="Usa tracemalloc, que deixa o processamento bem mais lento")
+        amostragem_diagnostico = int(st.number_input(
+            "Medir 1 a cada N chamadas de calcular_custos", value=100, min_value=0, disabled=not diagnostico,
+            help="0 = só contar as chamadas"
+        ))
+
     st.write("---")
     
     msg = urllib.parse.quote("Olá Rodrigo! Gostaria de validar a calculadora.")
     st.markdown(f"[💬 WhatsApp](https://wa.me/11977019335?text={msg})")
 
+# ---------------- INSTRUMENTAÇÃO ----------------
+# Vale só para esta execução do script; desligada, cada ponto medido custa uma leitura de ContextVar
+encerrar()
+coletor_diagnostico = iniciar(memoria_diagnostico, amostragem_diagnostico) if diagnostico else None
+
 # ---------------- VALIDAÇÕES E ALERTAS ----------------
-if salario > 0 and salario < SALARIO_MINIMO_2025:
-    st.warning(f"⚠️ Atenção: Salário abaixo do mínimo nacional (R$ {SALARIO_MINIMO_2025:,.2f})")
+if salario > 0 and salario < tabela.salario_minimo:
+    st.warning(f"⚠️ Atenção: Salário abaixo do mínimo nacional (R$ {tabela.salario_minimo:,.2f})")
 
-if regime == "CLT (Lucro Presumido/Real)" and salario > TETO_INSS_2025:
-    st.info(f"ℹ️ Salário acima do teto. INSS patronal calculado sobre R$ {TETO_INSS_2025:,.2f}")
+if regime == "CLT (Lucro Presumido/Real)" and salario > tabela.teto_inss:
+    st.info(f"ℹ️ Salário acima do teto. INSS patronal calculado sobre R$ {tabela.teto_inss:,.2f}")
 
 custo_vt_mensal = (n_pass * v_pass) * 22
 if custo_vt_mensal > salario * 0.06 and salario > 0:
@@ -302,37 +300,34 @@ with tab1:
 
     st.subheader(f"Análise de Custo: {regime}")
 
-    res = calcular_custos(
+    res = calcular_custos_cache(
         salario, regime, incluir,
         n_pass, v_pass, vr, va,
         saude, odonto, seguro,
         home, epi, outros,
-        rat_perc, terceiros_perc, dependentes
+        rat_perc, terceiros_perc, dependentes, ano
     )
 
     # Métricas principais
     c1, c2, c3, c4 = st.columns(4)
 
     c1.metric("💼 Salário Bruto", f"R$ {salario:,.2f}")
-    c2.metric("💵 Salário Líquido", f"R$ {res['_salario_liquido']:,.2f}")
-    c3.metric("💰 Custo Total Mensal", f"R$ {res['Custo Total Mensal']:,.2f}")
+    c2.metric("💵 Salário Líquido", f"R$ {res.salario_liquido:,.2f}")
+    c3.metric("💰 Custo Total Mensal", f"R$ {res.custo_mensal:,.2f}")
     
-    mult = res['Custo Total Mensal'] / salario if salario else 0
+    mult = res.custo_mensal / salario if salario else 0
     c4.metric("📊 Multiplicador", f"{mult:.2f}x")
 
     st.write("")
     
+    componentes = componentes_rotulados(res, regime, rat_perc, terceiros_perc)
+
     # Gráfico de Pizza
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        df_grafico = pd.DataFrame(res.items(), columns=["Descrição", "Valor"])
-        df_grafico = df_grafico[
-            (df_grafico["Valor"] > 0) & 
-            (~df_grafico["Descrição"].str.contains("Total")) &
-            (~df_grafico["Descrição"].str.startswith("_")) &
-            (df_grafico["Descrição"] != "Salário Base")
-        ]
+        df_grafico = pd.DataFrame(componentes, columns=["Descrição", "Valor"])
+        df_grafico = df_grafico[df_grafico["Valor"] > 0]
         
         if not df_grafico.empty:
             fig = px.pie(
@@ -351,19 +346,19 @@ with tab1:
         st.markdown("### 📋 Resumo Fiscal")
         
         if "CLT" in regime:
-            st.metric("INSS Funcionário", f"R$ {res.get('_inss_funcionario', 0):,.2f}")
-            st.metric("IRRF", f"R$ {res.get('_irrf_funcionario', 0):,.2f}")
-            st.metric("Desconto VT", f"R$ {res.get('_desconto_vt', 0):,.2f}")
+            st.metric("INSS Funcionário", f"R$ {res.inss_funcionario:,.2f}")
+            st.metric("IRRF", f"R$ {res.irrf_funcionario:,.2f}")
+            st.metric("Desconto VT", f"R$ {res.desconto_vt:,.2f}")
             
-            total_descontos = res.get('_inss_funcionario', 0) + res.get('_irrf_funcionario', 0) + res.get('_desconto_vt', 0)
+            total_descontos = res.inss_funcionario + res.irrf_funcionario + res.desconto_vt
             st.metric("Total Descontos", f"R$ {total_descontos:,.2f}", delta=f"-{(total_descontos/salario*100):.1f}%")
 
     # Tabela detalhada
     st.subheader("📑 Detalhamento de Custos")
-    df = pd.DataFrame(res.items(), columns=["Descrição", "Valor"])
-    df = df[(df["Valor"] > 0) & (~df["Descrição"].str.contains("Total")) & (~df["Descrição"].str.startswith("_"))]
+    df = pd.DataFrame(componentes, columns=["Descrição", "Valor"])
+    df = df[df["Valor"] > 0]
     
-    df["Percentual"] = df["Valor"].apply(lambda x: f"{(x/res['Custo Total Mensal']*100):.1f}%" if res['Custo Total Mensal'] > 0 else "0%")
+    df["Percentual"] = df["Valor"].apply(lambda x: f"{(x/res.custo_mensal*100):.1f}%" if res.custo_mensal > 0 else "0%")
     df["Valor"] = df["Valor"].apply(lambda x: f"R$ {x:,.2f}")
     
     st.dataframe(df, use_container_width=True, hide_index=True)
@@ -374,54 +369,50 @@ with tab2:
     
     col1, col2, col3 = st.columns(3)
     
-    regimes_comparar = [
-        "CLT (Simples Nacional)",
-        "CLT (Lucro Presumido/Real)",
-        "PJ"
-    ]
+    regimes_comparar = list(REGIMES)
     
     resultados_comp = {}
     
     for idx, reg in enumerate(regimes_comparar):
-        resultados_comp[reg] = calcular_custos(
+        resultados_comp[reg] = calcular_custos_cache(
             salario, reg, incluir,
             n_pass, v_pass, vr, va,
             saude, odonto, seguro,
             home, epi, outros,
-            rat_perc, terceiros_perc, dependentes
+            rat_perc, terceiros_perc, dependentes, ano
         )
     
     with col1:
         st.markdown("### 🟢 CLT Simples")
         r1 = resultados_comp["CLT (Simples Nacional)"]
-        st.metric("Custo Mensal", f"R$ {r1['Custo Total Mensal']:,.2f}")
-        st.metric("Custo Anual", f"R$ {r1['Custo Total Anual']:,.2f}")
-        st.metric("Multiplicador", f"{(r1['Custo Total Mensal']/salario):.2f}x")
-        st.metric("Salário Líquido", f"R$ {r1['_salario_liquido']:,.2f}")
+        st.metric("Custo Mensal", f"R$ {r1.custo_mensal:,.2f}")
+        st.metric("Custo Anual", f"R$ {r1.custo_anual:,.2f}")
+        st.metric("Multiplicador", f"{(r1.custo_mensal/salario):.2f}x")
+        st.metric("Salário Líquido", f"R$ {r1.salario_liquido:,.2f}")
     
     with col2:
         st.markdown("### 🟡 CLT LP/Real")
         r2 = resultados_comp["CLT (Lucro Presumido/Real)"]
-        st.metric("Custo Mensal", f"R$ {r2['Custo Total Mensal']:,.2f}")
-        st.metric("Custo Anual", f"R$ {r2['Custo Total Anual']:,.2f}")
-        st.metric("Multiplicador", f"{(r2['Custo Total Mensal']/salario):.2f}x")
-        st.metric("Salário Líquido", f"R$ {r2['_salario_liquido']:,.2f}")
+        st.metric("Custo Mensal", f"R$ {r2.custo_mensal:,.2f}")
+        st.metric("Custo Anual", f"R$ {r2.custo_anual:,.2f}")
+        st.metric("Multiplicador", f"{(r2.custo_mensal/salario):.2f}x")
+        st.metric("Salário Líquido", f"R$ {r2.salario_liquido:,.2f}")
     
     with col3:
         st.markdown("### 🔵 PJ")
         r3 = resultados_comp["PJ"]
-        st.metric("Custo Mensal", f"R$ {r3['Custo Total Mensal']:,.2f}")
-        st.metric("Custo Anual", f"R$ {r3['Custo Total Anual']:,.2f}")
-        st.metric("Multiplicador", f"{(r3['Custo Total Mensal']/salario):.2f}x")
-        st.metric("Valor Líquido (est.)", f"R$ {r3['_salario_liquido']:,.2f}")
+        st.metric("Custo Mensal", f"R$ {r3.custo_mensal:,.2f}")
+        st.metric("Custo Anual", f"R$ {r3.custo_anual:,.2f}")
+        st.metric("Multiplicador", f"{(r3.custo_mensal/salario):.2f}x")
+        st.metric("Valor Líquido (est.)", f"R$ {r3.salario_liquido:,.2f}")
     
     # Gráfico comparativo
     st.subheader("📊 Comparativo Visual")
     
     df_comp = pd.DataFrame({
         'Regime': regimes_comparar,
-        'Custo Mensal': [r1['Custo Total Mensal'], r2['Custo Total Mensal'], r3['Custo Total Mensal']],
-        'Custo Anual': [r1['Custo Total Anual'], r2['Custo Total Anual'], r3['Custo Total Anual']]
+        'Custo Mensal': [r1.custo_mensal, r2.custo_mensal, r3.custo_mensal],
+        'Custo Anual': [r1.custo_anual, r2.custo_anual, r3.custo_anual]
     })
     
     fig = go.Figure()
@@ -444,7 +435,7 @@ with tab2:
     st.plotly_chart(fig, use_container_width=True)
     
     # Análise de economia
-    custos = [r1['Custo Total Mensal'], r2['Custo Total Mensal'], r3['Custo Total Mensal']]
+    custos = [r1.custo_mensal, r2.custo_mensal, r3.custo_mensal]
     menor_custo = min(custos)
     regime_economico = regimes_comparar[custos.index(menor_custo)]
     
@@ -454,6 +445,59 @@ with tab2:
         economia_anual = (custos[0] - menor_custo) * 12
         st.info(f"💰 Economia anual potencial: R$ {economia_anual:,.2f} em relação ao CLT Simples")
 
+    # -------- VARREDURA DE CENÁRIOS --------
+    with st.expander("🧮 Varredura de Cenários (salário × regime × preset)"):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            faixa_salarial = st.slider("Faixa salarial (R$)", 0, 50000, (1500, 30000), step=500)
+            pontos_salario = st.number_input("Pontos na faixa salarial", value=2000, min_value=2, max_value=200000, step=500)
+        with c2:
+            presets_grade = st.multiselect("Presets de benefícios", list(PRESETS_BENEFICIOS), default=list(PRESETS_BENEFICIOS))
+        with c3:
+            rats_grade = st.multiselect("RAT (%)", [1.0, 1.5, 2.0, 2.5, 3.0], default=[rat_perc] if rat_perc in [1.0, 1.5, 2.0, 2.5, 3.0] else [2.0])
+            terceiros_grade = st.multiselect("Terceiros (%)", [0.0, 2.5, 5.8], default=[5.8])
+
+        if st.button("Executar varredura") and presets_grade and rats_grade and terceiros_grade:
+            inicio_grade = time.perf_counter()
+            grade = varrer_cenarios(
+                np.linspace(faixa_salarial[0], faixa_salarial[1], int(pontos_salario)),
+                presets=presets_grade, rat_percs=rats_grade, terceiros_percs=terceiros_grade,
+                incluir=incluir, n_pass=n_pass, v_pass=v_pass,
+                seguro=seguro, epi=epi, outros=outros,
+                dependentes=dependentes, ano=ano,
+                personalizados={"vr": vr, "va": va, "saude": saude, "odonto": odonto, "home": home}
+            )
+            cruzamentos = encontrar_cruzamentos(grade)
+            st.caption(f"{len(grade):,} cenários avaliados em {time.perf_counter() - inicio_grade:.2f}s")
+
+            st.markdown("**Salários em que dois regimes trocam de posição**")
+            if cruzamentos.empty:
+                st.info("A ordem dos regimes, do mais barato ao mais caro, é a mesma em toda a faixa salarial.")
+            else:
+                st.dataframe(cruzamentos, use_container_width=True, hide_index=True)
+
+            # Curvas de custo do primeiro preset/RAT/Terceiros selecionados
+            curva = grade[
+                (grade["Preset"] == presets_grade[0]) &
+                (grade["RAT (%)"] == rats_grade[0]) &
+                (grade["Terceiros (%)"] == terceiros_grade[0])
+            ]
+            fig = px.line(
+                curva, x="Salário", y="Custo Total Mensal", color="Regime",
+                title=f"Custo Mensal por Salário — {presets_grade[0]}"
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+
+            grade_csv = BytesIO()
+            exportar_tabela(grade, grade_csv, "csv.gz")
+            st.download_button(
+                "📥 Baixar grade de cenários (CSV gzip)",
+                grade_csv.getvalue(),
+                "cenarios_regimes.csv.gz",
+                mime="application/gzip"
+            )
+
 # ---------------- BREAK-EVEN ----------------
 with tab3:
     st.subheader("💹 Análise de Ponto de Equilíbrio")
@@ -469,7 +513,7 @@ with tab3:
     
     if receita_hora > 0 and horas_mes > 0:
         receita_total = receita_hora * horas_mes
-        custo_total = res['Custo Total Mensal']
+        custo_total = res.custo_mensal
         lucro_bruto = receita_total - custo_total
         margem_real = (lucro_bruto / receita_total * 100) if receita_total > 0 else 0
         
@@ -537,18 +581,111 @@ with tab3:
     else:
         st.info("👆 Preencha os campos acima para calcular o ponto de equilíbrio")
 
+    # -------- SOLVER INVERSO --------
+    st.subheader("🔁 Quanto posso pagar?")
+
+    parametros_solver = (
+        incluir, n_pass, v_pass, vr, va,
+        saude, odonto, seguro, home, epi, outros,
+        rat_perc, terceiros_perc, dependentes, ano
+    )
+
+    def formatar_salario(valor):
+        if np.isnan(valor):
+            return "Inviável"
+        if np.isinf(valor):
+            return "Sem limite"
+        return f"R$ {valor:,.2f}"
+
+    col1, col2 = st.columns(2)
+    with col1:
+        receita_solver = st.number_input(
+            "Receita mensal gerada (R$)",
+            value=float(receita_hora * horas_mes), min_value=0.0, step=500.0
+        )
+    with col2:
+        liquido_desejado = st.number_input("Salário líquido desejado (R$)", value=3000.0, min_value=0.0, step=100.0)
+
+    linhas_solver = []
+    for reg in REGIMES:
+        salario_max = salario_maximo_para_margem(receita_solver, margem_desejada, reg, *parametros_solver)
+        linhas_solver.append({
+            "Regime": reg,
+            f"Salário Máximo p/ Margem {margem_desejada}%": formatar_salario(salario_max),
+            "Salário Bruto p/ Líquido Desejado": formatar_salario(
+                salario_bruto_para_liquido(liquido_desejado, reg, *parametros_solver)
+            ),
+        })
+
+    st.dataframe(pd.DataFrame(linhas_solver), use_container_width=True, hide_index=True)
+    st.caption("Calculado de forma exata sobre os segmentos lineares do custo (faixas de INSS/IRRF, teto e limite do VT)")
+
 # ---------------- PROCESSAR PLANILHA ----------------
 with tab4:
 
-    arquivo = st.file_uploader("📤 Envie sua planilha com dados dos funcionários", type=["xlsx", "csv"])
+    arquivos = st.file_uploader(
+        "📤 Envie suas planilhas com dados dos funcionários", type=["xlsx", "csv"], accept_multiple_files=True,
+        help="Vários arquivos (ex.: um por filial) entram num único cálculo e num único relatório consolidado"
+    )
+
+    if arquivos:
+        entradas = [(a.name, a) for a in arquivos]
+        nome_entrada = arquivos[0].name if len(arquivos) == 1 else f"{len(arquivos)} arquivos"
+        todas_abas = st.toggle(
+            "📑 Ler todas as abas",
+            help="Cada aba de cada XLSX (ex.: uma por departamento) entra no cálculo. Com várias planilhas ou abas, "
+                 f"as colunas \"{COLUNA_ARQUIVO}\" e \"{COLUNA_ABA}\" dizem de onde veio cada linha"
+        )
+        # Conteúdo de todos os arquivos + modo de leitura: identifica a entrada nos caches e no resultado
+        hash_entrada = hashlib.sha256(
+            b"".join(hashlib.sha256(a.getvalue()).digest() for a in arquivos) + bytes([todas_abas])
+        ).hexdigest()
+
+        modo_streaming = st.toggle(
+            "⚡ Modo streaming (arquivos grandes)",
+            help="Lê, calcula e grava a planilha em blocos, mantendo o uso de memória constante. O detalhamento "
+                 "vai para um CSV gzip em disco e só pode ser baixado pelo navegador até "
+                 f"{LIMITE_DOWNLOAD_DETALHAMENTO / 2**20:,.0f} MB compactados (o download passa pela memória); "
+                 "acima disso, use a linha de comando (cli.py --streaming)"
+        )
+        centavos_exatos = st.toggle(
+            "🪙 Centavos exatos",
+            help="Calcula cada parcela em centavos inteiros, arredondada pela sua regra (INSS faixa a faixa, "
+                 "IRRF, FGTS...), e soma o consolidado em centavos: os totais fecham centavo a centavo "
+                 "com o detalhamento"
+        )
+        # Só existem fora do streaming; com valores padrão, nenhum caminho lê um nome indefinido
+        modo_incremental = modo_paralelo = False
+        n_workers = 1
 
-    if arquivo:
-        df_input = pd.read_excel(arquivo) if arquivo.name.endswith("xlsx") else pd.read_csv(arquivo)
-        st.success(f"✅ Planilha carregada com {len(df_input)} registros")
+        if modo_streaming:
+            tamanho_bloco = st.number_input("Linhas por bloco", value=TAMANHO_BLOCO_PADRAO, min_value=1000, step=10000)
+            with etapa("leitura da planilha"):
+                df_input = next(ler_blocos_de_varios(entradas, 1000, todas_abas), pd.DataFrame())
+                for a in arquivos:
+                    a.seek(0)
+            st.success("✅ Planilha pronta para processamento em blocos")
+        else:
+            with etapa("leitura da planilha"):
+                df_input = ler_planilhas(entradas, todas_abas)
+            origem = f" de {len(arquivos)} arquivos" if len(arquivos) > 1 else ""
+            st.success(f"✅ Planilha carregada com {len(df_input)} registros{origem}")
+
+            modo_incremental = not centavos_exatos and st.toggle(
+                "♻️ Recálculo incremental",
+                help="Guarda o custo de cada parcela por funcionário e por grupo; ao mudar um parâmetro, "
+                     "recalcula só as parcelas que dependem dele (não disponível com centavos exatos)"
+            )
+            modo_paralelo = not modo_incremental and st.toggle(
+                "🧵 Processamento paralelo",
+                help="Divide a planilha em partições e calcula em vários processos; o resultado é idêntico ao serial"
+            )
+            if modo_paralelo:
+                n_workers = int(st.number_input("Processos (workers)", value=os.cpu_count() or 1, min_value=1, max_value=64))
         
         st.dataframe(df_input.head(), use_container_width=True)
 
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         
         with col1:
             coluna_salario = st.selectbox("📊 Coluna de salário", df_input.columns)
@@ -556,54 +693,211 @@ with tab4:
         with col2:
             coluna_grupo = st.selectbox("📁 Coluna para agrupar relatório", df_input.columns)
 
-        if st.button("🚀 Calcular Custos", type="primary"):
-            with st.spinner("Processando..."):
-                resultados = df_input[coluna_salario].apply(
-                    lambda x: calcular_custos(
-                        x, regime, incluir,
-                        n_pass, v_pass, vr, va,
-                        saude, odonto, seguro,
-                        home, epi, outros,
-                        rat_perc, terceiros_perc, dependentes
+        with col3:
+            formato_exportacao = st.selectbox(
+                "💾 Formato de exportação",
+                list(FORMATOS_EXPORTACAO),
+                format_func=lambda f: FORMATOS_EXPORTACAO[f][0],
+                disabled=modo_streaming,
+                help="No modo streaming o detalhamento é exportado em CSV e o consolidado em Excel"
+            )
+
+        with st.expander("🧑‍💼 Parâmetros por funcionário (colunas da planilha)"):
+            st.caption(
+                "Cada coluna escolhida substitui, linha a linha, o valor da barra lateral; "
+                "células vazias continuam usando a barra lateral."
+            )
+            opcoes_coluna = [None] + list(df_input.columns)
+            colunas_parametros = {}
+            grade_colunas = st.columns(3)
+            for i, (nome, rotulo) in enumerate(PARAMETROS_MAPEAVEIS.items()):
+                with grade_colunas[i % 3]:
+                    coluna = st.selectbox(
+                        rotulo, opcoes_coluna, key=f"coluna_{nome}",
+                        format_func=lambda c: "— barra lateral —" if c is None else c
                     )
+                if coluna is not None:
+                    colunas_parametros[nome] = coluna
+
+        parametros_lote = dict(
+            regime=regime, incluir=incluir,
+            n_pass=n_pass, v_pass=v_pass, vr=vr, va=va,
+            saude=saude, odonto=odonto, seguro=seguro,
+            home=home, epi=epi, outros=outros,
+            rat_perc=rat_perc, terceiros_perc=terceiros_perc, dependentes=dependentes,
+            ano=ano
+        )
+        if centavos_exatos:
+            parametros_lote["centavos"] = True
+
+        if modo_paralelo:
+            with st.expander("⏱️ Speed-up por número de workers"):
+                if st.button("Medir speed-up"):
+                    with st.spinner("Medindo..."):
+                        workers_teste = sorted({1, 2, 4, 8, n_workers})
+                        speedup = medir_speedup(
+                            df_input, coluna_salario, coluna_grupo, parametros_lote, workers_teste,
+                            colunas_parametros=colunas_parametros
+                        )
+                    st.dataframe(speedup, use_container_width=True, hide_index=True)
+
+        # O resultado mostrado vale só para esta combinação de arquivo, colunas e parâmetros
+        chave_resultado = (
+            hash_entrada, coluna_salario, coluna_grupo,
+            tuple(parametros_lote.items()), tuple(colunas_parametros.items())
+        )
+
+        segundo_plano = st.toggle(
+            "⏳ Calcular em segundo plano",
+            disabled=modo_incremental,
+            help="O cálculo vai para uma fila do servidor: a tela fica livre, o progresso aparece a cada bloco "
+                 "e o resultado continua disponível depois de recarregar a página"
+        )
+        calcular = st.button("🚀 Calcular Custos", type="primary")
+        if calcular and segundo_plano and not modo_incremental:
+            fila = fila_de_tarefas()
+            if modo_streaming:
+                id_tarefa = fila.enviar(
+                    processar_arquivo_tarefa, [(a.name, a.getvalue()) for a in arquivos], coluna_salario, coluna_grupo,
+                    parametros_lote, colunas_parametros, int(tamanho_bloco), todas_abas,
+                    descricao=f"{nome_entrada} por {coluna_grupo} (streaming)", metadados={"chave": chave_resultado}
+                )
+            else:
+                id_tarefa = fila.enviar(
+                    calcular_planilha_tarefa, df_input, coluna_salario, coluna_grupo, parametros_lote,
+                    colunas_parametros, formato_exportacao, n_workers,
+                    descricao=f"{nome_entrada} por {coluna_grupo} ({len(df_input):,} linhas)",
+                    metadados={"chave": chave_resultado}
                 )
+            st.query_params["tarefa"] = tarefas_acompanhadas() + [id_tarefa]
+            calcular = False
 
-                df_final = pd.concat([df_input, pd.DataFrame(list(resultados))], axis=1)
-                
-                # Remover colunas internas
-                colunas_remover = [col for col in df_final.columns if col.startswith('_')]
-                df_final = df_final.drop(columns=colunas_remover)
-                
-                st.success("✅ Cálculos concluídos!")
-                st.dataframe(df_final, use_container_width=True)
-
-                # -------- RELATÓRIO CONSOLIDADO --------
-                relatorio = (
-                    df_final
-                    .groupby(coluna_grupo)
-                    .agg({
-                        'Custo Total Mensal': 'sum',
-                        'Custo Total Anual': 'sum',
-                        coluna_salario: 'count'
-                    })
-                    .rename(columns={coluna_salario: 'Quantidade'})
-                    .reset_index()
-                    .sort_values("Custo Total Anual", ascending=False)
+        # Uma tarefa concluída desta mesma combinação vira o resultado mostrado abaixo
+        carregadas = st.session_state.setdefault("tarefas_carregadas", set())
+        for id_tarefa in tarefas_acompanhadas():
+            tarefa = fila_de_tarefas().tarefa(id_tarefa)
+            if (tarefa is not None and tarefa.estado == CONCLUIDA and id_tarefa not in carregadas
+                    and tarefa.metadados.get("chave") == chave_resultado):
+                carregadas.add(id_tarefa)
+                guardar_resultado(dict(
+                    chave=chave_resultado,
+                    df_final=tarefa.resultado["df_final"],
+                    relatorio=tarefa.resultado["relatorio"],
+                    total_funcionarios=tarefa.resultado["total_funcionarios"],
+                    downloads=downloads_da_tarefa(tarefa.resultado),
+                    detalhamento=tarefa.resultado.get("detalhamento_csv_gz"),
+                    de_tarefa=True,  # o arquivo é da tarefa: fecha quando ela for descartada
+                    recalculados=None,
+                    somas_componentes=None,
+                ))
+
+        if calcular:
+            with st.spinner("Processando..."):
+                try:
+                    detalhamento = None
+                    if modo_streaming:
+                        # Detalhamento vai direto para um CSV gzip temporário em disco
+                        relatorio, total_funcionarios, detalhamento = processar_para_temporario(
+                            ler_blocos_de_varios(entradas, int(tamanho_bloco), todas_abas),
+                            coluna_salario, coluna_grupo, parametros_lote, colunas_parametros
+                        )
+                        df_final = None
+                    elif modo_incremental:
+                        # Mesmo arquivo e colunas: reaproveita as parcelas da execução anterior
+                        chave = (
+                            hash_entrada, coluna_salario, coluna_grupo,
+                            tuple(colunas_parametros.items())
+                        )
+                        anterior = st.session_state.get("calculo_incremental")
+                        if anterior is None or anterior[0] != chave:
+                            estado_incremental = CalculoIncremental(
+                                df_input, coluna_salario, coluna_grupo, parametros_lote, colunas_parametros
+                            )
+                            st.session_state["calculo_incremental"] = (chave, estado_incremental)
+                        else:
+                            estado_incremental = anterior[1]
+                            estado_incremental.atualizar(parametros_lote)
+                        df_final = estado_incremental.detalhamento()
+                        relatorio = estado_incremental.relatorio()
+                        total_funcionarios = len(df_final)
+                    else:
+                        df_final, relatorio = calcular_planilha(
+                            hash_entrada, coluna_salario, coluna_grupo, parametros_lote, colunas_parametros,
+                            n_workers, df_input
+                        )
+                        total_funcionarios = len(df_final)
+                except ValueError as erro:
+                    st.error(f"⚠️ {erro}")
+                    st.stop()
+
+                # -------- EXPORTAÇÃO (DETALHAMENTO + CONSOLIDADO) --------
+                # Gerada uma vez por cálculo: paginar ou mexer no gráfico não refaz o arquivo
+                output = BytesIO()
+
+                if df_final is not None:
+                    rotulo_formato, extensao, mime = FORMATOS_EXPORTACAO[formato_exportacao]
+                    exportar_relatorio(output, formato_exportacao, relatorio, coluna_grupo, df_final)
+                    downloads = [(
+                        f"📥 Baixar Relatório Completo — {rotulo_formato}",
+                        output.getvalue(), "relatorio_custos_funcionarios" + extensao, mime
+                    )]
+                else:
+                    exportar_excel(output, relatorio, coluna_grupo)
+                    downloads = [
+                        ("📥 Baixar Relatório Consolidado (Excel)",
+                         output.getvalue(), "relatorio_custos_funcionarios.xlsx", MIME_XLSX),
+                    ]
+
+                incremental = modo_incremental
+                guardar_resultado(dict(
+                    chave=chave_resultado,
+                    df_final=df_final,
+                    relatorio=relatorio,
+                    total_funcionarios=total_funcionarios,
+                    downloads=downloads,
+                    detalhamento=detalhamento,
+                    recalculados=len(estado_incremental.ultimos_recalculados) if incremental else None,
+                    somas_componentes=estado_incremental.somas_por_componente() if incremental else None,
+                ))
+
+        # -------- RESULTADO --------
+        # Fica na sessão para que paginação e gráfico não recalculem a planilha
+        resultado = st.session_state.get("resultado_planilha")
+        if resultado is not None and resultado["chave"] == chave_resultado:
+            df_final = resultado["df_final"]
+            relatorio = resultado["relatorio"]
+
+            st.success("✅ Cálculos concluídos!")
+            if resultado["recalculados"] is not None:
+                st.caption(f"♻️ {resultado['recalculados']} de {len(CAMPOS_CUSTOS)} campos recalculados nesta execução")
+                with st.expander("🧩 Custo mensal por parcela e grupo"):
+                    mostrar_paginado(resultado["somas_componentes"], "pagina_componentes")
+            if df_final is not None:
+                mostrar_paginado(df_final, "pagina_detalhamento")
+
+            # -------- RELATÓRIO CONSOLIDADO --------
+            st.subheader("📊 Relatório Consolidado por " + coluna_grupo)
+            
+            # Métricas totais
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Total Funcionários", f"{resultado['total_funcionarios']}")
+            c2.metric("Custo Total Mensal", f"R$ {relatorio['Custo Total Mensal'].sum():,.2f}")
+            c3.metric("Custo Total Anual", f"R$ {relatorio['Custo Total Anual'].sum():,.2f}")
+            
+            mostrar_paginado(relatorio, "pagina_relatorio", hide_index=True)
+            
+            # Gráfico do relatório: os maiores grupos e o resto somado em "Outros"
+            n_grafico = LIMITE_GRUPOS_GRAFICO
+            if len(relatorio) > LIMITE_GRUPOS_GRAFICO:
+                n_grafico = st.slider(
+                    "Grupos no gráfico", 5, min(len(relatorio), 200), LIMITE_GRUPOS_GRAFICO,
+                    help="Os demais grupos são somados numa barra \"Outros\""
                 )
 
-                st.subheader("📊 Relatório Consolidado por " + coluna_grupo)
-                
-                # Métricas totais
-                c1, c2, c3 = st.columns(3)
-                c1.metric("Total Funcionários", f"{len(df_final)}")
-                c2.metric("Custo Total Mensal", f"R$ {relatorio['Custo Total Mensal'].sum():,.2f}")
-                c3.metric("Custo Total Anual", f"R$ {relatorio['Custo Total Anual'].sum():,.2f}")
-                
-                st.dataframe(relatorio, use_container_width=True, hide_index=True)
-                
-                # Gráfico do relatório
+            inicio = time.perf_counter()
+            with etapa("gráfico plotly"):
                 fig = px.bar(
-                    relatorio,
+                    top_n_com_outros(relatorio, coluna_grupo, n_grafico),
                     x=coluna_grupo,
                     y='Custo Total Anual',
                     title=f'Custo Anual por {coluna_grupo}',
@@ -613,30 +907,428 @@ with tab4:
                 )
                 fig.update_traces(texttemplate='R$ %{text:,.0f}', textposition='outside')
                 fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
+                tamanho_grafico = len(fig.to_json())
+            tempo_grafico = time.perf_counter() - inicio
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(
+                f"📦 Gráfico: {min(len(relatorio), n_grafico + 1)} barras para {len(relatorio)} grupos, "
+                f"{tamanho_grafico / 1024:,.1f} KB enviados ao navegador, "
+                f"montado e serializado em {tempo_grafico * 1000:,.0f} ms"
+            )
 
-                # -------- EXPORTAÇÃO EXCEL COM 2 ABAS --------
-                output = BytesIO()
+            for rotulo, dados, nome_arquivo, mime in resultado["downloads"]:
+                st.download_button(rotulo, dados, nome_arquivo, mime=mime)
+            if resultado["detalhamento"] is not None:
+                botao_detalhamento(resultado["detalhamento"])
 
-                with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                    df_final.to_excel(writer, sheet_name="Detalhamento", index=False)
-                    
-                    # Adicionar linha de total no relatório consolidado
-                    linha_total = pd.DataFrame({
-                        coluna_grupo: ['TOTAL'],
-                        'Custo Total Mensal': [relatorio['Custo Total Mensal'].sum()],
-                        'Custo Total Anual': [relatorio['Custo Total Anual'].sum()],
-                        'Quantidade': [relatorio['Quantidade'].sum()]
-                    })
-                    
-                    relatorio_com_total = pd.concat([relatorio, linha_total], ignore_index=True)
-                    relatorio_com_total.to_excel(writer, sheet_name="Consolidado", index=False)
-
-                st.download_button(
-                    "📥 Baixar Relatório Excel Completo",
-                    output.getvalue(),
-                    "relatorio_custos_funcionarios.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            # -------- SALVAR NO HISTÓRICO --------
+            with st.expander("🗂️ Salvar no histórico"):
+                h1, h2, h3 = st.columns(3)
+                competencia_historico = h1.date_input(
+                    "Competência", value=pd.Timestamp.today().replace(day=1), help="Mês de referência deste cálculo"
+                )
+                rotulo_historico = h2.text_input("Rótulo", placeholder="ex.: folha de outubro")
+                coluna_chave = h3.selectbox(
+                    "Chave do funcionário", [None] + list(df_input.columns),
+                    format_func=lambda c: "— posição da linha —" if c is None else c, disabled=df_final is None,
+                    help="Matrícula, CPF...: liga o mesmo funcionário entre execuções no histórico"
                 )
+                if df_final is None:
+                    st.caption("No modo streaming só o consolidado por grupo é salvo.")
+                if st.button("💾 Salvar no histórico"):
+                    try:
+                        id_execucao = historico_de_calculos().salvar(
+                            relatorio, coluna_grupo, parametros_lote, df_final, coluna_salario, coluna_chave,
+                            competencia_historico, rotulo_historico, nome_entrada, hash_entrada,
+                            colunas_parametros, resultado["total_funcionarios"]
+                        )
+                    except ValueError as erro:
+                        st.error(f"⚠️ {erro}")
+                    else:
+                        st.success(f"✅ Execução {id_execucao} salva no histórico")
+
+            # -------- ANÁLISE MULTIDIMENSIONAL --------
+            with st.expander("🧊 Análise multidimensional (cubo)"):
+                if df_final is None:
+                    st.info("O cubo precisa da planilha em memória; desligue o modo streaming para usá-lo.")
+                else:
+                    candidatas = [c for c in df_input.columns if c != coluna_salario]
+                    dimensoes_cubo = st.multiselect(
+                        "Dimensões do cubo", candidatas,
+                        default=[coluna_grupo] if coluna_grupo in candidatas else None,
+                        help="Ex.: departamento, cargo, regime, local. O cubo é montado uma vez; "
+                             "agrupar, filtrar e trocar de dimensão usam só as somas dele"
+                    )
+                    if dimensoes_cubo:
+                        # Um cubo por conjunto de dimensões, guardado junto com o resultado do cálculo
+                        cubos = resultado.setdefault("cubos", {})
+                        chave_cubo = tuple(dimensoes_cubo)
+                        if chave_cubo not in cubos:
+                            inicio = time.perf_counter()
+                            cubos[chave_cubo] = montar_cubo(df_final, df_input, dimensoes_cubo, coluna_salario)
+                            st.caption(f"🧊 Cubo montado em {(time.perf_counter() - inicio) * 1000:,.0f} ms")
+                        cubo = cubos[chave_cubo]
 
+                        k1, k2 = st.columns(2)
+                        agrupar_por = k1.multiselect("Agrupar por", dimensoes_cubo, default=dimensoes_cubo[:1])
+                        componentes_cubo = k2.multiselect(
+                            "Parcelas", cubo.valores, default=["Custo Total Mensal", "Custo Total Anual"]
+                        )
+                        filtros_cubo = {}
+                        grade_filtros = st.columns(len(dimensoes_cubo))
+                        for coluna_filtro, dimensao in zip(grade_filtros, dimensoes_cubo):
+                            escolhidos = coluna_filtro.multiselect(
+                                f"Filtrar {dimensao}", list(cubo.rotulos[dimensao]), key=f"filtro_cubo_{dimensao}"
+                            )
+                            if escolhidos:
+                                filtros_cubo[dimensao] = escolhidos
+
+                        inicio = time.perf_counter()
+                        visao = cubo.agregar(agrupar_por, filtros_cubo, componentes_cubo)
+                        tempo_cubo = time.perf_counter() - inicio
+                        mostrar_paginado(visao, "pagina_cubo", hide_index=True)
+                        st.caption(
+                            f"⚡ {len(visao):,} linhas a partir de {cubo.n_celulas:,} células do cubo "
+                            f"({cubo.linhas:,} funcionários) em {tempo_cubo * 1000:,.1f} ms"
+                        )
+
+                        if agrupar_por and "Custo Total Anual" in visao:
+                            rotulo_visao = " × ".join(map(str, agrupar_por))
+                            grafico_visao = pd.DataFrame({
+                                rotulo_visao: visao[agrupar_por].astype(str).agg(" · ".join, axis=1),
+                                "Custo Total Anual": visao["Custo Total Anual"],
+                            })
+                            fig_cubo = px.bar(
+                                top_n_com_outros(grafico_visao, rotulo_visao),
+                                x=rotulo_visao, y="Custo Total Anual",
+                                title=f"Custo Anual por {rotulo_visao}"
+                            )
+                            fig_cubo.update_layout(height=400)
+                            st.plotly_chart(fig_cubo, use_container_width=True)
+
+            # -------- PROJEÇÃO MENSAL --------
+            with st.expander("📅 Projeção mensal (12 a 60 meses)"):
+                if df_final is None:
+                    st.info("A projeção precisa da planilha em memória; desligue o modo streaming para usá-la.")
+                else:
+                    p1, p2, p3 = st.columns(3)
+                    inicio_projecao = p1.date_input("Primeiro mês", value=pd.Timestamp.today().replace(day=1))
+                    meses_projecao = p2.slider("Meses", 12, 60, MESES_PROJECAO_PADRAO, step=6)
+                    base_projecao = p3.radio(
+                        "Base", ["Caixa", "Competência"], horizontal=True,
+                        help="Caixa: 13º em novembro/dezembro, 1/3 de férias no mês de gozo e verbas na rescisão. "
+                             "Competência: provisões mensais, como no cálculo acima"
+                    )
+                    p4, p5, p6, p7 = st.columns(4)
+                    reajuste_projecao = p4.number_input("Reajuste anual (%)", value=0.0, min_value=0.0, step=0.5)
+                    dissidio_projecao = p5.selectbox("Mês do dissídio", range(1, 13), index=MES_DISSIDIO_PADRAO - 1)
+                    colunas_datas = [None] + list(df_input.columns)
+                    coluna_admissao = p6.selectbox(
+                        "Coluna de admissão", colunas_datas, format_func=lambda c: "— nenhuma —" if c is None else c
+                    )
+                    coluna_desligamento = p7.selectbox(
+                        "Coluna de desligamento", colunas_datas, format_func=lambda c: "— nenhuma —" if c is None else c
+                    )
+
+                    if st.toggle("Projetar", help="Calcula a matriz funcionários × meses com os parâmetros atuais"):
+                        try:
+                            projecao = projetar_planilha(
+                                df_input, coluna_salario, parametros_lote, colunas_parametros,
+                                coluna_admissao, coluna_desligamento,
+                                inicio=inicio_projecao, meses=meses_projecao, reajuste_perc=reajuste_projecao,
+                                mes_dissidio=dissidio_projecao, competencia=base_projecao == "Competência"
+                            )
+                        except ValueError as erro:
+                            st.error(f"⚠️ {erro}")
+                        else:
+                            mensal = tabela_mensal(projecao)
+                            anual = resumo_anual(projecao)
+
+                            q1, q2, q3 = st.columns(3)
+                            q1.metric("Desembolso no período", f"R$ {mensal['Desembolso Total'].sum():,.2f}")
+                            q2.metric("Maior mês", f"R$ {mensal['Desembolso Total'].max():,.2f}",
+                                      mensal['Desembolso Total'].idxmax().strftime("%m/%Y"), delta_color="off")
+                            q3.metric("Ativos no último mês", f"{mensal['Funcionários Ativos'].iloc[-1]:,}")
+
+                            parcelas_projecao = mensal.drop(columns=["Desembolso Total", "Funcionários Ativos"])
+                            fig_projecao = px.bar(
+                                parcelas_projecao.set_axis(parcelas_projecao.index.to_timestamp()),
+                                title="Desembolso mensal por parcela",
+                                labels={"index": "Mês", "value": "R$", "variable": "Parcela"},
+                            )
+                            fig_projecao.update_layout(height=450, bargap=0.1)
+                            st.plotly_chart(fig_projecao, use_container_width=True)
+
+                            st.dataframe(anual, use_container_width=True)
+                            mostrar_paginado(mensal.set_axis(mensal.index.strftime("%m/%Y")), "pagina_projecao")
+                            st.download_button(
+                                "📥 Baixar Projeção Mensal (CSV)",
+                                mensal.to_csv().encode("utf-8"),
+                                "projecao_mensal_custos.csv",
+                                mime="text/csv"
+                            )
+
+            # -------- SIMULAÇÃO DE RISCO --------
+            with st.expander("🎲 Simulação de risco (Monte Carlo)"):
+                if df_final is None:
+                    st.info("A simulação precisa da planilha em memória; desligue o modo streaming para usá-la.")
+                else:
+                    m1, m2, m3 = st.columns(3)
+                    cenarios_simulacao = m1.selectbox("Cenários", [10_000, 100_000, 1_000_000], index=1,
+                                                      format_func=lambda n: f"{n:,}")
+                    semente_simulacao = int(m2.number_input("Semente", value=42, min_value=0, step=1))
+                    workers_simulacao = int(m3.number_input("Processos", value=1, min_value=1, max_value=64))
+
+                    st.caption("Média e desvio padrão (%) de cada entrada incerta, sorteadas por cenário")
+                    m4, m5, m6 = st.columns(3)
+                    crescimento_media = m4.number_input("Crescimento salarial — média", value=0.0, step=0.5)
+                    crescimento_desvio = m4.number_input("Crescimento salarial — desvio", value=0.0, min_value=0.0, step=0.5)
+                    saude_media = m5.number_input("Inflação do plano de saúde — média", value=0.0, step=0.5)
+                    saude_desvio = m5.number_input("Inflação do plano de saúde — desvio", value=0.0, min_value=0.0, step=0.5)
+                    demissao_media = m6.number_input("Demissão sem justa causa — média", value=100.0,
+                                                     min_value=0.0, max_value=100.0, step=5.0,
+                                                     help="Chance de a multa de 40% do FGTS acontecer; 100% = provisão integral")
+                    demissao_desvio = m6.number_input("Demissão sem justa causa — desvio", value=0.0, min_value=0.0, step=1.0)
+
+                    rat_simulacao = None
+                    if st.checkbox("Reclassificação do RAT"):
+                        r1, r2, r3 = st.columns(3)
+                        rat_simulacao = {
+                            1.0: r1.number_input("RAT 1% — probabilidade (%)", value=0.0, min_value=0.0),
+                            2.0: r2.number_input("RAT 2% — probabilidade (%)", value=100.0, min_value=0.0),
+                            3.0: r3.number_input("RAT 3% — probabilidade (%)", value=0.0, min_value=0.0),
+                        }
+                        if sum(rat_simulacao.values()) <= 0:
+                            rat_simulacao = None
+
+                    if st.toggle("Simular", help="Sorteia os cenários e calcula as faixas de custo por grupo"):
+                        incertezas = Incertezas(
+                            crescimento=Incerteza(crescimento_media, crescimento_desvio, -100.0),
+                            inflacao_saude=Incerteza(saude_media, saude_desvio),
+                            demissao=Incerteza(demissao_media, demissao_desvio, 0.0, 100.0),
+                            rat=rat_simulacao,
+                        )
+                        inicio = time.perf_counter()
+                        try:
+                            simulacao = simular_planilha(
+                                df_input, coluna_salario, coluna_grupo, parametros_lote, colunas_parametros,
+                                incertezas=incertezas, cenarios=cenarios_simulacao, semente=semente_simulacao,
+                                n_workers=workers_simulacao
+                            )
+                        except ValueError as erro:
+                            st.error(f"⚠️ {erro}")
+                        else:
+                            segundos_simulacao = time.perf_counter() - inicio
+                            total = simulacao.mensal.loc["TOTAL"]
+                            s1, s2, s3 = st.columns(3)
+                            s1.metric("P5 mensal (total)", f"R$ {total['P5']:,.2f}")
+                            s2.metric("Mediana mensal (total)", f"R$ {total['P50']:,.2f}")
+                            s3.metric("P95 mensal (total)", f"R$ {total['P95']:,.2f}")
+
+                            # Histograma do total reagrupado em 64 barras: o gráfico não cresce com os cenários
+                            bordas, contagens = simulacao.histograma_total
+                            contagens = contagens.reshape(64, -1).sum(axis=1)
+                            centros = (bordas[:-1].reshape(64, -1).mean(axis=1) + bordas[1:].reshape(64, -1).mean(axis=1)) / 2
+                            fig_simulacao = px.bar(
+                                x=centros, y=contagens, labels={"x": "Custo Total Mensal (R$)", "y": "Cenários"},
+                                title="Distribuição do custo mensal total"
+                            )
+                            for rotulo in ("P5", "P50", "P95"):
+                                fig_simulacao.add_vline(x=total[rotulo], line_dash="dash", annotation_text=rotulo)
+                            fig_simulacao.update_layout(height=350, bargap=0)
+                            st.plotly_chart(fig_simulacao, use_container_width=True)
+
+                            st.markdown("**Custo mensal por grupo**")
+                            mostrar_paginado(simulacao.mensal, "pagina_simulacao_mensal")
+                            st.markdown("**Custo anual por grupo**")
+                            mostrar_paginado(simulacao.anual, "pagina_simulacao_anual")
+                            st.caption(f"🎲 {simulacao.cenarios:,} cenários em {segundos_simulacao:,.2f} s")
+                            st.download_button(
+                                "📥 Baixar Faixas de Custo (CSV)",
+                                pd.concat({"Mensal": simulacao.mensal, "Anual": simulacao.anual}, axis=1).to_csv().encode("utf-8"),
+                                "simulacao_custos.csv",
+                                mime="text/csv"
+                            )
+
+            # -------- SENSIBILIDADE --------
+            with st.expander("📐 Sensibilidade (custo marginal)"):
+                if df_final is None:
+                    st.info("A sensibilidade precisa da planilha em memória; desligue o modo streaming para usá-la.")
+                else:
+                    v1, v2 = st.columns(2)
+                    aumento_sensibilidade = v1.number_input("Aumento salarial para todos (R$)", value=100.0, step=50.0)
+                    variacao_rat = v2.number_input("Variação do RAT (p.p.)", value=1.0, step=0.5)
+
+                    if st.toggle("Calcular sensibilidades", help="Derivadas do custo e do líquido de cada funcionário, "
+                                 "calculadas pelas faixas de INSS/IRRF, sem recalcular a planilha"):
+                        inicio = time.perf_counter()
+                        try:
+                            sensibilidades = sensibilidades_planilha(df_input, coluna_salario, parametros_lote, colunas_parametros)
+                        except ValueError as erro:
+                            st.error(f"⚠️ {erro}")
+                        else:
+                            resumo_sens = resumo_sensibilidades(sensibilidades, df_input[coluna_grupo])
+                            segundos_sensibilidade = time.perf_counter() - inicio
+                            total = resumo_sens.loc["TOTAL"]
+                            e1, e2, e3 = st.columns(3)
+                            e1.metric(f"Custo mensal com +R$ {aumento_sensibilidade:,.2f}",
+                                      f"R$ {aumento_sensibilidade * total['custo_mensal', 'salario']:+,.2f}")
+                            e2.metric(f"Líquido da folha com +R$ {aumento_sensibilidade:,.2f}",
+                                      f"R$ {aumento_sensibilidade * total['salario_liquido', 'salario']:+,.2f}")
+                            e3.metric(f"Custo mensal com RAT {variacao_rat:+.1f} p.p.",
+                                      f"R$ {variacao_rat * total['custo_mensal', 'rat_perc']:+,.2f}")
+                            st.caption(
+                                "Variação por unidade de cada entrada, somada por grupo. O impacto é exato enquanto "
+                                f"nenhum funcionário muda de faixa de INSS/IRRF ({segundos_sensibilidade * 1000:,.0f} ms)"
+                            )
+                            for saida, rotulo in SAIDAS_SENSIBILIDADE.items():
+                                st.markdown(f"**{rotulo}**")
+                                mostrar_paginado(tabela_sensibilidades(resumo_sens, saida), f"pagina_sensibilidade_{saida}")
+
+                            por_funcionario = sensibilidades.set_axis(
+                                [f"{SAIDAS_SENSIBILIDADE[s]} / {ENTRADAS_SENSIBILIDADE[e]}" for s, e in sensibilidades.columns], axis=1
+                            )
+                            st.download_button(
+                                "📥 Baixar Sensibilidades por Funcionário (CSV)",
+                                pd.concat([df_input[[coluna_grupo, coluna_salario]], por_funcionario], axis=1)
+                                .to_csv(index=False).encode("utf-8"),
+                                "sensibilidades_custos.csv",
+                                mime="text/csv"
+                            )
+
+    # -------- CÁLCULOS EM SEGUNDO PLANO --------
+    # Fora do `if arquivo`: depois de recarregar a página os resultados continuam aqui
+    acompanhadas = tarefas_acompanhadas()
+    if acompanhadas:
+        st.subheader("⏳ Cálculos em segundo plano")
+        fila = fila_de_tarefas()
+        for id_tarefa in acompanhadas:
+            tarefa = fila.tarefa(id_tarefa)
+            if tarefa is None:
+                st.caption(f"Tarefa {id_tarefa} não encontrada: o servidor foi reiniciado ou ela já foi descartada.")
+                continue
+            t1, t2 = st.columns([5, 1])
+            with t1:
+                detalhe = "" if tarefa.mensagem == tarefa.estado else f": {tarefa.mensagem}"
+                texto = f"**{tarefa.descricao}** — {tarefa.estado}{detalhe} ({tarefa.duracao():,.1f} s)"
+                if tarefa.estado in (NA_FILA, EXECUTANDO) and tarefa.progresso is not None:
+                    st.progress(tarefa.progresso, text=texto)
+                elif tarefa.erro is not None:
+                    st.error(texto)
+                else:
+                    st.markdown(texto)
+                if tarefa.estado == CONCLUIDA:
+                    for rotulo, dados, nome_arquivo, mime in downloads_da_tarefa(tarefa.resultado):
+                        st.download_button(rotulo, dados, nome_arquivo, mime=mime, key=f"{id_tarefa}_{nome_arquivo}")
+                    if tarefa.resultado.get("detalhamento_csv_gz") is not None:
+                        botao_detalhamento(tarefa.resultado["detalhamento_csv_gz"], f"{id_tarefa}_detalhamento")
+            with t2:
+                if not tarefa.terminou:
+                    if st.button("Cancelar", key=f"cancelar_{id_tarefa}"):
+                        fila.cancelar(id_tarefa)
+                elif st.button("Remover", key=f"remover_{id_tarefa}"):
+                    fila.remover(id_tarefa)
+                    st.query_params["tarefa"] = [i for i in acompanhadas if i != id_tarefa]
+                    st.rerun()
+
+    # -------- HISTÓRICO DE CÁLCULOS --------
+    # Também fora do `if arquivo`: comparar execuções salvas não exige reenviar a planilha
+    with st.expander("🗂️ Histórico de cálculos"):
+        historico = historico_de_calculos()
+        execucoes = historico.execucoes()
+        if execucoes.empty:
+            st.info("Nenhuma execução salva. Depois de calcular uma planilha, use \"Salvar no histórico\".")
+        else:
+            mostrar_paginado(execucoes, "pagina_execucoes", hide_index=True)
+            nomes_execucoes = dict(zip(
+                execucoes["Execução"],
+                execucoes["Competência"] + " · #" + execucoes["Execução"].astype(str) + " " + execucoes["Rótulo"]
+            ))
+            v1, v2 = st.columns(2)
+            execucao_atual = v1.selectbox("Execução", list(nomes_execucoes), format_func=nomes_execucoes.get)
+            execucao_anterior = v2.selectbox(
+                "Comparar com", list(nomes_execucoes), index=min(1, len(nomes_execucoes) - 1),
+                format_func=nomes_execucoes.get
+            )
+
+            inicio = time.perf_counter()
+            comparacao = historico.comparar(execucao_anterior, execucao_atual)
+            coluna_historico = execucoes.set_index("Execução").at[execucao_atual, "Agrupado por"]
+            evolucao = historico.evolucao_grupos(coluna_grupo=coluna_historico)
+            tempo_historico = time.perf_counter() - inicio
+
+            total_atual = comparacao["Custo Total Mensal (atual)"].sum()
+            total_anterior = comparacao["Custo Total Mensal (anterior)"].sum()
+            w1, w2 = st.columns(2)
+            w1.metric("Custo Total Mensal", f"R$ {total_atual:,.2f}", f"R$ {total_atual - total_anterior:,.2f}",
+                      delta_color="off")
+            w2.metric("Funcionários", f"{comparacao['Quantidade (atual)'].sum():,}",
+                      f"{comparacao['Quantidade (atual)'].sum() - comparacao['Quantidade (anterior)'].sum():,}",
+                      delta_color="off")
+            mostrar_paginado(comparacao, "pagina_comparacao_historico", hide_index=True)
+
+            # Uma competência salva mais de uma vez entra no gráfico pela execução mais recente
+            evolucao = evolucao.drop_duplicates(["Competência", "Grupo"], keep="last")
+            maiores = historico.consolidado(execucao_atual).iloc[:, 0].head(5).tolist()
+            grupos_evolucao = st.multiselect(
+                f"Evolução por {coluna_historico}", sorted(evolucao["Grupo"].unique()),
+                default=[g for g in maiores if g in set(evolucao["Grupo"])]
+            )
+            if grupos_evolucao:
+                fig_historico = px.line(
+                    evolucao[evolucao["Grupo"].isin(grupos_evolucao)],
+                    x="Competência", y="Custo Total Mensal", color="Grupo", markers=True,
+                    title=f"Custo mensal por {coluna_historico} ao longo das competências"
+                )
+                fig_historico.update_layout(height=400)
+                st.plotly_chart(fig_historico, use_container_width=True)
+            st.caption(f"⚡ Comparação e evolução consultadas em {tempo_historico * 1000:,.1f} ms, sem recalcular")
+
+            chave_busca = st.text_input("Funcionário (chave salva)", help="Custo do funcionário em cada execução")
+            if chave_busca:
+                mostrar_paginado(historico.funcionario(chave_busca), "pagina_funcionario_historico", hide_index=True)
+
+            if st.button(f"🗑️ Remover {nomes_execucoes[execucao_atual]}"):
+                historico.remover(execucao_atual)
+                st.rerun()
+
+# ---------------- ESTATÍSTICAS DE CACHE ----------------
+with st.sidebar:
+    cache = estatisticas_cache_custos()
+    st.caption(
+        f"🧠 Cache de cálculos: {cache['acertos']} acertos / {cache['falhas']} falhas "
+        f"({cache['tamanho']}/{cache['capacidade']} entradas)"
+    )
+    cache_leitura = estatisticas_cache_leitura()
+    st.caption(
+        f"📂 Cache de planilhas: {cache_leitura['acertos_memoria']} em memória / "
+        f"{cache_leitura['acertos_disco']} em disco / {cache_leitura['falhas']} leituras completas"
+    )
+
+# ---------------- DIAGNÓSTICO DE DESEMPENHO ----------------
+if coletor_diagnostico is not None:
+    encerrar()
+    with st.expander("🩺 Diagnóstico de desempenho", expanded=True):
+        resumo_diagnostico = pd.DataFrame(coletor_diagnostico.resumo())
+        if resumo_diagnostico.empty:
+            st.info("Nenhuma etapa instrumentada rodou nesta execução (resultados em cache não são recalculados).")
+        else:
+            st.dataframe(resumo_diagnostico, use_container_width=True, hide_index=True)
+            st.caption(
+                "Etapas aninhadas (ex.: calcular_custos_lote dentro de processar_paralelo) entram também no "
+                "tempo da etapa de fora. Com amostragem, \"Segundos (estimado)\" extrapola a média para todas as chamadas."
+            )
+        c1, c2 = st.columns(2)
+        c1.download_button(
+            "📥 Diagnóstico (JSON)", coletor_diagnostico.para_json(), "diagnostico.json", mime="application/json"
+        )
+        c2.download_button(
+            "📥 Chrome trace", coletor_diagnostico.para_chrome_trace(), "diagnostico.trace.json",
+            mime="application/json", help="Abra em chrome://tracing ou ui.perfetto.dev"
+        )
 
+# ---------------- ACOMPANHAMENTO DE TAREFAS ----------------
+# Enquanto houver tarefa desta aba na fila, a página se atualiza sozinha
+if any(t is not None and not t.terminou for t in map(fila_de_tarefas().tarefa, tarefas_acompanhadas())):
+    time.sleep(1)
+    st.rerun()
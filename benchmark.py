@@ -0,0 +1,237 @@
+"""
+Benchmarks do núcleo de cálculo e do pipeline da aba "Processar Planilha".
+
+Exemplos:
+    python benchmark.py                                  # 1k e 100k linhas, JSON no stdout
+    python benchmark.py --tamanhos 1000 100000 1000000 --saida atual.json
+    python benchmark.py --comparar base.json --tolerancia 1.25
+
+Cada medida é o menor tempo de `--repeticoes` execuções. Com --comparar, as
+medidas são confrontadas com um JSON anterior e o processo sai com código 1
+se alguma ficar mais lenta que a tolerância.
+"""
+import argparse
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculo import REGIMES, calcular_custos, calcular_custos_cache, calcular_inss_funcionario, calcular_irrf
+from calculo_lote import calcular_custos_lote
+from centavos import calcular_custos_centavos
+from cubo import montar_cubo
+from historico import HistoricoCalculos
+from processamento import agregar_por_grupo, calcular_detalhamento, finalizar_relatorio, ler_csv
+from projecao import projetar_custos
+from sensibilidade import resumo_sensibilidades, sensibilidades_lote
+
+TAMANHOS_PADRAO = (1_000, 100_000)
+LIMITE_EXCEL = 100_000  # acima disso ler/gravar xlsx leva minutos
+
+PARAMETROS = dict(
+    incluir=True, n_pass=2, v_pass=5.5, vr=550.0, va=250.0,
+    saude=300.0, odonto=50.0, seguro=20.0, home=0.0, epi=0.0, outros=0.0,
+    rat_perc=2.0, terceiros_perc=5.8,
+)
+
+# ---------------- DADOS SINTÉTICOS ----------------
+
+def gerar_folha(n, semente=42):
+    """Folha sintética com regimes, dependentes e departamentos misturados"""
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        "Matricula": np.arange(1, n + 1),
+        "Departamento": rng.choice([f"Depto {i:02d}" for i in range(40)], n),
+        "Regime": rng.choice(REGIMES, n, p=[0.5, 0.35, 0.15]),
+        "Dependentes": rng.integers(0, 4, n),
+        "Salario": np.round(rng.lognormal(8.3, 0.55, n), 2),
+    })
+
+# ---------------- MEDIÇÃO ----------------
+
+def medir(funcao, repeticoes):
+    """Menor tempo, em segundos, entre `repeticoes` execuções"""
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def calcular_folha(folha):
+    """Pipeline da planilha com regime e dependentes por linha, um lote por regime"""
+    partes = []
+    for regime, grupo in folha.groupby("Regime", sort=False):
+        partes.append(calcular_custos_lote(
+            grupo["Salario"], regime, dependentes=grupo["Dependentes"].to_numpy(), **PARAMETROS
+        ))
+    return pd.concat(partes).loc[folha.index]
+
+
+def executar(tamanhos, repeticoes):
+    resultados = []
+
+    def registrar(nome, linhas, segundos, por_chamada=False):
+        item = {"nome": nome, "linhas": linhas, "segundos": segundos}
+        if por_chamada:
+            item["microssegundos_por_chamada"] = segundos / linhas * 1e6
+        else:
+            item["linhas_por_segundo"] = linhas / segundos if segundos else None
+        resultados.append(item)
+        print(f"{nome:<50} {linhas:>10,} linhas  {segundos:10.4f}s", file=sys.stderr)
+
+    # -------- Latência de chamadas individuais --------
+    chamadas = 10_000
+    salarios = gerar_folha(chamadas)["Salario"].tolist()
+    argumentos = (REGIMES[1], PARAMETROS["incluir"], PARAMETROS["n_pass"], PARAMETROS["v_pass"],
+                  PARAMETROS["vr"], PARAMETROS["va"], PARAMETROS["saude"], PARAMETROS["odonto"],
+                  PARAMETROS["seguro"], PARAMETROS["home"], PARAMETROS["epi"], PARAMETROS["outros"],
+                  PARAMETROS["rat_perc"], PARAMETROS["terceiros_perc"], 1)
+    registrar("calcular_inss_funcionario", chamadas,
+              medir(lambda: [calcular_inss_funcionario(s) for s in salarios], repeticoes), True)
+    registrar("calcular_irrf", chamadas,
+              medir(lambda: [calcular_irrf(s, 1) for s in salarios], repeticoes), True)
+    registrar("calcular_custos", chamadas,
+              medir(lambda: [calcular_custos(s, *argumentos) for s in salarios], repeticoes), True)
+    calcular_custos_cache(salarios[0], *argumentos)
+    registrar("calcular_custos_cache (acerto)", chamadas,
+              medir(lambda: [calcular_custos_cache(salarios[0], *argumentos) for _ in salarios], repeticoes), True)
+
+    for n in tamanhos:
+        folha = gerar_folha(n)
+
+        # -------- Cálculo em lote --------
+        for regime in REGIMES:
+            registrar(f"calcular_custos_lote [{regime}]", n, medir(
+                lambda: calcular_custos_lote(folha["Salario"], regime, **PARAMETROS), repeticoes
+            ))
+        registrar("calcular_custos_centavos [CLT (Lucro Presumido/Real)]", n, medir(
+            lambda: calcular_custos_centavos(folha["Salario"], REGIMES[1], **PARAMETROS), repeticoes
+        ))
+        registrar("calculo folha mista (regime/dependentes)", n, medir(lambda: calcular_folha(folha), repeticoes))
+
+        # -------- Pipeline da aba Processar Planilha --------
+        parametros = dict(regime=REGIMES[0], **PARAMETROS)
+        registrar("calcular_detalhamento", n, medir(
+            lambda: calcular_detalhamento(folha, "Salario", parametros), repeticoes
+        ))
+        df_final = calcular_detalhamento(folha, "Salario", parametros)
+        registrar("groupby consolidado", n, medir(
+            lambda: finalizar_relatorio(agregar_por_grupo(df_final, "Departamento", "Salario")), repeticoes
+        ))
+        registrar("groupby consolidado em centavos", n, medir(
+            lambda: finalizar_relatorio(agregar_por_grupo(df_final, "Departamento", "Salario", True), True), repeticoes
+        ))
+        registrar("montar_cubo (Departamento × Regime)", n, medir(
+            lambda: montar_cubo(df_final, folha, ["Departamento", "Regime"], "Salario"), repeticoes
+        ))
+        cubo = montar_cubo(df_final, folha, ["Departamento", "Regime"], "Salario")
+        registrar("consulta ao cubo (Departamento)", n, medir(lambda: cubo.agregar(["Departamento"]), repeticoes))
+
+        # -------- Histórico --------
+        relatorio = finalizar_relatorio(agregar_por_grupo(df_final, "Departamento", "Salario"))
+        with tempfile.TemporaryDirectory() as pasta:
+            historico = HistoricoCalculos(Path(pasta) / "historico.sqlite3")
+            registrar("salvar no histórico", n, medir(
+                lambda: historico.salvar(relatorio, "Departamento", parametros, df_final, "Salario", "Matricula"),
+                max(repeticoes, 2)
+            ))
+            registrar("comparar execuções do histórico", n, medir(lambda: historico.comparar(1, 2), repeticoes))
+            registrar("histórico de um funcionário", n, medir(lambda: historico.funcionario(n // 2), repeticoes))
+
+        # -------- Projeção mensal --------
+        registrar("projetar_custos (60 meses)", n, medir(
+            lambda: projetar_custos(folha["Salario"], folha["Regime"].to_numpy(), **PARAMETROS,
+                                    inicio="2025-01", meses=60, reajuste_perc=5.0), repeticoes
+        ))
+
+        # -------- Sensibilidade --------
+        registrar("sensibilidades_lote (folha mista)", n, medir(
+            lambda: sensibilidades_lote(folha["Salario"], folha["Regime"].to_numpy(), **PARAMETROS,
+                                        dependentes=folha["Dependentes"].to_numpy()), repeticoes
+        ))
+        sensibilidades = sensibilidades_lote(folha["Salario"], folha["Regime"].to_numpy(), **PARAMETROS)
+        registrar("resumo_sensibilidades por grupo", n, medir(
+            lambda: resumo_sensibilidades(sensibilidades, folha["Departamento"]), repeticoes
+        ))
+
+        # -------- Leitura e gravação --------
+        csv = io.StringIO()
+        registrar("gravar CSV", n, medir(lambda: (csv.seek(0), csv.truncate(), folha.to_csv(csv, index=False)), repeticoes))
+        registrar("ler CSV", n, medir(lambda: (csv.seek(0), pd.read_csv(csv)), repeticoes))
+        csv_bytes = io.BytesIO(csv.getvalue().encode("utf-8"))
+        registrar("ler_csv (formato detectado)", n, medir(lambda: ler_csv(csv_bytes), repeticoes))
+        registrar("ler_csv (2 colunas)", n, medir(lambda: ler_csv(csv_bytes, ["Salario", "Departamento"]), repeticoes))
+
+        if n <= LIMITE_EXCEL:
+            with tempfile.TemporaryDirectory() as pasta:
+                caminho = Path(pasta) / "folha.xlsx"
+                registrar("gravar XLSX", n, medir(lambda: folha.to_excel(caminho, index=False), 1))
+                registrar("ler XLSX", n, medir(lambda: pd.read_excel(caminho), 1))
+
+    return resultados
+
+
+def comparar(atual, base, tolerancia):
+    """Razão atual/base por medida; retorna as que passaram da tolerância"""
+    anteriores = {(r["nome"], r["linhas"]): r["segundos"] for r in base["resultados"]}
+    regressoes = []
+    for r in atual["resultados"]:
+        anterior = anteriores.get((r["nome"], r["linhas"]))
+        if not anterior:
+            continue
+        razao = r["segundos"] / anterior
+        marca = "  << REGRESSÃO" if razao > tolerancia else ""
+        print(f"{r['nome']:<50} {r['linhas']:>10,}  {razao:6.2f}x{marca}", file=sys.stderr)
+        if razao > tolerancia:
+            regressoes.append({**r, "razao": razao})
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks da calculadora de custo de funcionário")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS_PADRAO),
+                        help="número de linhas das folhas sintéticas")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", type=Path, help="grava o JSON neste arquivo em vez do stdout")
+    parser.add_argument("--comparar", type=Path, help="JSON de uma execução anterior (baseline)")
+    parser.add_argument("--tolerancia", type=float, default=1.25,
+                        help="razão atual/baseline acima da qual a medida é regressão")
+    args = parser.parse_args(argv)
+
+    relatorio = {
+        "metadados": {
+            "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "plataforma": platform.platform(),
+            "repeticoes": args.repeticoes,
+        },
+        "resultados": executar(args.tamanhos, args.repeticoes),
+    }
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        args.saida.write_text(texto, encoding="utf-8")
+    else:
+        print(texto)
+
+    if args.comparar:
+        regressoes = comparar(relatorio, json.loads(args.comparar.read_text(encoding="utf-8")), args.tolerancia)
+        if regressoes:
+            print(f"{len(regressoes)} medida(s) acima da tolerância de {args.tolerancia:.2f}x", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
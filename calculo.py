@@ -0,0 +1,276 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+from instrumentacao import instrumentar
+from tabelas import ANO_PADRAO, obter_tabela
+
+# ---------------- CONSTANTES ----------------
+TETO_INSS_2025 = obter_tabela(2025).teto_inss
+SALARIO_MINIMO_2025 = obter_tabela(2025).salario_minimo
+
+REGIMES = (
+    "CLT (Simples Nacional)",
+    "CLT (Lucro Presumido/Real)",
+    "PJ",
+)
+
+# Presets de benefícios por área
+PRESETS_BENEFICIOS = {
+    "Personalizado": {},
+    "Tech/TI": {
+        "vr": 800,
+        "va": 400,
+        "saude": 450,
+        "odonto": 80,
+        "home": 200
+    },
+    "Comercial": {
+        "vr": 600,
+        "va": 300,
+        "saude": 350,
+        "odonto": 60,
+        "home": 0
+    },
+    "Operacional": {
+        "vr": 550,
+        "va": 250,
+        "saude": 300,
+        "odonto": 50,
+        "home": 0
+    },
+    "Administrativo": {
+        "vr": 650,
+        "va": 350,
+        "saude": 400,
+        "odonto": 70,
+        "home": 100
+    }
+}
+
+# Valores iniciais da barra lateral, usados quando o preset não define o benefício
+BENEFICIOS_PADRAO = {"vr": 550.0, "va": 250.0, "saude": 0.0, "odonto": 0.0, "home": 0.0}
+
+
+# Parâmetros de calcular_custos que uma planilha pode trazer por funcionário
+# (parâmetro -> rótulo no mapeamento de colunas); "preset" é o nome de um
+# PRESETS_BENEFICIOS e define VR, VA, saúde, odonto e home office da linha.
+PARAMETROS_MAPEAVEIS = {
+    "regime": "Regime",
+    "preset": "Preset de benefícios",
+    "incluir": "Provisionar férias e 13º",
+    "dependentes": "Dependentes",
+    "n_pass": "Passagens por dia",
+    "v_pass": "Valor da passagem",
+    "vr": "Vale Refeição",
+    "va": "Vale Alimentação",
+    "saude": "Plano de Saúde",
+    "odonto": "Plano Odontológico",
+    "seguro": "Seguro de Vida",
+    "home": "Auxílio Home Office",
+    "epi": "Equipamentos/EPI",
+    "outros": "Outros Custos",
+    "rat_perc": "RAT (%)",
+    "terceiros_perc": "Terceiros (%)",
+    "ano": "Ano da tabela tributária",
+}
+
+
+def beneficios_do_preset(nome, personalizados=None):
+    """VR, VA, saúde, odonto e home office de um preset; o que ele não define vem de `personalizados`"""
+    base = {**BENEFICIOS_PADRAO, **(personalizados or {})}
+    preset = PRESETS_BENEFICIOS[nome]
+    return {chave: float(preset.get(chave, valor)) for chave, valor in base.items()}
+
+# ---------------- FUNÇÕES AUXILIARES ----------------
+
+def calcular_inss_funcionario(salario, ano=ANO_PADRAO):
+    """Calcula INSS progressivo do funcionário"""
+    return obter_tabela(ano).inss(salario)
+
+def calcular_irrf(salario, dependentes=0, ano=ANO_PADRAO):
+    """Calcula IRRF"""
+    return obter_tabela(ano).irrf(salario, dependentes)
+
+# ---------------- RESULTADO TIPADO ----------------
+
+class ResultadoCustos(NamedTuple):
+    """
+    Resultado de calcular_custos com esquema fixo.
+
+    Os campos são os mesmos para todos os regimes (o que não se aplica fica
+    em zero), então as chaves não dependem dos parâmetros. Os rótulos de
+    exibição são aplicados só na hora de mostrar, com `rotulos_componentes`.
+    """
+    valor_nota_fiscal: float = 0.0
+    decimo_terceiro: float = 0.0
+    ferias: float = 0.0
+    fgts: float = 0.0
+    multa_fgts: float = 0.0
+    inss_patronal: float = 0.0
+    rat: float = 0.0
+    terceiros: float = 0.0
+    vale_transporte: float = 0.0
+    vale_refeicao: float = 0.0
+    vale_alimentacao: float = 0.0
+    plano_saude: float = 0.0
+    plano_odontologico: float = 0.0
+    seguro_vida: float = 0.0
+    home_office: float = 0.0
+    equipamentos: float = 0.0
+    outros: float = 0.0
+    custo_mensal: float = 0.0
+    custo_anual: float = 0.0
+    salario_liquido: float = 0.0
+    inss_funcionario: float = 0.0
+    irrf_funcionario: float = 0.0
+    desconto_vt: float = 0.0
+
+
+CAMPOS_CUSTOS = ResultadoCustos._fields
+# Parcelas que compõem o custo mensal, na ordem em que são somadas
+COMPONENTES = CAMPOS_CUSTOS[:CAMPOS_CUSTOS.index("custo_mensal")]
+TOTAIS = ("custo_mensal", "custo_anual")
+
+ROTULOS_TOTAIS = {"custo_mensal": "Custo Total Mensal", "custo_anual": "Custo Total Anual"}
+
+_ROTULOS_BENEFICIOS = {
+    "vale_refeicao": "Vale Refeição",
+    "vale_alimentacao": "Vale Alimentação",
+    "plano_saude": "Plano de Saúde",
+    "plano_odontologico": "Plano Odontológico",
+    "seguro_vida": "Seguro de Vida",
+    "home_office": "Auxílio Home Office",
+}
+
+
+def rotulos_componentes(regime, rat_perc=2.0, terceiros_perc=5.8):
+    """
+    Campo -> rótulo de exibição das parcelas que o regime mostra, na ordem da tela.
+
+    `regime=None` (planilha com regimes misturados) dá as parcelas de todos os
+    regimes; `rat_perc`/`terceiros_perc` None (percentual por funcionário)
+    tiram o percentual do rótulo.
+    """
+    pj = {
+        "valor_nota_fiscal": "Valor Nota Fiscal (PJ)",
+        **_ROTULOS_BENEFICIOS,
+        "equipamentos": "Equipamentos",
+        "outros": "Outros Custos",
+    }
+    if regime is not None and "CLT" not in regime:
+        return pj
+    clt = {
+        "decimo_terceiro": "13º Salário (Provisão Mensal)",
+        "ferias": "Férias + 1/3 (Provisão Mensal)",
+        "fgts": "FGTS Mensal (8%)",
+        "multa_fgts": "Provisão Multa FGTS (40%)",
+        "inss_patronal": "INSS Patronal (20%)",
+        "rat": "RAT" if rat_perc is None else f"RAT ({rat_perc}%)",
+        "terceiros": "Terceiros/Sistema S" if terceiros_perc is None else f"Terceiros/Sistema S ({terceiros_perc}%)",
+        "vale_transporte": "Vale Transporte (Custo Empresa)",
+        **_ROTULOS_BENEFICIOS,
+        "equipamentos": "Equipamentos/EPI",
+        "outros": "Outros Custos",
+    }
+    if regime is None:
+        return {"valor_nota_fiscal": pj["valor_nota_fiscal"], **clt}
+    return clt
+
+
+def rotulos_exibicao(regime, rat_perc=2.0, terceiros_perc=5.8):
+    """Rótulos das parcelas seguidos dos totais: as colunas do detalhamento exportado"""
+    return {**rotulos_componentes(regime, rat_perc, terceiros_perc), **ROTULOS_TOTAIS}
+
+
+def componentes_rotulados(resultado, regime, rat_perc=2.0, terceiros_perc=5.8):
+    """Pares (rótulo, valor) das parcelas de um ResultadoCustos, para tabelas e gráficos"""
+    return [
+        (rotulo, getattr(resultado, campo))
+        for campo, rotulo in rotulos_componentes(regime, rat_perc, terceiros_perc).items()
+    ]
+
+# ---------------- FUNÇÃO DE CÁLCULO ----------------
+@instrumentar("calcular_custos", por_chamada=True)
+def calcular_custos(salario, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """Custo mensal de um funcionário, parcela a parcela, como ResultadoCustos"""
+    tabela = obter_tabela(ano)
+
+    if "CLT" in regime:
+        # Provisões
+        decimo = salario / 12 if incluir else 0
+        ferias = (salario / 12) + (salario / 3 / 12) if incluir else 0
+        
+        # FGTS
+        fgts = salario * 0.08
+        multa = fgts * 0.40
+
+        # Vale Transporte
+        vt_total = (n_pass * v_pass) * 22
+        desc_max = salario * 0.06
+        desc_real = min(vt_total, desc_max)
+        vt = max(0, vt_total - desc_real)
+
+        # INSS e Encargos
+        inss = 0
+        rat = 0
+        terceiros = 0
+        
+        if regime == "CLT (Lucro Presumido/Real)":
+            base_inss = min(salario, tabela.teto_inss)
+            inss = base_inss * 0.20
+            rat = base_inss * (rat_perc / 100)
+            terceiros = base_inss * (terceiros_perc / 100)
+
+        parcelas = (0.0, decimo, ferias, fgts, multa, inss, rat, terceiros, vt,
+                    vr, va, saude, odonto, seguro, home, epi, outros)
+
+        # Calcular salário líquido
+        inss_func = tabela.inss(salario)
+        irrf_func = tabela.irrf(salario, dependentes, inss_func)
+        salario_liquido = salario - inss_func - irrf_func - desc_real
+
+        total_sem_salario = sum(parcelas) - salario
+
+    else:  # PJ
+        parcelas = (salario, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0,
+                    vr, va, saude, odonto, seguro, home, epi, outros)
+        salario_liquido = salario * 0.85  # Estimativa
+        inss_func = irrf_func = desc_real = 0.0
+
+        total_sem_salario = sum(parcelas)
+
+    return ResultadoCustos(
+        *parcelas,
+        total_sem_salario, total_sem_salario * 12,
+        salario_liquido, inss_func, irrf_func, desc_real
+    )
+
+# ---------------- CACHE DE CÁLCULOS ----------------
+TAMANHO_CACHE_CUSTOS = 4096
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_CUSTOS)
+def _calcular_custos_memo(*parametros):
+    return calcular_custos(*parametros)
+
+
+def calcular_custos_cache(salario, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """
+    calcular_custos memorizado pela tupla completa de parâmetros.
+
+    O cache é um LRU limitado e compartilhado por todas as abas e sessões do
+    processo. O ResultadoCustos é imutável, então é devolvido sem cópia.
+    """
+    return _calcular_custos_memo(
+        salario, regime, incluir,
+        n_pass, v_pass, vr, va,
+        saude, odonto, seguro,
+        home, epi, outros,
+        rat_perc, terceiros_perc, dependentes, ano
+    )
+
+
+def estatisticas_cache_custos():
+    """Acertos, falhas e ocupação do cache de calcular_custos"""
+    info = _calcular_custos_memo.cache_info()
+    return {"acertos": info.hits, "falhas": info.misses, "tamanho": info.currsize, "capacidade": info.maxsize}
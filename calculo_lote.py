@@ -0,0 +1,284 @@
+import numpy as np
+import pandas as pd
+
+from calculo import CAMPOS_CUSTOS, COMPONENTES
+from instrumentacao import instrumentar
+from tabelas import ANO_PADRAO, obter_tabela
+
+# ---------------- CÁLCULO EM LOTE (VETORIZADO) ----------------
+
+def _tabelas_por_linha(ano, n):
+    """
+    Gera (tabela, linhas) para cada ano distinto de `ano`, que pode ser um
+    escalar ou um array com o ano de cada funcionário. Planilhas com vários
+    anos são avaliadas com uma máscara por ano, nunca linha a linha.
+    """
+    anos = np.asarray(ano)
+    if anos.ndim == 0:
+        yield obter_tabela(anos.item()), slice(None)
+        return
+
+    anos = np.broadcast_to(anos, (n,))
+    for valor in pd.unique(anos):
+        yield obter_tabela(valor), anos == valor
+
+
+def _encargos_funcionario_lote(salario, dependentes, ano):
+    """INSS do funcionário, IRRF e teto do INSS de cada linha"""
+    n = len(salario)
+    dependentes = np.broadcast_to(np.asarray(dependentes, dtype=float), (n,))
+    inss = np.empty(n)
+    irrf = np.empty(n)
+    teto = np.empty(n)
+
+    for tabela, linhas in _tabelas_por_linha(ano, n):
+        inss[linhas] = tabela.inss_lote(salario[linhas])
+        irrf[linhas] = tabela.irrf_lote(salario[linhas], dependentes[linhas], inss[linhas])
+        teto[linhas] = tabela.teto_inss
+
+    return inss, irrf, teto
+
+
+def calcular_inss_funcionario_lote(salarios, ano=ANO_PADRAO):
+    """Versão vetorizada de calcular_inss_funcionario"""
+    salario = np.asarray(salarios, dtype=float)
+    return _encargos_funcionario_lote(salario, 0, ano)[0]
+
+
+def calcular_irrf_lote(salarios, dependentes=0, ano=ANO_PADRAO):
+    """Versão vetorizada de calcular_irrf"""
+    salario = np.asarray(salarios, dtype=float)
+    return _encargos_funcionario_lote(salario, dependentes, ano)[1]
+
+
+# Campos de ResultadoCustos que mudam quando cada parâmetro muda. "regime" e
+# "ano" mudam quase tudo e pedem o recálculo completo.
+CAMPOS_POR_PARAMETRO = {
+    "incluir": ("decimo_terceiro", "ferias"),
+    "n_pass": ("vale_transporte", "desconto_vt", "salario_liquido"),
+    "v_pass": ("vale_transporte", "desconto_vt", "salario_liquido"),
+    "vr": ("vale_refeicao",),
+    "va": ("vale_alimentacao",),
+    "saude": ("plano_saude",),
+    "odonto": ("plano_odontologico",),
+    "seguro": ("seguro_vida",),
+    "home": ("home_office",),
+    "epi": ("equipamentos",),
+    "outros": ("outros",),
+    "rat_perc": ("rat",),
+    "terceiros_perc": ("terceiros",),
+    "dependentes": ("inss_funcionario", "irrf_funcionario", "salario_liquido"),
+}
+PARAMETROS_ESTRUTURAIS = ("regime", "ano")
+
+
+def _fatiar(valor, linhas):
+    """Linhas de um parâmetro por funcionário; escalares passam direto"""
+    return np.asarray(valor)[linhas] if np.ndim(valor) else valor
+
+
+def _teto_inss_lote(ano, n):
+    teto = np.empty(n)
+    for tabela, linhas in _tabelas_por_linha(ano, n):
+        teto[linhas] = tabela.teto_inss
+    return teto
+
+
+def preencher_campos_lote(r, salario, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO, campos=None):
+    """
+    Calcula, no lugar, os `campos` pedidos de `r` (campo -> array de saída).
+
+    Com `campos=None` preenche todas as parcelas e o salário líquido; com um
+    subconjunto, só o que foi pedido, reaproveitando os demais campos de `r`
+    (o salário líquido usa o INSS, o IRRF e o desconto de VT já gravados).
+    Os totais não são tocados: veja somar_totais_lote.
+
+    Todos os parâmetros podem ser arrays por funcionário. Com `regime` por
+    funcionário, cada regime é preenchido numa passada vetorizada sobre as
+    suas linhas.
+    """
+    if np.ndim(regime):
+        parametros = dict(
+            incluir=incluir, n_pass=n_pass, v_pass=v_pass, vr=vr, va=va,
+            saude=saude, odonto=odonto, seguro=seguro, home=home, epi=epi, outros=outros,
+            rat_perc=rat_perc, terceiros_perc=terceiros_perc, dependentes=dependentes, ano=ano,
+        )
+        codigos, regimes = pd.factorize(np.asarray(regime))
+        for codigo, valor in enumerate(regimes):
+            linhas = np.flatnonzero(codigos == codigo)
+            # Recálculo parcial reaproveita os campos já gravados dessas linhas
+            if campos is None:
+                parcial = {campo: np.zeros(len(linhas)) for campo in r}
+            else:
+                parcial = {campo: valores[linhas] for campo, valores in r.items()}
+            preencher_campos_lote(
+                parcial, salario[linhas], str(valor),
+                **{nome: _fatiar(p, linhas) for nome, p in parametros.items()}, campos=campos
+            )
+            for campo, valores in parcial.items():
+                r[campo][linhas] = valores
+        return
+
+    def pedido(*nomes):
+        return campos is None or any(nome in campos for nome in nomes)
+
+    clt = "CLT" in regime
+    n = len(salario)
+
+    if pedido("inss_funcionario", "irrf_funcionario"):
+        if clt:
+            r["inss_funcionario"][:], r["irrf_funcionario"][:], _ = _encargos_funcionario_lote(salario, dependentes, ano)
+        else:
+            r["inss_funcionario"][:] = r["irrf_funcionario"][:] = 0.0
+
+    # Provisões
+    if pedido("decimo_terceiro", "ferias"):
+        if clt and np.ndim(incluir):
+            r["decimo_terceiro"][:] = np.where(incluir, salario / 12, 0.0)
+            r["ferias"][:] = np.where(incluir, (salario / 12) + (salario / 3 / 12), 0.0)
+        elif clt and incluir:
+            r["decimo_terceiro"][:] = salario / 12
+            r["ferias"][:] = (salario / 12) + (salario / 3 / 12)
+        else:
+            r["decimo_terceiro"][:] = r["ferias"][:] = 0.0
+
+    # FGTS
+    if pedido("fgts", "multa_fgts"):
+        r["fgts"][:] = salario * 0.08 if clt else 0.0
+        r["multa_fgts"][:] = r["fgts"] * 0.40
+
+    # Vale Transporte
+    if pedido("vale_transporte", "desconto_vt"):
+        if clt:
+            vt_total = (n_pass * v_pass) * 22
+            r["desconto_vt"][:] = np.minimum(vt_total, salario * 0.06)
+            r["vale_transporte"][:] = np.maximum(0, vt_total - r["desconto_vt"])
+        else:
+            r["desconto_vt"][:] = r["vale_transporte"][:] = 0.0
+
+    # INSS e Encargos
+    patronais = (("inss_patronal", 0.20), ("rat", rat_perc / 100), ("terceiros", terceiros_perc / 100))
+    if pedido(*(campo for campo, _ in patronais)):
+        base_inss = None
+        if regime == "CLT (Lucro Presumido/Real)":
+            base_inss = np.minimum(salario, _teto_inss_lote(ano, n))
+        for campo, aliquota in patronais:
+            if pedido(campo):
+                r[campo][:] = 0.0 if base_inss is None else base_inss * aliquota
+
+    if pedido("valor_nota_fiscal"):
+        r["valor_nota_fiscal"][:] = 0.0 if clt else salario
+
+    for campo, valor in (
+        ("vale_refeicao", vr), ("vale_alimentacao", va), ("plano_saude", saude),
+        ("plano_odontologico", odonto), ("seguro_vida", seguro), ("home_office", home),
+        ("equipamentos", epi), ("outros", outros),
+    ):
+        if pedido(campo):
+            r[campo][:] = valor
+
+    # Calcular salário líquido
+    if pedido("salario_liquido"):
+        if clt:
+            r["salario_liquido"][:] = salario - r["inss_funcionario"] - r["irrf_funcionario"] - r["desconto_vt"]
+        else:
+            r["salario_liquido"][:] = salario * 0.85  # Estimativa
+
+
+def somar_totais_lote(r, salario, regime):
+    """Custo Total Mensal e Anual a partir das parcelas já preenchidas em `r`"""
+    # Soma na mesma ordem do escalar para reproduzir o arredondamento
+    total = r["custo_mensal"]
+    total[:] = 0.0
+    for campo in COMPONENTES:
+        total += r[campo]
+
+    if np.ndim(regime):
+        codigos, regimes = pd.factorize(np.asarray(regime))
+        clt = np.isin(codigos, [codigo for codigo, valor in enumerate(regimes) if "CLT" in valor])
+        total -= np.where(clt, salario, 0.0)
+    elif "CLT" in regime:
+        total -= salario
+
+    np.multiply(total, 12, out=r["custo_anual"])
+
+
+@instrumentar("calcular_custos_lote")
+def calcular_custos_lote(salarios, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """
+    Versão vetorizada de calcular_custos.
+
+    Recebe um vetor de salários (lista, array ou Series) e devolve um DataFrame
+    com uma linha por funcionário e uma coluna float64 por campo de
+    ResultadoCustos (CAMPOS_CUSTOS), na mesma ordem, para qualquer regime. As
+    colunas ficam num único bloco contíguo; os rótulos de exibição são
+    aplicados depois, com `rotulos_exibicao`. Se `salarios` for uma Series, o
+    índice é preservado para permitir o concat com a planilha de entrada.
+
+    Qualquer parâmetro, inclusive `regime`, pode ser um array por funcionário:
+    cada regime é calculado numa passada vetorizada sobre as suas linhas e,
+    com vários anos, cada linha usa a tabela tributária do seu ano.
+    """
+    indice = salarios.index if isinstance(salarios, pd.Series) else None
+    salario = np.asarray(salarios, dtype=float)
+
+    # Uma linha da matriz por campo: vira o bloco do DataFrame sem cópia
+    matriz = np.zeros((len(CAMPOS_CUSTOS), len(salario)))
+    r = dict(zip(CAMPOS_CUSTOS, matriz))
+
+    preencher_campos_lote(
+        r, salario, regime, incluir,
+        n_pass, v_pass, vr, va,
+        saude, odonto, seguro,
+        home, epi, outros,
+        rat_perc, terceiros_perc, dependentes, ano
+    )
+    somar_totais_lote(r, salario, regime)
+
+    return pd.DataFrame(matriz.T, index=indice, columns=list(CAMPOS_CUSTOS), copy=False)
+
+
+def calcular_totais_lote(salarios, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """
+    Só o Custo Total Mensal e o salário líquido de calcular_custos.
+
+    Todos os parâmetros, exceto `regime`, podem ser arrays que se combinam por
+    broadcasting; é o caminho usado em grades de cenários, onde montar as
+    ~20 colunas de calcular_custos_lote seria desperdício.
+
+    Retorna (custo total mensal, salário líquido), ambos com a forma do
+    broadcasting de todos os parâmetros.
+    """
+    salario = np.asarray(salarios, dtype=float)
+    beneficios = vr + va + saude + odonto + seguro + home + epi + outros
+    forma = np.broadcast_shapes(*(np.shape(x) for x in (
+        salario, incluir, n_pass, v_pass, beneficios, rat_perc, terceiros_perc, dependentes, ano
+    )))
+
+    if "CLT" not in regime:
+        return np.broadcast_to(salario + beneficios, forma), np.broadcast_to(salario * 0.85, forma)
+
+    def achatar(x):
+        return np.broadcast_to(x, forma).ravel()
+
+    encargos_func = _encargos_funcionario_lote(
+        achatar(salario), achatar(dependentes), achatar(ano) if np.ndim(ano) else ano
+    )
+    inss_func, irrf_func, teto_inss = (x.reshape(forma) for x in encargos_func)
+    salario = np.broadcast_to(salario, forma)
+
+    provisoes = np.where(incluir, (salario / 12) + (salario / 12) + (salario / 3 / 12), 0.0)
+    fgts = salario * 0.08
+
+    vt_total = (np.asarray(n_pass) * v_pass) * 22
+    desc_real = np.minimum(vt_total, salario * 0.06)
+    vt = np.maximum(0, vt_total - desc_real)
+
+    encargos = 0.0
+    if regime == "CLT (Lucro Presumido/Real)":
+        base_inss = np.minimum(salario, teto_inss)
+        encargos = base_inss * 0.20 + base_inss * (np.asarray(rat_perc) / 100) + base_inss * (np.asarray(terceiros_perc) / 100)
+
+    custo = provisoes + fgts + fgts * 0.40 + encargos + vt + beneficios - salario
+    liquido = salario - inss_func - irrf_func - desc_real
+    return np.broadcast_to(custo, forma), np.broadcast_to(liquido, forma)
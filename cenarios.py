@@ -0,0 +1,129 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from calculo import BENEFICIOS_PADRAO, PRESETS_BENEFICIOS, REGIMES, beneficios_do_preset
+from calculo_lote import calcular_totais_lote
+from tabelas import ANO_PADRAO
+
+CHAVES_CENARIO = ["Preset", "RAT (%)", "Terceiros (%)"]
+
+# ---------------- VARREDURA DE CENÁRIOS ----------------
+
+def varrer_cenarios(salarios, regimes=REGIMES, presets=None, rat_percs=(2.0,), terceiros_percs=(5.8,), incluir=True, n_pass=2, v_pass=5.5, seguro=0.0, epi=0.0, outros=0.0, dependentes=0, ano=ANO_PADRAO, personalizados=None):
+    """
+    Avalia a grade salário × regime × preset de benefícios × RAT × Terceiros.
+
+    Cada eixo vira uma dimensão de um array e os eixos se combinam por
+    broadcasting, então cada regime é uma única chamada vetorizada sobre a
+    grade inteira. `personalizados` define os benefícios do preset
+    "Personalizado" (e os que um preset não define).
+
+    Salários, RAT e Terceiros repetidos são avaliados uma vez só (e em ordem
+    crescente); regimes e presets repetidos também.
+
+    Retorna uma tabela tidy com uma linha por ponto da grade: Salário,
+    Regime, Preset, RAT (%), Terceiros (%), Custo Total Mensal, Custo Total
+    Anual e Salário Líquido. Regime e Preset são categóricos.
+    """
+    salarios = np.unique(np.asarray(salarios, dtype=float))
+    regimes = list(dict.fromkeys(regimes))
+    presets = list(dict.fromkeys(presets or PRESETS_BENEFICIOS))
+    rat = np.unique(np.asarray(rat_percs, dtype=float))
+    terceiros = np.unique(np.asarray(terceiros_percs, dtype=float))
+
+    # Eixos: (salário, preset, RAT, Terceiros)
+    forma = (len(salarios), len(presets), len(rat), len(terceiros))
+    beneficios = [beneficios_do_preset(p, personalizados) for p in presets]
+    por_preset = {
+        chave: np.array([b[chave] for b in beneficios]).reshape(1, -1, 1, 1)
+        for chave in BENEFICIOS_PADRAO
+    }
+
+    custos = np.empty((len(regimes),) + forma)
+    liquidos = np.empty((len(regimes),) + forma)
+    for i, regime in enumerate(regimes):
+        custos[i], liquidos[i] = calcular_totais_lote(
+            salarios.reshape(-1, 1, 1, 1), regime, incluir,
+            n_pass, v_pass, por_preset["vr"], por_preset["va"],
+            por_preset["saude"], por_preset["odonto"], seguro,
+            por_preset["home"], epi, outros,
+            rat.reshape(1, 1, -1, 1), terceiros.reshape(1, 1, 1, -1), dependentes, ano
+        )
+
+    indices = np.indices((len(regimes),) + forma).reshape(5, -1)
+    custo_mensal = custos.ravel()
+    return pd.DataFrame({
+        "Salário": salarios[indices[1]],
+        "Regime": pd.Categorical.from_codes(indices[0], categories=regimes),
+        "Preset": pd.Categorical.from_codes(indices[2], categories=presets),
+        "RAT (%)": rat[indices[3]],
+        "Terceiros (%)": terceiros[indices[4]],
+        "Custo Total Mensal": custo_mensal,
+        "Custo Total Anual": custo_mensal * 12,
+        "Salário Líquido": liquidos.ravel(),
+    })
+
+
+def encontrar_cruzamentos(grade):
+    """
+    Salários em que dois regimes trocam de posição, por preset, RAT e Terceiros.
+
+    Para cada par de regimes e cada combinação, percorre os salários da grade
+    em ordem crescente e marca onde a diferença de Custo Total Mensal entre
+    os dois troca de sinal (um ponto com custos iguais só conta se o outro
+    regime passa à frente depois dele). Como o custo é linear por partes no
+    salário, o cruzamento é interpolado entre os dois salários vizinhos da
+    grade; a precisão depende do passo da grade.
+
+    Retorna uma linha por cruzamento, em ordem de salário: as chaves do
+    cenário, Salário de Cruzamento, Regime Antes e Regime Depois (o mais
+    barato do par antes e depois) e Muda o Mais Barato, verdadeiro quando o
+    cruzamento troca o regime mais barato de todos.
+    """
+    custos = (
+        grade
+        .drop_duplicates(CHAVES_CENARIO + ["Salário", "Regime"])
+        .set_index(CHAVES_CENARIO + ["Salário", "Regime"])["Custo Total Mensal"]
+        .unstack("Regime")
+        .sort_index()
+    )
+    regimes = np.asarray(custos.columns)
+    valores = custos.to_numpy()
+    salarios = custos.index.get_level_values("Salário").to_numpy()
+    combinacoes = custos.index.droplevel("Salário")
+    grupo = pd.factorize(combinacoes)[0]
+    mesmo_grupo = grupo[1:] == grupo[:-1]
+    mais_barato = np.nanargmin(valores, axis=1)
+
+    linhas, salario_cruzamento, antes, depois = [np.zeros(0, int)], [np.zeros(0)], [np.zeros(0, int)], [np.zeros(0, int)]
+    for a, b in combinations(range(len(regimes)), 2):
+        diferenca = valores[:, a] - valores[:, b]
+        sinal = np.sign(diferenca)
+        # Último sinal não nulo até cada salário, dentro da combinação
+        ultimo_sinal = pd.Series(np.where(sinal != 0, sinal, np.nan)).groupby(grupo).ffill().to_numpy()
+        trocas = np.flatnonzero(mesmo_grupo & (sinal[1:] != 0) & (sinal[1:] == -ultimo_sinal[:-1]))
+
+        d0, d1 = diferenca[trocas], diferenca[trocas + 1]
+        passo = salarios[trocas + 1] - salarios[trocas]
+        linhas.append(trocas)
+        salario_cruzamento.append(salarios[trocas] + passo * d0 / (d0 - d1))
+        antes.append(np.where(d1 < 0, b, a))
+        depois.append(np.where(d1 < 0, a, b))
+
+    linhas, salario_cruzamento, antes, depois = (np.concatenate(x) for x in (linhas, salario_cruzamento, antes, depois))
+    ordem = np.lexsort((salario_cruzamento, linhas))
+    linhas, salario_cruzamento, antes, depois = (x[ordem] for x in (linhas, salario_cruzamento, antes, depois))
+
+    mais_barato_antes, mais_barato_depois = mais_barato[linhas], mais_barato[linhas + 1]
+    resultado = combinacoes[linhas].to_frame(index=False)
+    resultado["Salário de Cruzamento"] = salario_cruzamento
+    resultado["Regime Antes"] = regimes[antes]
+    resultado["Regime Depois"] = regimes[depois]
+    resultado["Muda o Mais Barato"] = (
+        (mais_barato_antes != mais_barato_depois)
+        & (np.minimum(antes, depois) == np.minimum(mais_barato_antes, mais_barato_depois))
+        & (np.maximum(antes, depois) == np.maximum(mais_barato_antes, mais_barato_depois))
+    )
+    return resultado
@@ -0,0 +1,223 @@
+"""
+Modo monetário exato: custos em centavos inteiros (int64).
+
+Cada parcela é arredondada para o centavo pela sua regra em
+REGRAS_ARREDONDAMENTO (o INSS do funcionário faixa a faixa, como na folha)
+e os totais são somas de inteiros: o custo mensal de cada linha é
+exatamente a soma das parcelas mostradas e o consolidado fecha, centavo a
+centavo, com a soma do detalhamento.
+
+Tudo continua vetorizado com NumPy: alíquotas viram frações inteiras
+(partes por milhão) e o arredondamento é feito com divisão inteira, sem
+Decimal nem laço por linha. Os produtos cabem em int64 para valores de
+até ~92 bilhões de reais por linha.
+"""
+import numpy as np
+import pandas as pd
+
+from calculo import CAMPOS_CUSTOS, COMPONENTES
+from instrumentacao import instrumentar
+from tabelas import ANO_PADRAO, obter_tabela
+
+MEIO_PARA_CIMA = "meio para cima"   # meio centavo arredonda para longe do zero (ROUND_HALF_UP)
+MEIO_PARA_PAR = "meio para par"     # meio centavo vai para o centavo par (ROUND_HALF_EVEN)
+TRUNCAR = "truncar"                 # descarta a fração de centavo (ROUND_DOWN)
+REGRAS = (MEIO_PARA_CIMA, MEIO_PARA_PAR, TRUNCAR)
+
+# Campo -> regra; as demais parcelas são valores em reais convertidos direto para centavos
+REGRAS_ARREDONDAMENTO = {
+    "decimo_terceiro": MEIO_PARA_CIMA,
+    "ferias": MEIO_PARA_CIMA,
+    "fgts": MEIO_PARA_CIMA,
+    "multa_fgts": MEIO_PARA_CIMA,       # 40% do FGTS já arredondado
+    "inss_patronal": MEIO_PARA_CIMA,
+    "rat": MEIO_PARA_CIMA,
+    "terceiros": MEIO_PARA_CIMA,
+    "desconto_vt": MEIO_PARA_CIMA,
+    "inss_funcionario": MEIO_PARA_CIMA,  # aplicada em cada faixa, antes da soma
+    "irrf_funcionario": MEIO_PARA_CIMA,  # aplicada à base × alíquota, antes da dedução
+    "salario_liquido": MEIO_PARA_CIMA,   # estimativa de 85% do PJ
+}
+
+PPM = 1_000_000
+
+# ---------------- ARITMÉTICA EM CENTAVOS ----------------
+
+def em_centavos(reais):
+    """
+    Reais (escalar ou array) em centavos int64, meio centavo para longe do
+    zero como no valor digitado: 12.345 vira 1235, embora em float seja
+    12.3449999...
+    """
+    reais = np.asarray(reais, dtype=float)
+    return (np.sign(reais) * np.floor(np.round(np.abs(reais) * 100, 6) + 0.5)).astype(np.int64)
+
+
+def _ppm(fracao):
+    """Fração (0.08 = 8%) em partes por milhão inteiras"""
+    return np.rint(np.asarray(fracao, dtype=float) * PPM).astype(np.int64)
+
+
+def aplicar_fracao(centavos, numerador, denominador=PPM, regra=MEIO_PARA_CIMA):
+    """`centavos` × numerador / denominador, arredondado para centavos pela `regra`, só com inteiros"""
+    produto = np.asarray(centavos, dtype=np.int64) * numerador
+    negativos = produto < 0
+    absoluto = np.abs(produto)
+    if regra == MEIO_PARA_CIMA:
+        quociente = (2 * absoluto + denominador) // (2 * denominador)
+    elif regra == MEIO_PARA_PAR:
+        quociente, resto = np.divmod(absoluto, denominador)
+        quociente = quociente + ((2 * resto > denominador) | ((2 * resto == denominador) & (quociente % 2 == 1)))
+    elif regra == TRUNCAR:
+        quociente = absoluto // denominador
+    else:
+        raise ValueError(f"Regra de arredondamento desconhecida: {regra} (use {', '.join(REGRAS)})")
+    return np.where(negativos, -quociente, quociente) if np.any(negativos) else quociente
+
+
+def _por_valor(valor, n):
+    """(valor, linhas) de cada valor distinto de um parâmetro escalar ou por funcionário"""
+    if not np.ndim(valor):
+        yield valor, slice(None)
+        return
+    codigos, distintos = pd.factorize(np.broadcast_to(np.asarray(valor), (n,)))
+    for codigo, distinto in enumerate(distintos):
+        yield distinto, np.flatnonzero(codigos == codigo)
+
+
+def _fatiar(valor, linhas):
+    return np.asarray(valor)[linhas] if np.ndim(valor) else valor
+
+# ---------------- ENCARGOS DO FUNCIONÁRIO ----------------
+
+def _inss(salario, tabela, regra):
+    """INSS progressivo com cada faixa arredondada separadamente"""
+    limites = em_centavos(tabela.limites_inss)
+    inss = np.zeros(len(salario), dtype=np.int64)
+    for base, limite, aliquota in zip(np.r_[0, limites[:-1]], limites, _ppm(tabela.aliquotas_inss)):
+        inss += aplicar_fracao(np.clip(salario, base, limite) - base, aliquota, PPM, regra)
+    return inss
+
+
+def _irrf(salario, inss, dependentes, tabela, regra):
+    base = salario - inss - em_centavos(np.asarray(dependentes, dtype=float) * tabela.deducao_dependente)
+    i = np.searchsorted(em_centavos(tabela.limites_irrf), base, side="left")
+    imposto = aplicar_fracao(base, _ppm(tabela.aliquotas_irrf)[i], PPM, regra) - em_centavos(tabela.deducoes_irrf)[i]
+    return np.maximum(imposto, 0)
+
+
+def _encargos_funcionario(salario, dependentes, ano, regras):
+    """INSS, IRRF e teto do INSS, em centavos, com a tabela do ano de cada linha"""
+    n = len(salario)
+    dependentes = np.broadcast_to(np.asarray(dependentes, dtype=float), (n,))
+    inss, irrf, teto = (np.zeros(n, dtype=np.int64) for _ in range(3))
+    for valor, linhas in _por_valor(ano, n):
+        tabela = obter_tabela(valor)
+        inss[linhas] = _inss(salario[linhas], tabela, regras["inss_funcionario"])
+        irrf[linhas] = _irrf(salario[linhas], inss[linhas], dependentes[linhas], tabela, regras["irrf_funcionario"])
+        teto[linhas] = em_centavos(tabela.teto_inss)
+    return inss, irrf, teto
+
+
+def calcular_inss_funcionario_centavos(salarios, ano=ANO_PADRAO, regras=None):
+    """Versão em centavos de calcular_inss_funcionario_lote: salários em reais, INSS em centavos"""
+    regras = {**REGRAS_ARREDONDAMENTO, **(regras or {})}
+    return _encargos_funcionario(em_centavos(np.atleast_1d(salarios)), 0, ano, regras)[0]
+
+
+def calcular_irrf_centavos(salarios, dependentes=0, ano=ANO_PADRAO, regras=None):
+    """Versão em centavos de calcular_irrf_lote: salários em reais, IRRF em centavos"""
+    regras = {**REGRAS_ARREDONDAMENTO, **(regras or {})}
+    return _encargos_funcionario(em_centavos(np.atleast_1d(salarios)), dependentes, ano, regras)[1]
+
+# ---------------- CÁLCULO EM CENTAVOS ----------------
+
+def _preencher(r, salario, regime, regras, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc, terceiros_perc, dependentes, ano):
+    """Parcelas e salário líquido, em centavos, das linhas de um único regime"""
+    n = len(salario)
+
+    if "CLT" in regime:
+        provisiona = np.broadcast_to(np.asarray(incluir, dtype=bool), (n,))
+        r["decimo_terceiro"][:] = np.where(provisiona, aplicar_fracao(salario, 1, 12, regras["decimo_terceiro"]), 0)
+        # 1/12 de férias + 1/3 disso = 1/9 do salário
+        r["ferias"][:] = np.where(provisiona, aplicar_fracao(salario, 1, 9, regras["ferias"]), 0)
+
+        r["fgts"][:] = aplicar_fracao(salario, 8, 100, regras["fgts"])
+        r["multa_fgts"][:] = aplicar_fracao(r["fgts"], 40, 100, regras["multa_fgts"])
+
+        vt_total = em_centavos(np.asarray(n_pass, dtype=float) * v_pass * 22)
+        r["desconto_vt"][:] = np.minimum(vt_total, aplicar_fracao(salario, 6, 100, regras["desconto_vt"]))
+        r["vale_transporte"][:] = np.maximum(0, vt_total - r["desconto_vt"])
+
+        inss, irrf, teto = _encargos_funcionario(salario, dependentes, ano, regras)
+        r["inss_funcionario"][:] = inss
+        r["irrf_funcionario"][:] = irrf
+
+        if regime == "CLT (Lucro Presumido/Real)":
+            base_inss = np.minimum(salario, teto)
+            for campo, aliquota in (
+                ("inss_patronal", 0.20), ("rat", np.asarray(rat_perc) / 100), ("terceiros", np.asarray(terceiros_perc) / 100)
+            ):
+                r[campo][:] = aplicar_fracao(base_inss, _ppm(aliquota), PPM, regras[campo])
+
+        r["salario_liquido"][:] = salario - inss - irrf - r["desconto_vt"]
+    else:  # PJ
+        r["valor_nota_fiscal"][:] = salario
+        r["salario_liquido"][:] = aplicar_fracao(salario, 85, 100, regras["salario_liquido"])  # Estimativa
+
+    for campo, valor in (
+        ("vale_refeicao", vr), ("vale_alimentacao", va), ("plano_saude", saude),
+        ("plano_odontologico", odonto), ("seguro_vida", seguro), ("home_office", home),
+        ("equipamentos", epi), ("outros", outros),
+    ):
+        r[campo][:] = em_centavos(valor)
+
+    r["custo_mensal"][:] = sum(r[campo] for campo in COMPONENTES) - (salario if "CLT" in regime else 0)
+    r["custo_anual"][:] = r["custo_mensal"] * 12
+
+
+@instrumentar("calcular_custos_centavos")
+def calcular_custos_centavos(salarios, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO, regras=None):
+    """
+    calcular_custos_lote em centavos inteiros.
+
+    Mesmos parâmetros, em reais (inclusive os por funcionário), e mesmas
+    colunas (CAMPOS_CUSTOS), mas no tipo Int64 do pandas: centavos exatos,
+    com <NA> nas linhas de salário vazio. `regras` troca a regra de
+    arredondamento de alguns campos (veja REGRAS_ARREDONDAMENTO).
+    """
+    regras = {**REGRAS_ARREDONDAMENTO, **(regras or {})}
+    indice = salarios.index if isinstance(salarios, pd.Series) else None
+    reais = np.asarray(salarios, dtype=float)
+    vazias = np.isnan(reais)
+    salario = em_centavos(np.where(vazias, 0.0, reais))
+
+    colunas = {campo: np.zeros(len(salario), dtype=np.int64) for campo in CAMPOS_CUSTOS}
+    parametros = dict(
+        incluir=incluir, n_pass=n_pass, v_pass=v_pass, vr=vr, va=va,
+        saude=saude, odonto=odonto, seguro=seguro, home=home, epi=epi, outros=outros,
+        rat_perc=rat_perc, terceiros_perc=terceiros_perc, dependentes=dependentes, ano=ano,
+    )
+    for valor, linhas in _por_valor(regime, len(salario)):
+        if isinstance(linhas, slice):  # um só regime: preenche as colunas direto
+            _preencher(colunas, salario, str(valor), regras, **parametros)
+            continue
+        parcial = {campo: np.zeros(len(linhas), dtype=np.int64) for campo in CAMPOS_CUSTOS}
+        _preencher(
+            parcial, salario[linhas], str(valor), regras,
+            **{nome: _fatiar(p, linhas) for nome, p in parametros.items()}
+        )
+        for campo in CAMPOS_CUSTOS:
+            colunas[campo][linhas] = parcial[campo]
+
+    return pd.DataFrame(
+        {campo: pd.arrays.IntegerArray(valores, vazias.copy()) for campo, valores in colunas.items()},
+        index=indice, copy=False,
+    )
+
+
+def em_reais(centavos):
+    """DataFrame em centavos (de calcular_custos_centavos) em reais float64, com NaN no lugar de <NA>"""
+    return pd.DataFrame(
+        centavos.to_numpy(dtype=float, na_value=np.nan) / 100, index=centavos.index, columns=centavos.columns
+    )
@@ -0,0 +1,305 @@
+"""
+Processamento de planilhas de custo de funcionários sem Streamlit nem Plotly.
+
+Exemplos:
+    python cli.py funcionarios.xlsx --coluna-salario Salario --coluna-grupo Depto
+    python cli.py folha.csv -o custos.csv --coluna-salario Salario --coluna-grupo Depto --streaming
+    python cli.py folha.csv --coluna-salario Salario --coluna-grupo Depto --trace etapas.trace.json
+
+Só a biblioteca padrão é importada até os argumentos serem validados; pandas
+e o motor vetorizado são carregados apenas quando há trabalho a fazer.
+"""
+import argparse
+import gzip
+import sys
+import time
+from pathlib import Path
+
+from calculo import PARAMETROS_MAPEAVEIS, PRESETS_BENEFICIOS, REGIMES, beneficios_do_preset
+from instrumentacao import encerrar, etapa as medir_etapa, iniciar
+from tabelas import ANO_PADRAO, TABELAS_TRIBUTARIAS
+
+# extensão -> formato; a ordem importa para ".csv.gz" vir antes de ".csv"
+FORMATOS_SAIDA = {
+    ".xlsx": "xlsx",
+    ".csv.gz": "csv.gz",
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+}
+FORMATOS_STREAMING = ("xlsx", "xlsx-streaming", "csv", "csv.gz")
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Calcula o custo de cada funcionário de uma planilha e gera o detalhamento e o consolidado.",
+    )
+    parser.add_argument("entrada", type=Path, nargs="+",
+                        help="planilhas de entrada (.xlsx ou .csv); várias são calculadas juntas, "
+                             "com a coluna \"Arquivo de origem\"")
+    parser.add_argument("-o", "--saida", type=Path,
+                        help="arquivo de saída: .xlsx (abas Detalhamento e Consolidado) ou .csv, .csv.gz, "
+                             ".parquet, .arrow (gera também <nome>_consolidado.<ext>); "
+                             "padrão: <primeira entrada>_custos.xlsx")
+    parser.add_argument("--formato", choices=list(FORMATOS_SAIDA.values()) + ["xlsx-streaming"],
+                        help="formato da saída; padrão: deduzido da extensão. "
+                             "xlsx-streaming grava o Excel linha a linha com pouca memória")
+    parser.add_argument("--coluna-salario", required=True, help="coluna com o salário bruto")
+    parser.add_argument("--coluna-grupo", required=True, help="coluna usada no relatório consolidado")
+
+    contrato = parser.add_argument_group("dados contratuais")
+    contrato.add_argument("--regime", choices=REGIMES, default=REGIMES[0])
+    contrato.add_argument("--sem-provisoes", action="store_true", help="não provisionar férias e 13º")
+    contrato.add_argument("--dependentes", type=int, default=0)
+    contrato.add_argument("--ano", type=int, choices=list(TABELAS_TRIBUTARIAS), default=ANO_PADRAO,
+                          help="ano da tabela tributária")
+    contrato.add_argument("--rat", type=float, default=2.0, help="RAT (%%), só CLT Lucro Presumido/Real")
+    contrato.add_argument("--terceiros", type=float, default=5.8, help="Terceiros/Sistema S (%%)")
+    contrato.add_argument("--centavos", action="store_true",
+                          help="modo monetário exato: cada parcela arredondada ao centavo pela sua regra e "
+                               "consolidado somado em centavos inteiros")
+
+    beneficios = parser.add_argument_group("benefícios (R$/mês)")
+    beneficios.add_argument("--preset", choices=list(PRESETS_BENEFICIOS), default="Personalizado",
+                            help="valores de VR, VA, saúde, odonto e home office por área")
+    for nome in ("vr", "va", "saude", "odonto", "seguro", "home", "epi", "outros"):
+        beneficios.add_argument(f"--{nome}", type=float)
+    beneficios.add_argument("--passagens", type=int, default=2, help="passagens por dia")
+    beneficios.add_argument("--valor-passagem", type=float, default=5.50)
+
+    por_linha = parser.add_argument_group(
+        "parâmetros por funcionário",
+        "colunas da planilha que substituem, linha a linha, os valores acima; células vazias usam o valor acima",
+    )
+    for nome, rotulo in PARAMETROS_MAPEAVEIS.items():
+        por_linha.add_argument(f"--coluna-{nome.replace('_', '-')}", dest=f"coluna_{nome}", metavar="COLUNA",
+                               help=rotulo.replace("%", "%%"))
+
+    execucao = parser.add_argument_group("execução")
+    execucao.add_argument("--streaming", action="store_true",
+                          help=f"lê e grava em blocos com memória constante (saída {', '.join(FORMATOS_STREAMING)})")
+    execucao.add_argument("--tamanho-bloco", type=int, default=50_000)
+    execucao.add_argument("--workers", type=int, default=0,
+                          help="processos para o cálculo paralelo (0 = serial, nas mesmas partições)")
+    execucao.add_argument("--somente-colunas-usadas", action="store_true",
+                          help="lê só as colunas de salário, grupo e parâmetros (o detalhamento sai sem as demais)")
+    execucao.add_argument("--pyarrow", action="store_true",
+                          help="usa o leitor CSV do pyarrow quando o arquivo não tem separador de milhar")
+    execucao.add_argument("--todas-abas", action="store_true",
+                          help="lê todas as abas de cada .xlsx, com a coluna \"Aba de origem\"")
+    execucao.add_argument("--sem-cache", action="store_true",
+                          help="não usa nem grava o cache da planilha lida (Feather em CUSTO_CLT_CACHE)")
+    execucao.add_argument("--progresso", action="store_true",
+                          help="calcula pela fila de tarefas e mostra o andamento de cada bloco em stderr")
+    execucao.add_argument("--tempo", action="store_true", help="mostra o tempo de cada etapa em stderr")
+
+    historico = parser.add_argument_group("histórico")
+    historico.add_argument("--salvar-historico", action="store_true",
+                           help="grava a execução no histórico SQLite (CUSTO_CLT_HISTORICO) para comparar depois")
+    historico.add_argument("--competencia", metavar="AAAA-MM", help="mês de referência no histórico; padrão: o atual")
+    historico.add_argument("--coluna-chave",
+                           help="coluna que identifica o funcionário no histórico (matrícula, CPF...); "
+                                "padrão: a posição da linha")
+
+    diagnostico = parser.add_argument_group("diagnóstico")
+    diagnostico.add_argument("--diagnostico", type=Path, metavar="ARQUIVO",
+                             help="grava tempo, chamadas e pico de memória de cada etapa em JSON")
+    diagnostico.add_argument("--trace", type=Path, metavar="ARQUIVO",
+                             help="grava as etapas no formato Chrome trace (chrome://tracing, ui.perfetto.dev)")
+    diagnostico.add_argument("--memoria", action="store_true",
+                             help="mede o pico de memória de cada etapa com tracemalloc (mais lento)")
+    return parser
+
+
+def montar_parametros(args):
+    """Parâmetros de calcular_custos_lote: argumento explícito > preset > padrão do app"""
+    preset = beneficios_do_preset(args.preset)
+
+    def beneficio(nome):
+        valor = getattr(args, nome)
+        if valor is not None:
+            return valor
+        return preset.get(nome, 0.0)
+
+    parametros = dict(
+        regime=args.regime, incluir=not args.sem_provisoes,
+        n_pass=args.passagens, v_pass=args.valor_passagem,
+        vr=beneficio("vr"), va=beneficio("va"),
+        saude=beneficio("saude"), odonto=beneficio("odonto"), seguro=beneficio("seguro"),
+        home=beneficio("home"), epi=beneficio("epi"), outros=beneficio("outros"),
+        rat_perc=args.rat, terceiros_perc=args.terceiros, dependentes=args.dependentes,
+        ano=args.ano
+    )
+    if args.centavos:
+        parametros["centavos"] = True
+    return parametros
+
+
+def montar_colunas_parametros(args):
+    """Parâmetro -> coluna da planilha, só para os mapeados com --coluna-*"""
+    return {
+        nome: getattr(args, f"coluna_{nome}")
+        for nome in PARAMETROS_MAPEAVEIS
+        if getattr(args, f"coluna_{nome}") is not None
+    }
+
+
+def separar_extensao(caminho):
+    """(nome sem extensão, extensão reconhecida) — '.csv.gz' conta como uma só"""
+    for extensao in FORMATOS_SAIDA:
+        if caminho.name.endswith(extensao):
+            return caminho.name[:-len(extensao)], extensao
+    return caminho.stem, caminho.suffix
+
+
+def mostrar_progresso(fracao, mensagem):
+    andamento = "" if fracao is None else f"{fracao:6.1%} "
+    print(f"[progresso] {andamento}{mensagem}", file=sys.stderr)
+
+
+def calcular_pela_fila(df_input, args, parametros, colunas_parametros):
+    """Mesmo cálculo do app em segundo plano: uma tarefa na FilaTarefas, acompanhada até o fim"""
+    from tarefas import FilaTarefas, calcular_planilha_tarefa
+
+    fila = FilaTarefas(max_simultaneas=1)
+    id_tarefa = fila.enviar(
+        calcular_planilha_tarefa, df_input, args.coluna_salario, args.coluna_grupo, parametros,
+        colunas_parametros, None, args.workers or 1, args.tamanho_bloco, descricao=", ".join(e.name for e in args.entrada)
+    )
+    tarefa = fila.tarefa(id_tarefa)
+    ultima = None
+    try:
+        while not tarefa.terminou:
+            if tarefa.mensagem != ultima:
+                ultima = tarefa.mensagem
+                mostrar_progresso(tarefa.progresso, ultima)
+            time.sleep(0.2)
+        dados = fila.aguardar(id_tarefa)
+    finally:
+        fila.encerrar()
+    mostrar_progresso(1.0, "concluída")
+    return dados["df_final"], dados["relatorio"]
+
+
+def main(argv=None):
+    inicio = time.perf_counter()
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+
+    saida = args.saida or args.entrada[0].with_name(args.entrada[0].stem + "_custos.xlsx")
+    nome_saida, extensao = separar_extensao(saida)
+    formato = args.formato or FORMATOS_SAIDA.get(extensao)
+    if formato is None:
+        parser.error(f"extensão de saída não reconhecida: {saida.name} (use --formato)")
+    if args.streaming and formato not in FORMATOS_STREAMING:
+        parser.error(f"--streaming não suporta {formato}; use {', '.join(FORMATOS_STREAMING)}")
+    for entrada in args.entrada:
+        if not entrada.exists():
+            parser.error(f"arquivo não encontrado: {entrada}")
+
+    def etapa(nome):
+        if args.tempo:
+            print(f"[{time.perf_counter() - inicio:8.3f}s] {nome}", file=sys.stderr)
+
+    etapa("argumentos validados")
+    coletor = iniciar(args.memoria) if args.diagnostico or args.trace else None
+    from processamento import (
+        EscritorCsv, EscritorXlsx, exportar_excel, exportar_excel_streaming, exportar_tabela,
+        ler_blocos_de_varios, ler_planilhas, processar_em_blocos, processar_paralelo, relatorio_com_total,
+    )
+    etapa("bibliotecas carregadas")
+    if args.salvar_historico:
+        from historico import normalizar_competencia
+        try:
+            args.competencia = normalizar_competencia(args.competencia)
+        except ValueError as erro:
+            parser.error(str(erro))
+
+    parametros = montar_parametros(args)
+    colunas_parametros = montar_colunas_parametros(args)
+    consolidado = saida.with_name(nome_saida + "_consolidado" + extensao)
+    colunas = None
+    if args.somente_colunas_usadas:
+        colunas = list(dict.fromkeys([args.coluna_salario, args.coluna_grupo, *colunas_parametros.values()]))
+    motor = "pyarrow" if args.pyarrow else None
+    entradas = [(entrada.name, entrada) for entrada in args.entrada]
+
+    try:
+        if args.streaming:
+            progresso = (lambda linhas, _: mostrar_progresso(None, f"{linhas:,} linhas processadas")) if args.progresso else None
+            blocos = ler_blocos_de_varios(entradas, args.tamanho_bloco, args.todas_abas, colunas)
+            if formato in ("xlsx", "xlsx-streaming"):
+                escritor = EscritorXlsx(saida)
+                relatorio, total = processar_em_blocos(
+                    blocos, args.coluna_salario, args.coluna_grupo, parametros, escritor, colunas_parametros,
+                    progresso
+                )
+                escritor.adicionar_aba("Consolidado", relatorio_com_total(relatorio, args.coluna_grupo))
+                escritor.fechar()
+            else:
+                abrir = gzip.open if formato == "csv.gz" else open
+                with abrir(saida, "wt", encoding="utf-8", newline="") as destino:
+                    relatorio, total = processar_em_blocos(
+                        blocos, args.coluna_salario, args.coluna_grupo, parametros, EscritorCsv(destino),
+                        colunas_parametros, progresso
+                    )
+                relatorio_com_total(relatorio, args.coluna_grupo).to_csv(consolidado, index=False)
+            df_final = None
+            etapa("planilha calculada e detalhamento gravado")
+        else:
+            with medir_etapa("leitura da planilha"):
+                df_input = ler_planilhas(entradas, args.todas_abas, colunas, motor, cache=not args.sem_cache)
+            etapa(f"planilha lida ({len(df_input)} linhas)")
+
+            if args.progresso:
+                df_final, relatorio = calcular_pela_fila(df_input, args, parametros, colunas_parametros)
+            else:
+                # Serial (workers=1) nas mesmas partições do paralelo: consolidado idêntico
+                df_final, relatorio = processar_paralelo(
+                    df_input, args.coluna_salario, args.coluna_grupo, parametros, args.workers or 1,
+                    colunas_parametros=colunas_parametros
+                )
+            total = len(df_final)
+            etapa("custos calculados")
+
+            if formato == "xlsx":
+                exportar_excel(saida, relatorio, args.coluna_grupo, df_final)
+            elif formato == "xlsx-streaming":
+                exportar_excel_streaming(saida, relatorio, args.coluna_grupo, df_final)
+            elif formato == "csv":
+                with medir_etapa("gravação CSV"):
+                    df_final.to_csv(saida, index=False)
+                    relatorio_com_total(relatorio, args.coluna_grupo).to_csv(consolidado, index=False)
+            else:
+                exportar_tabela(df_final, saida, formato)
+                exportar_tabela(relatorio, consolidado, formato)
+
+        if args.salvar_historico:
+            from historico import HistoricoCalculos
+            id_execucao = HistoricoCalculos().salvar(
+                relatorio, args.coluna_grupo, parametros, df_final, args.coluna_salario, args.coluna_chave,
+                args.competencia, arquivo=", ".join(e.name for e in args.entrada),
+                colunas_parametros=colunas_parametros, total_funcionarios=total
+            )
+            etapa(f"execução {id_execucao} salva no histórico")
+    except ValueError as erro:
+        # Dados da planilha inválidos (regime ou preset desconhecido, ano sem tabela)
+        print(f"{parser.prog}: erro: {erro}", file=sys.stderr)
+        return 1
+    etapa(f"saída gravada em {saida}")
+
+    if coletor is not None:
+        encerrar()
+        if args.diagnostico:
+            args.diagnostico.write_text(coletor.para_json(), encoding="utf-8")
+        if args.trace:
+            args.trace.write_text(coletor.para_chrome_trace(), encoding="utf-8")
+
+    print(f"{total} funcionários | custo mensal R$ {relatorio['Custo Total Mensal'].sum():,.2f} "
+          f"| custo anual R$ {relatorio['Custo Total Anual'].sum():,.2f} -> {saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
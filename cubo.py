@@ -0,0 +1,125 @@
+"""
+Cubo de custos: somas por combinação de dimensões da planilha.
+
+O cubo é montado uma vez por cálculo a partir do detalhamento: cada
+dimensão vira códigos inteiros (pd.factorize) e cada combinação presente
+guarda a soma de cada coluna de custo e a quantidade de funcionários.
+Agrupar por qualquer subconjunto das dimensões (roll-up), filtrar valores
+(drill-down) ou trocar de dimensão soma só as células do cubo, sem voltar
+às linhas da planilha.
+
+Só usa NumPy e pandas.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from instrumentacao import instrumentar
+
+# ---------------- CUBO ----------------
+
+class CuboCustos:
+    """
+    Somas de `valores` por combinação de `dimensoes` de um detalhamento.
+
+    Células vazias numa dimensão ganham um código próprio: entram nas somas
+    que não agrupam nem filtram por ela e são descartadas quando a dimensão é
+    pedida, como no groupby. Valores ausentes contam como zero nas somas e
+    `Quantidade` conta as linhas com `coluna_contagem` preenchida (todas,
+    sem ela), igual ao agregar_por_grupo.
+    """
+
+    @instrumentar("montagem do cubo")
+    def __init__(self, df_final, dimensoes, valores, coluna_contagem=None):
+        if not dimensoes:
+            raise ValueError("Escolha ao menos uma dimensão para o cubo")
+        self.dimensoes = list(dimensoes)
+        self.valores = list(valores)
+        self.linhas = len(df_final)
+
+        codigos = []
+        self.rotulos = {}
+        for dimensao in self.dimensoes:
+            codigo, rotulos = pd.factorize(df_final[dimensao], sort=True)
+            self.rotulos[dimensao] = pd.Index(rotulos)
+            codigos.append(np.where(codigo < 0, len(rotulos), codigo))
+        tamanhos = tuple(len(self.rotulos[d]) + 1 for d in self.dimensoes)
+
+        if math.prod(tamanhos) < 2**62:
+            celulas, inversa = np.unique(np.ravel_multi_index(codigos, tamanhos), return_inverse=True)
+            self.codigos = np.stack(np.unravel_index(celulas, tamanhos))
+        else:
+            celulas, inversa = np.unique(np.stack(codigos, axis=1), axis=0, return_inverse=True)
+            self.codigos = celulas.T
+        inversa = inversa.ravel()
+        n = len(self.codigos[0])
+
+        self.somas = np.column_stack([
+            np.bincount(inversa, weights=np.nan_to_num(df_final[coluna].to_numpy(dtype=float)), minlength=n)
+            for coluna in self.valores
+        ]) if self.valores else np.zeros((n, 0))
+        presentes = np.ones(len(df_final)) if coluna_contagem is None else df_final[coluna_contagem].notna().to_numpy(dtype=float)
+        self.quantidade = np.bincount(inversa, weights=presentes, minlength=n)
+
+    @property
+    def n_celulas(self):
+        return self.codigos.shape[1]
+
+    def _posicao(self, dimensao):
+        if dimensao not in self.rotulos:
+            raise ValueError(f"Dimensão fora do cubo: {dimensao} (disponíveis: {', '.join(map(str, self.dimensoes))})")
+        return self.dimensoes.index(dimensao)
+
+    @instrumentar("consulta ao cubo")
+    def agregar(self, dimensoes=(), filtros=None, valores=None):
+        """
+        Somas por `dimensoes` (subconjunto das do cubo) nas células que passam
+        nos `filtros` ({dimensão: valores aceitos}).
+
+        Devolve um DataFrame como o relatório consolidado: uma coluna por
+        dimensão, as somas de `valores` (todos, por padrão) e Quantidade,
+        ordenado pelo Custo Total Anual quando ele está entre os valores.
+        Sem dimensões, devolve uma única linha com o total.
+        """
+        dimensoes = list(dimensoes)
+        posicoes = [self._posicao(d) for d in dimensoes]
+        valores = self.valores if valores is None else list(valores)
+        colunas = [self.valores.index(v) for v in valores]
+
+        mascara = np.ones(self.n_celulas, dtype=bool)
+        for dimensao, aceitos in (filtros or {}).items():
+            i = self._posicao(dimensao)
+            permitidos = np.zeros(len(self.rotulos[dimensao]) + 1, dtype=bool)
+            indices = self.rotulos[dimensao].get_indexer(list(aceitos))
+            permitidos[indices[indices >= 0]] = True
+            mascara &= permitidos[self.codigos[i]]
+        for dimensao, i in zip(dimensoes, posicoes):
+            mascara &= self.codigos[i] < len(self.rotulos[dimensao])
+
+        codigos = [self.codigos[i][mascara] for i in posicoes]
+        if codigos:
+            tamanhos = tuple(len(self.rotulos[d]) for d in dimensoes)
+            grupos, inversa = np.unique(np.ravel_multi_index(codigos, tamanhos), return_inverse=True)
+            chaves = np.unravel_index(grupos, tamanhos)
+        else:
+            grupos, inversa, chaves = np.zeros(1), np.zeros(int(mascara.sum()), dtype=np.int64), ()
+        inversa = inversa.ravel()
+        n = len(grupos)
+
+        tabela = {d: self.rotulos[d].take(chave) for d, chave in zip(dimensoes, chaves)}
+        somas = self.somas[mascara]
+        for valor, j in zip(valores, colunas):
+            tabela[valor] = np.bincount(inversa, weights=somas[:, j], minlength=n)
+        tabela["Quantidade"] = np.bincount(inversa, weights=self.quantidade[mascara], minlength=n).astype("int64")
+
+        resultado = pd.DataFrame(tabela)
+        if "Custo Total Anual" in resultado and dimensoes:
+            resultado = resultado.sort_values("Custo Total Anual", ascending=False, ignore_index=True)
+        return resultado
+
+
+def montar_cubo(df_final, df_input, dimensoes, coluna_salario):
+    """Cubo das colunas de custo do detalhamento (as que não vieram da planilha de entrada)"""
+    valores = [c for c in df_final.columns if c not in df_input.columns]
+    return CuboCustos(df_final, dimensoes, valores, coluna_salario)
@@ -0,0 +1,153 @@
+from functools import lru_cache
+
+import numpy as np
+
+from calculo_lote import calcular_totais_lote
+from tabelas import ANO_PADRAO, obter_tabela
+
+# ---------------- CURVAS LINEARES POR PARTES ----------------
+
+def pontos_de_quebra(regime, n_pass, v_pass, dependentes=0, ano=ANO_PADRAO):
+    """
+    Salários em que o custo ou o salário líquido mudam de inclinação.
+
+    Entre dois pontos consecutivos (e depois do último) as duas curvas são
+    retas: faixas de INSS, teto do INSS, limite de 6% do VT e faixas de IRRF,
+    estas convertidas da base de cálculo para o salário bruto.
+    """
+    if "CLT" not in regime:
+        return np.array([0.0])
+
+    tabela = obter_tabela(ano)
+    pontos = [0.0, *tabela.limites_inss]
+
+    vt_total = (n_pass * v_pass) * 22
+    pontos.append(vt_total / 0.06)
+
+    pontos.extend(tabela.salarios_limite_irrf(dependentes))
+
+    pontos = np.unique(np.asarray(pontos, dtype=float))
+    return pontos[pontos >= 0]
+
+
+@lru_cache(maxsize=256)
+def _curvas(regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc, terceiros_perc, dependentes, ano):
+    """
+    Reta de cada segmento (pontos[k], pontos[k+1]] para o custo e o líquido.
+
+    As retas são ajustadas em dois pontos internos de cada segmento, não nas
+    pontas: as parcelas a deduzir do IRRF são arredondadas e a função tem
+    pequenos saltos nos limites de faixa, que as pontas misturariam.
+
+    Retorna (pontos, custo, liquido), com custo e liquido no formato
+    (valor em zero, inclinações, interceptos).
+    """
+    pontos = pontos_de_quebra(regime, n_pass, v_pass, dependentes, ano)
+    largura = np.append(np.diff(pontos), 3.0)
+    x1 = pontos + largura / 3
+    x2 = pontos + 2 * largura / 3
+    custo, liquido = calcular_totais_lote(
+        np.concatenate([[0.0], x1, x2]), regime, incluir,
+        n_pass, v_pass, vr, va,
+        saude, odonto, seguro,
+        home, epi, outros,
+        rat_perc, terceiros_perc, dependentes, ano
+    )
+
+    def retas(valores):
+        f1, f2 = valores[1:len(pontos) + 1], valores[len(pontos) + 1:]
+        inclinacao = (f2 - f1) / (x2 - x1)
+        return float(valores[0]), inclinacao, f1 - inclinacao * x1
+
+    return pontos, retas(custo), retas(liquido)
+
+
+def _segmentos(pontos, inclinacao, intercepto, alvo):
+    """Valores de f nas pontas de cada segmento e a solução de f(s) = alvo na reta"""
+    alvo = np.asarray(alvo, dtype=float)[..., None]
+    a = pontos
+    b = np.append(pontos[1:], np.inf)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fa = intercepto + inclinacao * a
+        fb = np.where(inclinacao == 0, intercepto, intercepto + inclinacao * b)
+        solucao = (alvo - intercepto) / inclinacao
+    return alvo, a, b, fa, fb, solucao
+
+
+def _maior_salario_ate(pontos, curva, alvo):
+    """sup{s >= 0 : f(s) <= alvo} para f linear por partes; inf se ilimitado, nan se vazio"""
+    valor_zero, inclinacao, intercepto = curva
+    alvo, a, b, fa, fb, solucao = _segmentos(pontos, inclinacao, intercepto, alvo)
+
+    candidato = np.where(fb <= alvo, b, np.where(fa <= alvo, solucao, np.nan))
+    zero = np.where(valor_zero <= alvo, 0.0, np.nan)
+    todos = np.concatenate([np.broadcast_to(zero, alvo.shape), candidato], axis=-1)
+
+    vazio = np.isnan(todos).all(axis=-1)
+    return np.where(vazio, np.nan, np.where(np.isnan(todos), -np.inf, todos).max(axis=-1))
+
+
+def _menor_salario_desde(pontos, curva, alvo):
+    """inf{s >= 0 : f(s) >= alvo} para f linear por partes; nan se nunca alcança"""
+    valor_zero, inclinacao, intercepto = curva
+    alvo, a, b, fa, fb, solucao = _segmentos(pontos, inclinacao, intercepto, alvo)
+
+    candidato = np.where(fa >= alvo, a, np.where(fb >= alvo, solucao, np.nan))
+    zero = np.where(valor_zero >= alvo, 0.0, np.nan)
+    todos = np.concatenate([np.broadcast_to(zero, alvo.shape), candidato], axis=-1)
+
+    vazio = np.isnan(todos).all(axis=-1)
+    return np.where(vazio, np.nan, np.where(np.isnan(todos), np.inf, todos).min(axis=-1))
+
+
+def _escalar_se_preciso(alvo, resultado):
+    return float(resultado) if np.ndim(alvo) == 0 else resultado
+
+# ---------------- SOLVER INVERSO ----------------
+
+def salario_maximo_para_custo(custo_alvo, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """
+    Maior salário bruto cujo Custo Total Mensal (calcular_custos) não passa de `custo_alvo`.
+
+    A curva de custo é montada uma vez por conjunto de parâmetros (e
+    memorizada) a partir dos pontos de quebra; cada alvo é resolvido de forma
+    exata no segmento linear em que cai. `custo_alvo` pode ser um escalar ou
+    um array. Devolve inf quando qualquer salário cabe no alvo e nan quando
+    nenhum cabe.
+    """
+    pontos, custo, _ = _curvas(
+        regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros,
+        rat_perc, terceiros_perc, dependentes, ano
+    )
+    return _escalar_se_preciso(custo_alvo, _maior_salario_ate(pontos, custo, custo_alvo))
+
+
+def salario_maximo_para_margem(receita, margem_perc, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """Maior salário bruto que mantém a margem `margem_perc` (%) sobre a receita mensal"""
+    custo_alvo = np.asarray(receita, dtype=float) * (1 - np.asarray(margem_perc, dtype=float) / 100)
+    resultado = salario_maximo_para_custo(
+        custo_alvo, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros,
+        rat_perc, terceiros_perc, dependentes, ano
+    )
+    return _escalar_se_preciso(custo_alvo, resultado)
+
+
+def salario_bruto_para_liquido(liquido_alvo, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """Menor salário bruto cujo salário líquido chega a `liquido_alvo` (escalar ou array)"""
+    pontos, _, liquido = _curvas(
+        regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros,
+        rat_perc, terceiros_perc, dependentes, ano
+    )
+    return _escalar_se_preciso(liquido_alvo, _menor_salario_desde(pontos, liquido, liquido_alvo))
+
+
+def margem_para_salario(receita, salario, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """Margem (%) sobre a receita mensal ao pagar `salario`; receita e salário podem ser arrays"""
+    custo, _ = calcular_totais_lote(
+        salario, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros,
+        rat_perc, terceiros_perc, dependentes, ano
+    )
+    receita = np.asarray(receita, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margem = (receita - custo) / receita * 100
+    return float(margem) if np.ndim(margem) == 0 else margem
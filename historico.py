@@ -0,0 +1,307 @@
+"""
+Histórico de cálculos de planilha num banco SQLite local.
+
+Cada execução salva guarda os parâmetros usados, o ano e a versão da tabela
+tributária, o consolidado por grupo e o custo de cada funcionário. As
+consultas (evolução de um grupo, comparação entre competências, custo de um
+funcionário ao longo das execuções) usam os índices por execução, grupo e
+chave do funcionário: não recalculam nem releem planilha nenhuma.
+
+O banco usa só o sqlite3 da biblioteca padrão; as consultas devolvem
+DataFrames do pandas.
+"""
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import repeat
+
+import pandas as pd
+
+from instrumentacao import instrumentar
+from tabelas import ANO_PADRAO, obter_tabela
+
+ARQUIVO_HISTORICO = os.environ.get(
+    "CUSTO_CLT_HISTORICO", os.path.join(os.path.expanduser("~"), ".custo_clt", "historico.sqlite3")
+)
+CACHE_SQLITE_KB = 64 * 1024
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id INTEGER PRIMARY KEY,
+    criada TEXT NOT NULL,
+    competencia TEXT NOT NULL,
+    rotulo TEXT NOT NULL DEFAULT '',
+    arquivo TEXT NOT NULL DEFAULT '',
+    hash_entrada TEXT NOT NULL DEFAULT '',
+    coluna_grupo TEXT NOT NULL,
+    coluna_salario TEXT,
+    coluna_chave TEXT,
+    parametros TEXT NOT NULL,
+    colunas_parametros TEXT NOT NULL,
+    ano_tabela INTEGER NOT NULL,
+    versao_tabela TEXT NOT NULL,
+    funcionarios INTEGER NOT NULL,
+    custo_mensal REAL NOT NULL,
+    custo_anual REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS execucoes_competencia ON execucoes (competencia, id);
+
+CREATE TABLE IF NOT EXISTS grupos (
+    execucao INTEGER NOT NULL REFERENCES execucoes (id) ON DELETE CASCADE,
+    grupo TEXT NOT NULL,
+    quantidade INTEGER NOT NULL,
+    custo_mensal REAL NOT NULL,
+    custo_anual REAL NOT NULL,
+    PRIMARY KEY (execucao, grupo)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS grupos_grupo ON grupos (grupo, execucao);
+
+CREATE TABLE IF NOT EXISTS funcionarios (
+    execucao INTEGER NOT NULL REFERENCES execucoes (id) ON DELETE CASCADE,
+    chave TEXT NOT NULL,
+    grupo TEXT,
+    salario REAL,
+    custo_mensal REAL,
+    custo_anual REAL,
+    PRIMARY KEY (execucao, chave)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS funcionarios_chave ON funcionarios (chave, execucao);
+"""
+
+COLUNAS_EXECUCOES = {
+    "id": "Execução",
+    "competencia": "Competência",
+    "rotulo": "Rótulo",
+    "criada": "Salva em",
+    "arquivo": "Arquivo",
+    "coluna_grupo": "Agrupado por",
+    "ano_tabela": "Ano da tabela",
+    "versao_tabela": "Versão da tabela",
+    "funcionarios": "Funcionários",
+    "custo_mensal": "Custo Total Mensal",
+    "custo_anual": "Custo Total Anual",
+}
+COLUNAS_CUSTO = {
+    "quantidade": "Quantidade",
+    "salario": "Salário",
+    "custo_mensal": "Custo Total Mensal",
+    "custo_anual": "Custo Total Anual",
+}
+
+
+def normalizar_competencia(competencia=None):
+    """Mês de referência como 'AAAA-MM'; aceita texto, date, Timestamp ou Period (padrão: mês atual)"""
+    if competencia is None:
+        competencia = datetime.now()
+    try:
+        return pd.Period(competencia, freq="M").strftime("%Y-%m")
+    except (ValueError, TypeError):
+        raise ValueError(f"Competência inválida: {competencia} (use AAAA-MM)") from None
+
+
+def _texto(valores):
+    """Valores de uma coluna como texto para o banco; vazios viram NULL"""
+    valores = pd.Series(valores)
+    return valores.astype(str).astype(object).where(valores.notna(), None).tolist()
+
+# ---------------- HISTÓRICO ----------------
+
+class HistoricoCalculos:
+    """
+    Banco de execuções salvas em `caminho` (criado na primeira vez).
+
+    Cada operação abre a própria conexão, então a mesma instância pode ser
+    usada de threads diferentes (o app roda cada rerun numa thread). O banco
+    fica em modo WAL: consultas não esperam uma gravação em andamento.
+    """
+
+    def __init__(self, caminho=ARQUIVO_HISTORICO):
+        self.caminho = str(caminho)
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode = WAL")
+            conexao.executescript(ESQUEMA)
+
+    @contextmanager
+    def _conectar(self):
+        """Conexão numa transação: confirmada no fim do bloco, desfeita se houver erro"""
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            conexao.execute("PRAGMA foreign_keys = ON")
+            conexao.execute("PRAGMA synchronous = NORMAL")
+            conexao.execute(f"PRAGMA cache_size = -{CACHE_SQLITE_KB}")
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    def _consultar(self, sql, parametros=()):
+        with self._conectar() as conexao:
+            return pd.read_sql_query(sql, conexao, params=parametros)
+
+    # -------- Gravação --------
+
+    @instrumentar("salvar no histórico")
+    def salvar(self, relatorio, coluna_grupo, parametros, df_final=None, coluna_salario=None, coluna_chave=None,
+               competencia=None, rotulo="", arquivo="", hash_entrada="", colunas_parametros=None, total_funcionarios=None):
+        """
+        Grava uma execução (consolidado e, com `df_final`, cada funcionário) e devolve o id.
+
+        `competencia` é o mês de referência ('AAAA-MM'; padrão: o atual). Os
+        funcionários são identificados por `coluna_chave` (matrícula, CPF...;
+        padrão: a posição da linha na planilha), que não pode se repetir.
+        Grupos e chaves são gravados como texto. `parametros` é o dicionário
+        de calcular_colunas_custo; o ano dele escolhe a versão da tabela.
+        """
+        competencia = normalizar_competencia(competencia)
+        ano = int(parametros.get("ano", ANO_PADRAO))
+        versao = obter_tabela(ano).versao
+        if total_funcionarios is None:
+            total_funcionarios = len(df_final) if df_final is not None else int(relatorio["Quantidade"].sum())
+
+        funcionarios = None
+        if df_final is not None:
+            chaves = df_final[coluna_chave] if coluna_chave else df_final.index.to_series()
+            chaves = pd.Series(_texto(chaves), index=df_final.index)
+            if chaves.isna().any() or chaves.duplicated().any():
+                repetidas = chaves[chaves.duplicated()].head(3).tolist()
+                raise ValueError(
+                    f"A coluna {coluna_chave} precisa identificar cada funcionário "
+                    f"(vazia ou repetida: {', '.join(map(str, repetidas)) or 'células vazias'})"
+                )
+            # Na ordem da chave primária, cada linha entra no fim da árvore em vez de no meio dela
+            ordem = chaves.argsort().to_numpy()
+            funcionarios = (
+                chaves.to_numpy()[ordem].tolist(),
+                _texto(df_final[coluna_grupo].iloc[ordem]),
+                df_final[coluna_salario].to_numpy(dtype=float)[ordem].tolist() if coluna_salario else repeat(None),
+                df_final["Custo Total Mensal"].to_numpy(dtype=float)[ordem].tolist(),
+                df_final["Custo Total Anual"].to_numpy(dtype=float)[ordem].tolist(),
+            )
+
+        with self._conectar() as conexao:
+            cursor = conexao.execute(
+                "INSERT INTO execucoes (criada, competencia, rotulo, arquivo, hash_entrada, coluna_grupo, "
+                "coluna_salario, coluna_chave, parametros, colunas_parametros, ano_tabela, versao_tabela, "
+                "funcionarios, custo_mensal, custo_anual) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    datetime.now().isoformat(timespec="seconds"), competencia, rotulo, arquivo, hash_entrada,
+                    coluna_grupo, coluna_salario, coluna_chave,
+                    json.dumps(parametros, sort_keys=True, default=str),
+                    json.dumps(colunas_parametros or {}, sort_keys=True),
+                    ano, versao, int(total_funcionarios),
+                    float(relatorio["Custo Total Mensal"].sum()), float(relatorio["Custo Total Anual"].sum()),
+                ),
+            )
+            execucao = cursor.lastrowid
+            conexao.executemany(
+                "INSERT INTO grupos VALUES (?, ?, ?, ?, ?)",
+                zip(
+                    repeat(execucao), _texto(relatorio[coluna_grupo]),
+                    relatorio["Quantidade"].astype(int).tolist(),
+                    relatorio["Custo Total Mensal"].astype(float).tolist(),
+                    relatorio["Custo Total Anual"].astype(float).tolist(),
+                ),
+            )
+            if funcionarios is not None:
+                conexao.executemany(
+                    "INSERT INTO funcionarios VALUES (?, ?, ?, ?, ?, ?)", zip(repeat(execucao), *funcionarios)
+                )
+        return execucao
+
+    def remover(self, execucao):
+        """Apaga a execução, com o consolidado e os funcionários dela; False se não existia"""
+        with self._conectar() as conexao:
+            return conexao.execute("DELETE FROM execucoes WHERE id = ?", (int(execucao),)).rowcount > 0
+
+    # -------- Consulta --------
+
+    def execucoes(self):
+        """Execuções salvas, da competência mais recente para a mais antiga"""
+        return self._consultar(
+            f"SELECT {', '.join(COLUNAS_EXECUCOES)} FROM execucoes ORDER BY competencia DESC, id DESC"
+        ).rename(columns=COLUNAS_EXECUCOES)
+
+    def execucao(self, execucao):
+        """Dados de uma execução (com parâmetros e colunas_parametros decodificados), ou None"""
+        with self._conectar() as conexao:
+            conexao.row_factory = sqlite3.Row
+            linha = conexao.execute("SELECT * FROM execucoes WHERE id = ?", (int(execucao),)).fetchone()
+        if linha is None:
+            return None
+        dados = dict(linha)
+        dados["parametros"] = json.loads(dados["parametros"])
+        dados["colunas_parametros"] = json.loads(dados["colunas_parametros"])
+        return dados
+
+    def consolidado(self, execucao):
+        """Relatório consolidado salvo, com as colunas do relatorio de finalizar_relatorio"""
+        dados = self.execucao(execucao)
+        if dados is None:
+            raise KeyError(f"Execução desconhecida: {execucao}")
+        return self._consultar(
+            "SELECT grupo, custo_mensal, custo_anual, quantidade FROM grupos "
+            "WHERE execucao = ? ORDER BY custo_anual DESC",
+            (int(execucao),),
+        ).rename(columns={"grupo": dados["coluna_grupo"], **COLUNAS_CUSTO})
+
+    def evolucao_grupos(self, grupos=None, coluna_grupo=None):
+        """
+        Consolidado de cada execução, uma linha por execução e grupo, em ordem
+        de competência; `grupos` e `coluna_grupo` restringem a consulta.
+        """
+        condicoes, valores = [], []
+        if grupos is not None:
+            grupos = [str(g) for g in grupos]
+            condicoes.append(f"g.grupo IN ({', '.join('?' * len(grupos))})")
+            valores += grupos
+        if coluna_grupo is not None:
+            condicoes.append("e.coluna_grupo = ?")
+            valores.append(coluna_grupo)
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        return self._consultar(
+            "SELECT e.id AS execucao, e.competencia, g.grupo, g.quantidade, g.custo_mensal, g.custo_anual "
+            f"FROM grupos g JOIN execucoes e ON e.id = g.execucao {onde} ORDER BY e.competencia, e.id, g.grupo",
+            valores,
+        ).rename(columns={"execucao": "Execução", "competencia": "Competência", "grupo": "Grupo", **COLUNAS_CUSTO})
+
+    def comparar(self, anterior, atual):
+        """
+        Consolidado de duas execuções lado a lado, por grupo: custo mensal de
+        cada uma, variação em R$ e em %. Grupos que só aparecem numa delas
+        ficam com zero na outra.
+        """
+        def por_grupo(execucao):
+            consolidado = self.consolidado(execucao)
+            return consolidado.set_index(consolidado.columns[0]).rename_axis("Grupo")[["Custo Total Mensal", "Quantidade"]]
+
+        antes, depois = por_grupo(anterior), por_grupo(atual)
+        tabela = antes.join(depois, how="outer", lsuffix=" (anterior)", rsuffix=" (atual)").fillna(0)
+        tabela["Variação Mensal"] = tabela["Custo Total Mensal (atual)"] - tabela["Custo Total Mensal (anterior)"]
+        base = tabela["Custo Total Mensal (anterior)"].abs()
+        tabela["Variação (%)"] = (tabela["Variação Mensal"] / base.where(base > 0) * 100).round(2)
+        for coluna in ("Quantidade (anterior)", "Quantidade (atual)"):
+            tabela[coluna] = tabela[coluna].astype("int64")
+        return tabela.sort_values("Variação Mensal", key=abs, ascending=False).reset_index()
+
+    def funcionario(self, chave):
+        """Custo de um funcionário (pela chave gravada) em cada execução em que aparece"""
+        return self._consultar(
+            "SELECT e.id AS execucao, e.competencia, f.grupo, f.salario, f.custo_mensal, f.custo_anual "
+            "FROM funcionarios f JOIN execucoes e ON e.id = f.execucao WHERE f.chave = ? "
+            "ORDER BY e.competencia, e.id",
+            (str(chave),),
+        ).rename(columns={"execucao": "Execução", "competencia": "Competência", "grupo": "Grupo", **COLUNAS_CUSTO})
+
+    def funcionarios(self, execucao, grupo=None):
+        """Funcionários gravados numa execução (só os de `grupo`, se informado)"""
+        sql = "SELECT chave, grupo, salario, custo_mensal, custo_anual FROM funcionarios WHERE execucao = ?"
+        valores = [int(execucao)]
+        if grupo is not None:
+            sql += " AND grupo = ?"
+            valores.append(str(grupo))
+        return self._consultar(sql, valores).rename(columns={"chave": "Chave", "grupo": "Grupo", **COLUNAS_CUSTO})
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from calculo import CAMPOS_CUSTOS, COMPONENTES, TOTAIS
+from calculo_lote import (
+    CAMPOS_POR_PARAMETRO,
+    PARAMETROS_ESTRUTURAIS,
+    calcular_custos_lote,
+    preencher_campos_lote,
+    somar_totais_lote,
+)
+from instrumentacao import instrumentar
+from processamento import finalizar_relatorio, parametros_por_linha, rotulos_detalhamento
+
+# Parcelas que são o mesmo valor em todas as linhas: a soma do grupo é valor × quantidade
+BENEFICIOS_FIXOS = {
+    "vale_refeicao": "vr",
+    "vale_alimentacao": "va",
+    "plano_saude": "saude",
+    "plano_odontologico": "odonto",
+    "seguro_vida": "seguro",
+    "home_office": "home",
+    "equipamentos": "epi",
+    "outros": "outros",
+}
+
+_POSICAO = {campo: i for i, campo in enumerate(CAMPOS_CUSTOS)}
+
+# ---------------- RECÁLCULO INCREMENTAL ----------------
+
+class CalculoIncremental:
+    """
+    Detalhamento e consolidado de uma planilha que se atualizam por diferença.
+
+    Guarda uma coluna por parcela (CAMPOS_CUSTOS) e a soma de cada parcela por
+    grupo. Quando um parâmetro muda, só os campos que dependem dele
+    (CAMPOS_POR_PARAMETRO) são recalculados; as somas dos grupos mudam pela
+    diferença entre a soma nova e a antiga dessas parcelas. Regime e ano
+    refazem tudo.
+
+    O custo por funcionário é sempre idêntico ao de calcular_custos_lote; as
+    somas por grupo coincidem com o groupby a menos do arredondamento.
+
+    Com `colunas_parametros`, os parâmetros mapeados vêm da planilha (veja
+    parametros_por_linha) e os da barra lateral valem só nas células vazias.
+    """
+
+    @instrumentar("CalculoIncremental (carga inicial)")
+    def __init__(self, df_input, coluna_salario, coluna_grupo, parametros, colunas_parametros=None):
+        self.df_input = df_input
+        self.coluna_salario = coluna_salario
+        self.coluna_grupo = coluna_grupo
+        self.colunas_parametros = colunas_parametros
+        self.parametros = dict(parametros)
+        self.efetivos = parametros_por_linha(df_input, self.parametros, colunas_parametros)
+
+        self.salario = df_input[coluna_salario].to_numpy(dtype=float, copy=True)
+        codigos, self.grupos = pd.factorize(df_input[coluna_grupo])
+        self.n_grupos = len(self.grupos)
+        # Linhas sem grupo vão para um balde extra, descartado nas somas (como no groupby)
+        self._baldes = np.where(codigos >= 0, codigos, self.n_grupos)
+
+        self.matriz = np.zeros((len(CAMPOS_CUSTOS), len(self.salario)))
+        self.r = dict(zip(CAMPOS_CUSTOS, self.matriz))
+        self.somas = np.zeros((len(CAMPOS_CUSTOS), self.n_grupos))
+        self.s = dict(zip(CAMPOS_CUSTOS, self.somas))
+
+        self._contar()
+        self.ultimos_recalculados = self._recalcular(None)
+
+    # -------- Somas por grupo --------
+
+    def _contar(self):
+        # Salário vazio não entra no consolidado, como no count/sum do groupby
+        self._validas = ~np.isnan(self.salario)
+        self.contagem = self._somar_por_grupo(self._validas.astype(float))
+
+    def _somar_por_grupo(self, valores, linhas=slice(None)):
+        valores = np.where(self._validas[linhas], valores, 0.0)
+        return np.bincount(self._baldes[linhas], weights=valores, minlength=self.n_grupos + 1)[:self.n_grupos]
+
+    # -------- Recálculo --------
+
+    def _recalcular(self, campos):
+        """Recalcula `campos` (None = todos) e atualiza totais e somas; devolve os campos tocados"""
+        regime = self.efetivos["regime"]
+        parcelas = COMPONENTES if campos is None else [c for c in COMPONENTES if c in campos]
+        antes = {campo: self.s[campo].copy() for campo in parcelas}
+
+        preencher_campos_lote(self.r, self.salario, **self.efetivos, campos=campos)
+        somar_totais_lote(self.r, self.salario, regime)
+
+        for campo in parcelas:
+            valor = self.efetivos.get(BENEFICIOS_FIXOS.get(campo))
+            if valor is not None and np.ndim(valor) == 0:
+                self.s[campo][:] = valor * self.contagem
+            else:
+                self.s[campo][:] = self._somar_por_grupo(self.r[campo])
+
+        if campos is None:
+            self.s["custo_mensal"][:] = self._somar_por_grupo(self.r["custo_mensal"])
+            self.s["custo_anual"][:] = self._somar_por_grupo(self.r["custo_anual"])
+            return tuple(CAMPOS_CUSTOS)
+
+        delta = sum((self.s[campo] - antes[campo] for campo in parcelas), np.zeros(self.n_grupos))
+        self.s["custo_mensal"] += delta
+        self.s["custo_anual"] += delta * 12
+        return tuple(c for c in CAMPOS_CUSTOS if c in campos)
+
+    @instrumentar("CalculoIncremental.atualizar")
+    def atualizar(self, parametros):
+        """
+        Aplica novos parâmetros recalculando só o que depende dos que mudaram.
+
+        Devolve os campos recalculados (vazio se nada mudou).
+        """
+        alterados = {nome for nome, valor in parametros.items() if self.parametros.get(nome) != valor}
+        self.parametros = dict(parametros)
+        if alterados:
+            self.efetivos = parametros_por_linha(self.df_input, self.parametros, self.colunas_parametros)
+
+        if not alterados:
+            self.ultimos_recalculados = ()
+        elif alterados & set(PARAMETROS_ESTRUTURAIS):
+            self.ultimos_recalculados = self._recalcular(None)
+        else:
+            campos = set()
+            for nome in alterados:
+                campos.update(CAMPOS_POR_PARAMETRO[nome])
+            self.ultimos_recalculados = self._recalcular(campos)
+        return self.ultimos_recalculados
+
+    def atualizar_salarios(self, linhas, salarios):
+        """
+        Troca o salário das `linhas` (posições) e recalcula só essas linhas.
+
+        As somas dos grupos tiram a contribuição antiga das linhas e somam a nova.
+        """
+        linhas = np.asarray(linhas)
+        antigas = self.matriz[:, linhas]
+        somas_antigas = [self._somar_por_grupo(v, linhas) for v in antigas]
+        contagem_antiga = self._somar_por_grupo(np.ones(len(linhas)), linhas)
+
+        self.salario[linhas] = salarios
+        self._validas[linhas] = ~np.isnan(self.salario[linhas])
+        efetivos = {nome: valor[linhas] if np.ndim(valor) else valor for nome, valor in self.efetivos.items()}
+        novas = calcular_custos_lote(self.salario[linhas], **efetivos).to_numpy().T
+        self.matriz[:, linhas] = novas
+
+        for soma, antiga, nova in zip(self.somas, somas_antigas, novas):
+            soma += self._somar_por_grupo(nova, linhas) - antiga
+        self.contagem += self._somar_por_grupo(np.ones(len(linhas)), linhas) - contagem_antiga
+
+        coluna = self.df_input.columns.get_loc(self.coluna_salario)
+        self.df_input = self.df_input.copy(deep=False)
+        self.df_input.iloc[linhas, coluna] = salarios
+        self.ultimos_recalculados = tuple(CAMPOS_CUSTOS)
+
+    # -------- Saídas --------
+
+    def _indice_grupos(self):
+        return pd.Index(self.grupos, name=self.coluna_grupo)
+
+    @instrumentar("CalculoIncremental.detalhamento")
+    def detalhamento(self):
+        """Planilha de entrada com as colunas de custo rotuladas, como calcular_detalhamento"""
+        rotulos = rotulos_detalhamento(self.efetivos)
+        custos = pd.DataFrame(
+            self.matriz[[_POSICAO[c] for c in rotulos]].T,
+            index=self.df_input.index, columns=list(rotulos.values())
+        )
+        return pd.concat([self.df_input, custos], axis=1)
+
+    def relatorio(self):
+        """Relatório consolidado por grupo, como finalizar_relatorio(agregar_por_grupo(...))"""
+        agregado = pd.DataFrame({
+            "Custo Total Mensal": self.s["custo_mensal"],
+            "Custo Total Anual": self.s["custo_anual"],
+            "Quantidade": self.contagem,
+        }, index=self._indice_grupos())
+        return finalizar_relatorio(agregado)
+
+    def somas_por_componente(self):
+        """Soma mensal de cada parcela por grupo, com os rótulos de exibição"""
+        rotulos = rotulos_detalhamento(self.efetivos)
+        return pd.DataFrame(
+            {rotulo: self.s[campo] for campo, rotulo in rotulos.items() if campo not in TOTAIS},
+            index=self._indice_grupos()
+        )
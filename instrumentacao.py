@@ -0,0 +1,207 @@
+"""
+Instrumentação das etapas do pipeline: tempo de parede, chamadas e pico de memória.
+
+Desligada (o padrão), cada ponto instrumentado custa uma leitura de
+ContextVar. Ligada com `coletar()` (ou `iniciar`/`encerrar`), registra cada
+execução de `etapa(...)` e de funções decoradas com `instrumentar`; as
+funções `por_chamada` (como calcular_custos) só são medidas em amostragem,
+uma a cada `amostragem` chamadas, mas todas são contadas.
+
+O pico de memória usa tracemalloc, que deixa as alocações bem mais lentas;
+por isso só é medido com `memoria=True`.
+
+Só usa a biblioteca padrão.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+MAX_EVENTOS = 100_000
+
+_coletor = ContextVar("coletor_instrumentacao", default=None)
+
+# ---------------- COLETOR ----------------
+
+class Coletor:
+    """
+    Eventos e totais por etapa de uma execução instrumentada.
+
+    Cada evento é (nome, início, duração, pico de memória, profundidade),
+    com tempos em segundos desde a criação do coletor e pico em bytes acima
+    da memória no início da etapa (None sem `memoria`). Depois de MAX_EVENTOS
+    eventos só os totais continuam sendo atualizados.
+    """
+
+    def __init__(self, memoria=False, amostragem=0):
+        self.memoria = memoria
+        self.amostragem = amostragem
+        self.origem = time.perf_counter()
+        self.eventos = []
+        self.totais = {}
+        self._contadores = {}
+        self._pilha = []
+        self._memoria_propria = memoria and not tracemalloc.is_tracing()
+        if self._memoria_propria:
+            tracemalloc.start()
+
+    def fechar(self):
+        if self._memoria_propria:
+            tracemalloc.stop()
+            self._memoria_propria = False
+
+    # -------- Registro --------
+
+    def amostrar(self, nome):
+        """Conta uma chamada de `nome`; True se esta deve ser medida"""
+        n = self._contadores.get(nome, 0) + 1
+        self._contadores[nome] = n
+        return self.amostragem > 0 and n % self.amostragem == 0
+
+    @contextmanager
+    def medir(self, nome):
+        quadro = [0, 0]  # memória no início, maior pico visto
+        if self.memoria:
+            atual, pico = tracemalloc.get_traced_memory()
+            if self._pilha:
+                self._pilha[-1][1] = max(self._pilha[-1][1], pico)
+            tracemalloc.reset_peak()
+            quadro = [atual, atual]
+        self._pilha.append(quadro)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            self._pilha.pop()
+            pico = None
+            if self.memoria:
+                quadro[1] = max(quadro[1], tracemalloc.get_traced_memory()[1])
+                pico = quadro[1] - quadro[0]
+                if self._pilha:
+                    self._pilha[-1][1] = max(self._pilha[-1][1], quadro[1])
+            self._registrar(nome, inicio - self.origem, duracao, pico, len(self._pilha))
+
+    def _registrar(self, nome, inicio, duracao, pico, profundidade):
+        total = self.totais.get(nome)
+        if total is None:
+            total = self.totais[nome] = {"medidas": 0, "segundos": 0.0, "maximo": 0.0, "pico_memoria": None}
+        total["medidas"] += 1
+        total["segundos"] += duracao
+        total["maximo"] = max(total["maximo"], duracao)
+        if pico is not None:
+            total["pico_memoria"] = max(total["pico_memoria"] or 0, pico)
+        if len(self.eventos) < MAX_EVENTOS:
+            self.eventos.append((nome, inicio, duracao, pico, profundidade))
+
+    # -------- Saídas --------
+
+    def resumo(self):
+        """Uma linha por etapa; as só contadas (amostragem desligada) ficam sem tempo"""
+        linhas = []
+        for nome in {**self.totais, **self._contadores}:
+            total = self.totais.get(nome)
+            chamadas = self._contadores.get(nome, total and total["medidas"])
+            if total is None:
+                linhas.append({"Etapa": nome, "Chamadas": chamadas, "Medidas": 0})
+                continue
+            media = total["segundos"] / total["medidas"]
+            linhas.append({
+                "Etapa": nome,
+                "Chamadas": chamadas,
+                "Medidas": total["medidas"],
+                "Segundos": total["segundos"],
+                "Segundos (estimado)": media * chamadas,
+                "Média (ms)": media * 1000,
+                "Máximo (ms)": total["maximo"] * 1000,
+                "Pico de memória (MB)": None if total["pico_memoria"] is None else total["pico_memoria"] / 2**20,
+            })
+        return linhas
+
+    def para_json(self):
+        """Resumo e eventos em JSON"""
+        return json.dumps({
+            "memoria": self.memoria,
+            "amostragem": self.amostragem,
+            "resumo": self.resumo(),
+            "eventos": [
+                {"etapa": nome, "inicio": inicio, "duracao": duracao, "pico_memoria": pico, "profundidade": profundidade}
+                for nome, inicio, duracao, pico, profundidade in self.eventos
+            ],
+        }, indent=2, ensure_ascii=False)
+
+    def para_chrome_trace(self):
+        """Eventos no formato Trace Event do Chrome (chrome://tracing, Perfetto)"""
+        pid, tid = os.getpid(), threading.get_ident()
+        eventos = []
+        for nome, inicio, duracao, pico, _ in self.eventos:
+            evento = {"name": nome, "cat": "etapa", "ph": "X", "pid": pid, "tid": tid,
+                      "ts": inicio * 1e6, "dur": duracao * 1e6}
+            if pico is not None:
+                evento["args"] = {"pico_memoria_bytes": pico}
+            eventos.append(evento)
+        return json.dumps({"traceEvents": eventos, "displayTimeUnit": "ms"})
+
+# ---------------- PONTOS DE MEDIÇÃO ----------------
+
+@contextmanager
+def etapa(nome):
+    """Mede o bloco como a etapa `nome` se houver um coletor ativo"""
+    coletor = _coletor.get()
+    if coletor is None:
+        yield
+        return
+    with coletor.medir(nome):
+        yield
+
+
+def instrumentar(nome, por_chamada=False):
+    """
+    Decorador que mede cada chamada da função como a etapa `nome`.
+
+    Com `por_chamada`, para funções baratas chamadas muitas vezes, as
+    chamadas são só contadas e uma a cada `amostragem` é medida.
+    """
+    def decorador(funcao):
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            coletor = _coletor.get()
+            if coletor is None or (por_chamada and not coletor.amostrar(nome)):
+                return funcao(*args, **kwargs)
+            with coletor.medir(nome):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+# ---------------- ATIVAÇÃO ----------------
+
+def iniciar(memoria=False, amostragem=0):
+    """Liga a instrumentação no contexto atual e devolve o coletor"""
+    coletor = Coletor(memoria, amostragem)
+    _coletor.set(coletor)
+    return coletor
+
+
+def encerrar():
+    """Desliga a instrumentação no contexto atual"""
+    coletor = _coletor.get()
+    if coletor is not None:
+        coletor.fechar()
+    _coletor.set(None)
+    return coletor
+
+
+@contextmanager
+def coletar(memoria=False, amostragem=0):
+    """Instrumenta o bloco; devolve o coletor com os resultados"""
+    coletor = Coletor(memoria, amostragem)
+    token = _coletor.set(coletor)
+    try:
+        yield coletor
+    finally:
+        _coletor.reset(token)
+        coletor.fechar()
@@ -0,0 +1,1000 @@
+import csv
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from calculo import BENEFICIOS_PADRAO, PRESETS_BENEFICIOS, REGIMES, beneficios_do_preset, rotulos_exibicao
+from calculo_lote import calcular_custos_lote
+from centavos import calcular_custos_centavos, em_reais
+from instrumentacao import etapa, instrumentar
+
+TAMANHO_BLOCO_PADRAO = 50_000
+TAMANHO_PARTICAO_PADRAO = 100_000
+
+# ---------------- LEITURA DE CSV ----------------
+
+BYTES_AMOSTRA_CSV = 64 * 1024
+LINHAS_AMOSTRA_CSV = 1000
+LIMITE_CATEGORIA = 0.5  # texto vira category quando os distintos são no máximo esta fração das linhas
+
+_NUMERO_BR = re.compile(r"^-?(\d{1,3}(\.\d{3})+(,\d+)?|\d+,\d+)$")
+_NUMERO_US = re.compile(r"^-?(\d{1,3}(,\d{3})+(\.\d+)?|\d+\.\d+)$")
+_MILHAR_BR = re.compile(r"^-?\d{1,3}(\.\d{3})+(,\d+)?$")
+_MILHAR_US = re.compile(r"^-?\d{1,3}(,\d{3})+(\.\d+)?$")
+
+
+class FormatoCsv(NamedTuple):
+    """Delimitador, separadores numéricos e codificação de um CSV"""
+    sep: str = ","
+    decimal: str = "."
+    milhar: str | None = None
+    encoding: str = "utf-8"
+
+
+def detectar_formato_csv(amostra):
+    """
+    Deduz o FormatoCsv a partir dos primeiros bytes do arquivo.
+
+    A codificação é UTF-8 (com ou sem BOM) quando a amostra decodifica, senão
+    latin-1. O delimitador sai do csv.Sniffer entre ; , tab e |. Os
+    separadores numéricos são votados pelos campos inequívocos ("3.000,50",
+    "1234,5" contra "3,000.50", "1234.5"); sem votos, arquivos com ";" (o
+    padrão do Excel em português) usam vírgula decimal.
+    """
+    if amostra.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    else:
+        encoding = "utf-8"
+    corte = amostra.rfind(b"\n")
+    inteiras = amostra[:corte] if corte > 0 else amostra
+    try:
+        texto = inteiras.decode(encoding)
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+        texto = inteiras.decode(encoding)
+
+    linhas = texto.splitlines()
+    try:
+        sep = csv.Sniffer().sniff("\n".join(linhas[:50]), delimiters=";,\t|").delimiter
+    except csv.Error:
+        cabecalho = linhas[0] if linhas else ""
+        sep = max(";,\t|", key=cabecalho.count) if any(c in cabecalho for c in ";\t|") else ","
+
+    votos_br = votos_us = 0
+    milhar_br = milhar_us = False
+    for linha in csv.reader(linhas[1:], delimiter=sep):
+        for campo in linha:
+            campo = campo.strip()
+            br, us = bool(_NUMERO_BR.match(campo)), bool(_NUMERO_US.match(campo))
+            if br != us:
+                votos_br += br
+                votos_us += us
+            milhar_br |= bool(_MILHAR_BR.match(campo))
+            milhar_us |= bool(_MILHAR_US.match(campo))
+
+    if votos_br != votos_us:
+        decimal = "," if votos_br > votos_us else "."
+    else:
+        decimal = "," if sep == ";" else "."
+    if decimal == ",":
+        milhar = "." if milhar_br else None
+    else:
+        milhar = "," if milhar_us and sep != "," else None
+    return FormatoCsv(sep, decimal, milhar, encoding)
+
+
+def _opcoes_csv(formato):
+    opcoes = {"sep": formato.sep, "decimal": formato.decimal, "encoding": formato.encoding}
+    if formato.milhar:
+        opcoes["thousands"] = formato.milhar
+    return opcoes
+
+
+def _dtypes_compactos(amostra):
+    """
+    Tipos explícitos a partir da amostra: números em float64 e texto
+    repetitivo em category. Valores monetários ficam em float64 porque
+    float32 perde os centavos a partir de ~R$ 100 mil.
+    """
+    dtypes = {}
+    for coluna in amostra.columns:
+        serie = amostra[coluna]
+        if pd.api.types.is_bool_dtype(serie):
+            continue
+        if pd.api.types.is_numeric_dtype(serie):
+            dtypes[coluna] = "float64"
+        elif len(serie) and serie.nunique() <= LIMITE_CATEGORIA * len(serie):
+            dtypes[coluna] = "category"
+    return dtypes
+
+
+@instrumentar("leitura CSV")
+def ler_csv(arquivo, colunas=None, formato=None, motor=None, **opcoes):
+    """
+    Lê um CSV com o formato detectado, só as `colunas` pedidas e tipos compactos.
+
+    O formato (delimitador, decimal, milhar e codificação) é detectado uma vez
+    nos primeiros BYTES_AMOSTRA_CSV bytes e os tipos em LINHAS_AMOSTRA_CSV
+    linhas. `motor="pyarrow"` usa o leitor multithread do Arrow quando
+    instalado e o formato não tem separador de milhar (que ele não suporta);
+    nos outros casos fica o leitor C do pandas. Se uma coluna numérica na
+    amostra tiver texto mais adiante, o arquivo é relido sem tipos fixos.
+
+    Opções extras vão direto para o pd.read_csv; com `chunksize` os tipos
+    continuam sendo inferidos bloco a bloco, como no pandas.
+    """
+    caminho = isinstance(arquivo, (str, os.PathLike))
+
+    def reabrir():
+        if not caminho:
+            arquivo.seek(0)
+
+    if formato is None:
+        if caminho:
+            with open(arquivo, "rb") as f:
+                amostra = f.read(BYTES_AMOSTRA_CSV)
+        else:
+            reabrir()
+            amostra = arquivo.read(BYTES_AMOSTRA_CSV)
+        formato = detectar_formato_csv(amostra)
+
+    leitura = {**_opcoes_csv(formato), "usecols": colunas, **opcoes}
+    reabrir()
+    if "chunksize" in leitura:
+        return pd.read_csv(arquivo, **leitura)
+
+    dtypes = _dtypes_compactos(pd.read_csv(arquivo, nrows=LINHAS_AMOSTRA_CSV, **leitura))
+    if motor == "pyarrow" and "thousands" not in leitura:
+        try:
+            import pyarrow  # noqa: F401
+            leitura["engine"] = "pyarrow"
+        except ImportError:
+            pass
+
+    reabrir()
+    try:
+        return pd.read_csv(arquivo, dtype=dtypes, **leitura)
+    except (ValueError, TypeError):
+        reabrir()
+        leitura.pop("engine", None)
+        return pd.read_csv(arquivo, **leitura)
+
+# ---------------- LEITURA EM BLOCOS ----------------
+
+def ler_em_blocos(arquivo, nome, tamanho_bloco=TAMANHO_BLOCO_PADRAO, colunas=None, aba=None):
+    """
+    Gera DataFrames de até `tamanho_bloco` linhas a partir de um CSV ou XLSX.
+
+    CSV usa ler_csv com `chunksize` (formato detectado, tipos inferidos por
+    bloco); XLSX é
+    lido linha a linha com o openpyxl em modo `read_only`, então a planilha
+    inteira nunca fica em memória (`aba` escolhe a aba; padrão: a primeira).
+    Em ambos os casos o índice continua de um bloco para o outro e `colunas`
+    limita as colunas lidas.
+    """
+    if not nome.endswith("xlsx"):
+        with ler_csv(arquivo, colunas, chunksize=tamanho_bloco) as blocos:
+            yield from blocos
+        return
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        planilha = wb.worksheets[0] if aba is None else wb[aba]
+        linhas = planilha.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        nomes = [c if c is not None else f"Unnamed: {i}" for i, c in enumerate(cabecalho)]
+        if colunas is None:
+            posicoes = range(len(nomes))
+        else:
+            faltando = [c for c in colunas if c not in nomes]
+            if faltando:
+                raise ValueError(f"Colunas não encontradas na planilha: {', '.join(map(str, faltando))}")
+            posicoes = [nomes.index(c) for c in colunas]
+        nomes = [nomes[i] for i in posicoes]
+
+        inicio = 0
+        bloco = []
+        for linha in linhas:
+            bloco.append([linha[i] if i < len(linha) else None for i in posicoes])
+            if len(bloco) == tamanho_bloco:
+                yield pd.DataFrame(bloco, columns=nomes, index=pd.RangeIndex(inicio, inicio + len(bloco)))
+                inicio += len(bloco)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=nomes, index=pd.RangeIndex(inicio, inicio + len(bloco)))
+    finally:
+        wb.close()
+
+
+def ler_amostra(arquivo, nome, linhas=1000):
+    """Lê só o início do arquivo (prévia e lista de colunas) e volta o cursor"""
+    amostra = next(ler_em_blocos(arquivo, nome, linhas), pd.DataFrame())
+    arquivo.seek(0)
+    return amostra
+
+# ---------------- CACHE DE LEITURA ----------------
+
+DIRETORIO_CACHE_LEITURA = os.environ.get("CUSTO_CLT_CACHE", os.path.join(tempfile.gettempdir(), "custo_clt_cache"))
+LIMITE_CACHE_DISCO = 2 * 2**30
+LIMITE_CACHE_MEMORIA = 512 * 2**20
+VERSAO_CACHE_LEITURA = 2  # mude ao alterar a leitura para invalidar os arquivos já gravados
+
+_cache_memoria = OrderedDict()  # chave -> (DataFrame, bytes em memória)
+_trava_cache = threading.Lock()
+_estatisticas_leitura = {"memoria": 0, "disco": 0, "falhas": 0}
+
+
+def ler_planilha(arquivo, nome, colunas=None, motor=None, aba=None):
+    """
+    Lê a planilha inteira (XLSX ou CSV com ler_csv); `colunas` limita as
+    colunas lidas e `aba` escolhe a aba do XLSX (padrão: a primeira).
+    """
+    if nome.endswith("xlsx"):
+        return pd.read_excel(arquivo, sheet_name=0 if aba is None else aba, usecols=colunas)
+    return ler_csv(arquivo, colunas, motor=motor)
+
+
+def _conteudo(arquivo):
+    """Bytes de um caminho, de um upload do Streamlit ou de um stream binário"""
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, "rb") as f:
+            return f.read()
+    if hasattr(arquivo, "getvalue"):
+        return arquivo.getvalue()
+    arquivo.seek(0)
+    dados = arquivo.read()
+    arquivo.seek(0)
+    return dados
+
+
+def _guardar_em_memoria(chave, df):
+    tamanho = int(df.memory_usage(deep=True).sum())
+    if tamanho > LIMITE_CACHE_MEMORIA:
+        return
+    with _trava_cache:
+        _cache_memoria[chave] = (df, tamanho)
+        _cache_memoria.move_to_end(chave)
+        total = sum(t for _, t in _cache_memoria.values())
+        while total > LIMITE_CACHE_MEMORIA:
+            _, (_, t) = _cache_memoria.popitem(last=False)
+            total -= t
+
+
+def _podar_disco(diretorio, limite_bytes):
+    """Apaga os arquivos menos usados (pela data de modificação) até caber no limite"""
+    arquivos = []
+    for entrada in os.scandir(diretorio):
+        if entrada.name.endswith(".feather"):
+            info = entrada.stat()
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite_bytes:
+            break
+        try:
+            os.remove(caminho)
+        except OSError:
+            continue
+        total -= tamanho
+
+
+def _gravar_em_disco(caminho, df, diretorio, limite_bytes):
+    """Grava o cache em Feather (Arrow IPC); tabelas que o Arrow não aceita ficam só em memória"""
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        df.to_feather(temporario)
+        os.replace(temporario, caminho)
+    except (ImportError, ValueError, TypeError, NotImplementedError, OSError):
+        # sem pyarrow, nomes de coluna não textuais ou colunas com tipos misturados
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        return
+    _podar_disco(diretorio, limite_bytes)
+
+
+def _chave_leitura(dados, nome, colunas=None, aba=None):
+    """Hash do conteúdo + leitor, aba e colunas: o mesmo arquivo com outro nome reaproveita o cache"""
+    leitor = "xlsx" if nome.endswith("xlsx") else "csv"
+    chave = f"{hashlib.sha256(dados).hexdigest()}-{leitor}-v{VERSAO_CACHE_LEITURA}"
+    if colunas is not None or aba is not None:
+        chave += "-" + hashlib.sha256(repr((aba, colunas and list(colunas))).encode()).hexdigest()[:16]
+    return chave
+
+
+def _buscar_em_cache(chave, diretorio):
+    """DataFrame guardado (em memória ou no disco) ou None"""
+    with _trava_cache:
+        guardado = _cache_memoria.get(chave)
+        if guardado is not None:
+            _cache_memoria.move_to_end(chave)
+            _estatisticas_leitura["memoria"] += 1
+            return guardado[0].copy(deep=False)
+
+    caminho = diretorio and os.path.join(diretorio, f"{chave}.feather")
+    if not caminho or not os.path.exists(caminho):
+        return None
+    try:
+        df = pd.read_feather(caminho)
+        os.utime(caminho)  # marca como usado para a poda
+    except (ImportError, OSError, ValueError):
+        return None
+    _estatisticas_leitura["disco"] += 1
+    _guardar_em_memoria(chave, df)
+    return df.copy(deep=False)
+
+
+def _guardar_em_cache(chave, df, diretorio, limite_bytes):
+    if diretorio:
+        _gravar_em_disco(os.path.join(diretorio, f"{chave}.feather"), df, diretorio, limite_bytes)
+    _guardar_em_memoria(chave, df)
+
+
+@instrumentar("leitura da planilha (cache)")
+def ler_planilha_cache(arquivo, nome, colunas=None, motor=None, aba=None, diretorio=DIRETORIO_CACHE_LEITURA, limite_bytes=LIMITE_CACHE_DISCO):
+    """
+    ler_planilha com cache pelo hash do conteúdo.
+
+    Procura primeiro em memória (LRU limitado a LIMITE_CACHE_MEMORIA) e depois
+    no disco, onde a primeira leitura de cada arquivo é gravada em Feather e
+    reaberta em outras sessões sem passar pelo openpyxl. O disco é limitado a
+    `limite_bytes`, apagando os arquivos usados há mais tempo; `diretorio=None`
+    desliga o cache em disco. Devolve uma cópia rasa: colunas novas ou
+    alteradas não chegam ao DataFrame guardado.
+    """
+    dados = _conteudo(arquivo)
+    chave = _chave_leitura(dados, nome, colunas, aba)
+    df = _buscar_em_cache(chave, diretorio)
+    if df is not None:
+        return df
+
+    _estatisticas_leitura["falhas"] += 1
+    df = ler_planilha(BytesIO(dados), nome, colunas, motor, aba)
+    _guardar_em_cache(chave, df, diretorio, limite_bytes)
+    return df.copy(deep=False)
+
+
+def estatisticas_cache_leitura():
+    """Acertos em memória e em disco, leituras completas e ocupação do cache de planilhas"""
+    with _trava_cache:
+        return {
+            "acertos_memoria": _estatisticas_leitura["memoria"],
+            "acertos_disco": _estatisticas_leitura["disco"],
+            "falhas": _estatisticas_leitura["falhas"],
+            "tamanho": len(_cache_memoria),
+            "bytes_memoria": sum(t for _, t in _cache_memoria.values()),
+        }
+
+# ---------------- VÁRIAS PLANILHAS ----------------
+
+COLUNA_ARQUIVO = "Arquivo de origem"
+COLUNA_ABA = "Aba de origem"
+ABA_CSV = "-"
+
+
+def abas_da_planilha(arquivo, nome):
+    """
+    Nomes das abas de um XLSX, na ordem da pasta de trabalho; [None] para CSV.
+
+    Lê só o xl/workbook.xml de dentro do zip, sem carregar células nem a
+    tabela de textos compartilhados.
+    """
+    if not nome.endswith("xlsx"):
+        return [None]
+    from xml.etree import ElementTree
+
+    origem = arquivo if isinstance(arquivo, (str, os.PathLike)) else BytesIO(_conteudo(arquivo))
+    with zipfile.ZipFile(origem) as pacote:
+        raiz = ElementTree.fromstring(pacote.read("xl/workbook.xml"))
+    return [aba.get("name") for aba in raiz.iter() if aba.tag.endswith("}sheet")]
+
+
+def _fontes(entradas, todas_abas):
+    """(posição da entrada, nome, arquivo, aba) de cada aba a ler; sem `todas_abas`, aba=None (a primeira)"""
+    return [
+        (i, nome, arquivo, aba)
+        for i, (nome, arquivo) in enumerate(entradas)
+        for aba in (abas_da_planilha(arquivo, nome) if todas_abas else [None])
+    ]
+
+
+def _com_origem(df, nome, aba, todas_abas, inicio=0):
+    """Acrescenta COLUNA_ARQUIVO (e COLUNA_ABA, com `todas_abas`) no início da tabela"""
+    df = df.copy(deep=False)
+    if todas_abas:
+        df.insert(0, COLUNA_ABA, ABA_CSV if aba is None else aba)
+    df.insert(0, COLUNA_ARQUIVO, nome)
+    df.index = pd.RangeIndex(inicio, inicio + len(df))
+    return df
+
+
+def _colunas_lidas(colunas):
+    """As colunas de origem não existem nos arquivos: são acrescentadas depois da leitura"""
+    return None if colunas is None else [c for c in colunas if c not in (COLUNA_ARQUIVO, COLUNA_ABA)]
+
+
+def _ler_fonte(dados, nome, colunas, motor, aba):
+    """Executado em um processo do pool: lê uma aba (ou um CSV)"""
+    return ler_planilha(BytesIO(dados), nome, colunas, motor, aba)
+
+
+@instrumentar("leitura de várias planilhas")
+def ler_planilhas(entradas, todas_abas=False, colunas=None, motor=None, n_workers=None, cache=True):
+    """
+    Junta numa tabela só várias planilhas e, com `todas_abas`, todas as abas de cada XLSX.
+
+    `entradas` é uma lista de (nome, arquivo). Cada aba é lida num processo
+    de um ProcessPoolExecutor (até `n_workers`, padrão: um por CPU), então o
+    tempo cai com o número de arquivos e abas; as que já estão no cache de
+    leitura não são relidas. COLUNA_ARQUIVO (e COLUNA_ABA, com `todas_abas`)
+    diz de onde veio cada linha; colunas ausentes numa aba ficam vazias. Com uma
+    entrada e sem `todas_abas`, é o mesmo que ler_planilha_cache.
+    """
+    if len(entradas) == 1 and not todas_abas:
+        nome, arquivo = entradas[0]
+        if cache:
+            return ler_planilha_cache(arquivo, nome, colunas, motor)
+        return ler_planilha(arquivo, nome, colunas, motor)
+
+    lidas = _colunas_lidas(colunas)
+    fontes = _fontes(entradas, todas_abas)
+    conteudos = [_conteudo(arquivo) for _, arquivo in entradas]
+    chaves = [_chave_leitura(conteudos[i], nome, lidas, aba) for i, nome, _, aba in fontes]
+    partes = [_buscar_em_cache(chave, DIRETORIO_CACHE_LEITURA) if cache else None for chave in chaves]
+
+    faltando = [j for j, parte in enumerate(partes) if parte is None]
+    argumentos = (
+        [conteudos[fontes[j][0]] for j in faltando],
+        [fontes[j][1] for j in faltando],
+        [lidas] * len(faltando),
+        [motor] * len(faltando),
+        [fontes[j][3] for j in faltando],
+    )
+    n_workers = min(n_workers or os.cpu_count() or 1, len(faltando) or 1)
+    if n_workers == 1:
+        lidos = list(map(_ler_fonte, *argumentos))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            lidos = list(executor.map(_ler_fonte, *argumentos))
+    for j, df in zip(faltando, lidos):
+        _estatisticas_leitura["falhas"] += 1
+        if cache:
+            _guardar_em_cache(chaves[j], df, DIRETORIO_CACHE_LEITURA, LIMITE_CACHE_DISCO)
+        partes[j] = df
+
+    with etapa("pd.concat planilhas"):
+        tabelas = [
+            _com_origem(df, nome, aba, todas_abas)
+            for (_, nome, _, aba), df in zip(fontes, partes) if len(df.columns)
+        ]
+        tabela = pd.concat(tabelas, ignore_index=True) if tabelas else pd.DataFrame(columns=[COLUNA_ARQUIVO])
+    for coluna in (COLUNA_ARQUIVO, COLUNA_ABA):
+        if coluna in tabela:
+            tabela[coluna] = tabela[coluna].astype("category")
+    return tabela
+
+
+def ler_blocos_de_varios(entradas, tamanho_bloco=TAMANHO_BLOCO_PADRAO, todas_abas=False, colunas=None):
+    """
+    ler_em_blocos de várias planilhas (e abas) em sequência, com as colunas
+    de origem e o índice contínuo entre elas. Com uma entrada e sem
+    `todas_abas`, é o mesmo que ler_em_blocos.
+    """
+    if len(entradas) == 1 and not todas_abas:
+        nome, arquivo = entradas[0]
+        yield from ler_em_blocos(arquivo, nome, tamanho_bloco, colunas)
+        return
+
+    inicio = 0
+    for _, nome, arquivo, aba in _fontes(entradas, todas_abas):
+        if not isinstance(arquivo, (str, os.PathLike)):
+            arquivo.seek(0)
+        for bloco in ler_em_blocos(arquivo, nome, tamanho_bloco, _colunas_lidas(colunas), aba):
+            yield _com_origem(bloco, nome, aba, todas_abas, inicio)
+            inicio += len(bloco)
+
+# ---------------- PARÂMETROS POR FUNCIONÁRIO ----------------
+VALORES_VERDADEIROS = {"sim", "s", "true", "verdadeiro", "1", "x", "yes", "y"}
+
+
+def _distintos(valores, validos=None, descricao="", coluna=""):
+    """
+    Códigos e valores distintos da coluna (pd.factorize); com `validos`,
+    levanta ValueError para o que não estiver na lista.
+    """
+    codigos, distintos = pd.factorize(valores)
+    if validos is not None:
+        desconhecidos = sorted(str(v) for v in distintos if v not in validos)
+        if desconhecidos:
+            raise ValueError(
+                f"{descricao} desconhecido na coluna '{coluna}': {', '.join(desconhecidos)} "
+                f"(disponíveis: {', '.join(validos)})"
+            )
+    return codigos, list(distintos)
+
+
+def _booleano(valor, padrao):
+    """Sim/Não, 1/0 ou True/False de uma célula; texto em branco vira `padrao`"""
+    if isinstance(valor, str):
+        texto = valor.strip().lower()
+        return texto in VALORES_VERDADEIROS if texto else padrao
+    return bool(valor)
+
+
+@instrumentar("parametros_por_linha")
+def parametros_por_linha(df, parametros, colunas_parametros=None):
+    """
+    Parâmetros de calcular_custos_lote com as colunas mapeadas da planilha.
+
+    `colunas_parametros` liga parâmetro (PARAMETROS_MAPEAVEIS) -> coluna de
+    `df`. Cada coluna mapeada vira um array por funcionário e as células
+    vazias ficam com o valor de `parametros`. A coluna "preset" é resolvida
+    em PRESETS_BENEFICIOS; uma coluna explícita de benefício tem prioridade
+    sobre o preset da linha. Regime ou preset desconhecido levanta ValueError.
+
+    Colunas de texto são convertidas uma vez por valor distinto, não por linha.
+    """
+    if not colunas_parametros:
+        return parametros
+    resultado = dict(parametros)
+
+    # Nos arrays de consulta, a última posição é o padrão: é onde cai o código -1 (célula vazia)
+    if "preset" in colunas_parametros:
+        coluna = colunas_parametros["preset"]
+        codigos, presets = _distintos(df[coluna], PRESETS_BENEFICIOS, "Preset de benefícios", coluna)
+        personalizados = {chave: parametros[chave] for chave in BENEFICIOS_PADRAO}
+        beneficios = [beneficios_do_preset(nome, personalizados) for nome in presets]
+        for chave in BENEFICIOS_PADRAO:
+            resultado[chave] = np.array([b[chave] for b in beneficios] + [parametros[chave]])[codigos]
+
+    for nome, coluna in colunas_parametros.items():
+        valores = df[coluna]
+        if nome == "preset":
+            continue
+        if nome == "regime":
+            codigos, regimes = _distintos(valores, REGIMES, "Regime", coluna)
+            resultado[nome] = np.array(regimes + [parametros["regime"]], dtype=object)[codigos]
+        elif nome == "incluir":
+            codigos, distintos = _distintos(valores)
+            padrao = parametros["incluir"]
+            resultado[nome] = np.array([_booleano(v, padrao) for v in distintos] + [padrao], dtype=bool)[codigos]
+        else:
+            numeros = pd.to_numeric(valores, errors="coerce").to_numpy(dtype=float)
+            resultado[nome] = np.where(np.isnan(numeros), resultado[nome], numeros)
+
+    return resultado
+
+# ---------------- CÁLCULO E AGREGAÇÃO ----------------
+
+def rotulos_detalhamento(parametros):
+    """
+    Campo -> coluna do detalhamento. Regime ou percentuais por funcionário dão
+    rótulos genéricos, iguais em todos os blocos da planilha.
+    """
+    def escalar(nome, padrao):
+        valor = parametros.get(nome, padrao)
+        return None if np.ndim(valor) else valor
+
+    return rotulos_exibicao(escalar("regime", None), escalar("rat_perc", 2.0), escalar("terceiros_perc", 5.8))
+
+
+def calcular_colunas_custo(salarios, parametros):
+    """
+    Colunas de custo de cada funcionário com os rótulos de exibição do regime.
+
+    Com `centavos=True` em `parametros` (modo monetário exato), as parcelas
+    vêm de calcular_custos_centavos: continuam em reais, mas cada uma é um
+    número exato de centavos e o custo mensal é a soma exata delas.
+    """
+    parametros = dict(parametros)
+    if parametros.pop("centavos", False):
+        resultados = em_reais(calcular_custos_centavos(salarios, **parametros))
+    else:
+        resultados = calcular_custos_lote(salarios, **parametros)
+    rotulos = rotulos_detalhamento(parametros)
+    return resultados[list(rotulos)].set_axis(list(rotulos.values()), axis=1)
+
+
+def calcular_detalhamento(df_input, coluna_salario, parametros, colunas_parametros=None):
+    """Junta a planilha de entrada com as colunas de custo"""
+    parametros = parametros_por_linha(df_input, parametros, colunas_parametros)
+    colunas_custo = calcular_colunas_custo(df_input[coluna_salario], parametros)
+    with etapa("pd.concat detalhamento"):
+        return pd.concat([df_input, colunas_custo], axis=1)
+
+
+COLUNAS_TOTAIS = ['Custo Total Mensal', 'Custo Total Anual']
+
+
+@instrumentar("groupby por grupo")
+def agregar_por_grupo(df_final, coluna_grupo, coluna_salario, centavos=False):
+    """
+    Somas parciais por grupo; podem ser somadas entre blocos.
+
+    Com `centavos`, os custos são somados em centavos inteiros (exatos em
+    float64 até 2**53, em qualquer ordem de soma) e o consolidado fecha com
+    o detalhamento centavo a centavo; finalizar_relatorio volta para reais.
+    """
+    if centavos:
+        df_final = df_final.assign(**{coluna: (df_final[coluna] * 100).round() for coluna in COLUNAS_TOTAIS})
+    return (
+        df_final
+        .groupby(coluna_grupo)
+        .agg({
+            'Custo Total Mensal': 'sum',
+            'Custo Total Anual': 'sum',
+            coluna_salario: 'count'
+        })
+        .rename(columns={coluna_salario: 'Quantidade'})
+    )
+
+
+def finalizar_relatorio(agregado, centavos=False):
+    """Transforma as somas por grupo no relatório consolidado ordenado (em reais; veja agregar_por_grupo)"""
+    relatorio = agregado.reset_index().sort_values("Custo Total Anual", ascending=False)
+    if centavos:
+        relatorio[COLUNAS_TOTAIS] = relatorio[COLUNAS_TOTAIS] / 100
+        relatorio.attrs["centavos"] = True  # relatorio_com_total também soma em centavos
+    relatorio['Quantidade'] = relatorio['Quantidade'].astype("int64")
+    return relatorio
+
+
+def processar_em_blocos(blocos, coluna_salario, coluna_grupo, parametros, destino=None, colunas_parametros=None, progresso=None):
+    """
+    Processa uma sequência de blocos com memória limitada.
+
+    Cada bloco passa pelo cálculo vetorizado, suas somas por grupo são
+    acumuladas no agregado e o detalhamento é gravado em `destino` antes de o
+    próximo bloco ser lido. `destino` pode ser um stream de texto (gravado
+    como CSV) ou um EscritorCsv/EscritorXlsx. Só o agregado, que cresce com
+    o número de grupos e não com o de linhas, fica em memória.
+    `colunas_parametros` mapeia parâmetros por funcionário (veja
+    parametros_por_linha). `progresso(linhas, None)` é chamado ao fim de
+    cada bloco (o total de linhas só é conhecido no final).
+
+    Retorna (relatorio consolidado, total de linhas processadas).
+    """
+    if destino is not None and not hasattr(destino, "escrever"):
+        destino = EscritorCsv(destino)
+
+    agregado = None
+    total_linhas = 0
+    centavos = parametros.get("centavos", False)
+
+    for bloco in blocos:
+        df_final = calcular_detalhamento(bloco, coluna_salario, parametros, colunas_parametros)
+
+        if destino is not None:
+            with etapa("gravação do detalhamento"):
+                destino.escrever(df_final)
+
+        parcial = agregar_por_grupo(df_final, coluna_grupo, coluna_salario, centavos)
+        agregado = parcial if agregado is None else agregado.add(parcial, fill_value=0)
+        total_linhas += len(df_final)
+        if progresso is not None:
+            progresso(total_linhas, None)
+
+    if agregado is None:
+        agregado = pd.DataFrame(columns=['Custo Total Mensal', 'Custo Total Anual', 'Quantidade'])
+        agregado.index.name = coluna_grupo
+
+    return finalizar_relatorio(agregado, centavos), total_linhas
+
+
+# Maior CSV gzip de detalhamento que o app entrega pelo navegador: o download
+# lê o arquivo inteiro para a memória, então acima disso só pela CLI
+LIMITE_DOWNLOAD_DETALHAMENTO = int(os.environ.get("CUSTO_CLT_LIMITE_DOWNLOAD", 64 * 2**20))
+
+
+def processar_para_temporario(blocos, coluna_salario, coluna_grupo, parametros, colunas_parametros=None, progresso=None):
+    """
+    processar_em_blocos com o detalhamento num CSV gzip temporário em disco.
+
+    Retorna (relatorio, total de linhas, arquivo): o arquivo binário fica
+    aberto, no início, e some do disco quando é fechado.
+    """
+    arquivo = tempfile.TemporaryFile()
+    try:
+        with gzip.open(arquivo, "wt", encoding="utf-8", newline="") as destino:
+            relatorio, total = processar_em_blocos(
+                blocos, coluna_salario, coluna_grupo, parametros, destino, colunas_parametros, progresso
+            )
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return relatorio, total, arquivo
+
+# ---------------- EXPORTAÇÃO ----------------
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# formato -> (rótulo, extensão do download, mime)
+FORMATOS_EXPORTACAO = {
+    "xlsx": ("Excel (.xlsx)", ".xlsx", MIME_XLSX),
+    "xlsx-streaming": ("Excel streaming (.xlsx, baixa memória)", ".xlsx", MIME_XLSX),
+    "parquet": ("Parquet (.zip)", ".zip", "application/zip"),
+    "arrow": ("Arrow IPC (.zip)", ".zip", "application/zip"),
+    "csv.gz": ("CSV gzip (.zip)", ".zip", "application/zip"),
+}
+
+# Formatos de uma tabela só; no download vão o detalhamento e o consolidado num zip
+FORMATOS_COLUNARES = ("parquet", "arrow", "csv.gz")
+
+LINHAS_POR_LOTE_XLSX = 10_000
+
+
+def relatorio_com_total(relatorio, coluna_grupo):
+    """Relatório consolidado com uma linha TOTAL no final"""
+    if relatorio.attrs.get("centavos"):
+        totais = (relatorio[COLUNAS_TOTAIS] * 100).round().sum() / 100
+    else:
+        totais = relatorio[COLUNAS_TOTAIS].sum()
+    linha_total = pd.DataFrame({
+        coluna_grupo: ['TOTAL'],
+        'Custo Total Mensal': [totais['Custo Total Mensal']],
+        'Custo Total Anual': [totais['Custo Total Anual']],
+        'Quantidade': [relatorio['Quantidade'].sum()]
+    })
+    return pd.concat([relatorio, linha_total], ignore_index=True)
+
+
+@instrumentar("exportar_excel")
+def exportar_excel(destino, relatorio, coluna_grupo, df_final=None):
+    """Grava as abas Detalhamento (se houver) e Consolidado em `destino` (caminho ou stream)"""
+    with pd.ExcelWriter(destino, engine="openpyxl") as writer:
+        if df_final is not None:
+            df_final.to_excel(writer, sheet_name="Detalhamento", index=False)
+        relatorio_com_total(relatorio, coluna_grupo).to_excel(writer, sheet_name="Consolidado", index=False)
+
+
+class EscritorCsv:
+    """Grava blocos de DataFrame em sequência num stream de texto CSV"""
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.primeiro = True
+
+    def escrever(self, df):
+        df.to_csv(self.destino, header=self.primeiro, index=False)
+        self.primeiro = False
+
+    def fechar(self):
+        pass
+
+
+class EscritorXlsx:
+    """
+    XLSX no modo write-only do openpyxl.
+
+    As linhas são serializadas à medida que chegam e o workbook nunca existe
+    inteiro em memória; a aba Detalhamento é criada no primeiro bloco.
+    """
+
+    def __init__(self, destino):
+        from openpyxl import Workbook
+
+        self.destino = destino
+        self.wb = Workbook(write_only=True)
+        self.detalhamento = None
+
+    def escrever(self, df):
+        if self.detalhamento is None:
+            self.detalhamento = self.wb.create_sheet("Detalhamento")
+            self.detalhamento.append([str(c) for c in df.columns])
+        _anexar_linhas(self.detalhamento, df)
+
+    def adicionar_aba(self, nome, df):
+        aba = self.wb.create_sheet(nome)
+        aba.append([str(c) for c in df.columns])
+        _anexar_linhas(aba, df)
+
+    def fechar(self):
+        self.wb.save(self.destino)
+
+
+def _anexar_linhas(aba, df):
+    # Converte em lotes para não duplicar o DataFrame inteiro como objetos Python
+    for inicio in range(0, len(df), LINHAS_POR_LOTE_XLSX):
+        lote = df.iloc[inicio:inicio + LINHAS_POR_LOTE_XLSX].astype(object)
+        lote = lote.where(lote.notna(), None)
+        for linha in lote.itertuples(index=False, name=None):
+            aba.append(linha)
+
+
+@instrumentar("exportar_excel_streaming")
+def exportar_excel_streaming(destino, relatorio, coluna_grupo, df_final=None):
+    """Mesmo conteúdo de exportar_excel, gravado linha a linha com o EscritorXlsx"""
+    escritor = EscritorXlsx(destino)
+    if df_final is not None:
+        escritor.escrever(df_final)
+    escritor.adicionar_aba("Consolidado", relatorio_com_total(relatorio, coluna_grupo))
+    escritor.fechar()
+
+
+@instrumentar("exportar_tabela")
+def exportar_tabela(df, destino, formato):
+    """Grava uma tabela em Parquet, Arrow IPC ou CSV gzip (caminho ou stream binário)"""
+    df = df.rename(columns=str)
+
+    if formato == "csv.gz":
+        df.to_csv(destino, index=False, compression={"method": "gzip"})
+        return
+
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Exportação em Parquet/Arrow requer o pacote pyarrow (pip install pyarrow)") from None
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(tabela, destino)
+    elif formato == "arrow":
+        with pa.ipc.new_file(destino, tabela.schema) as writer:
+            writer.write_table(tabela)
+    else:
+        raise ValueError(f"Formato de tabela desconhecido: {formato}")
+
+
+def exportar_relatorio(destino, formato, relatorio, coluna_grupo, df_final=None):
+    """
+    Grava detalhamento e consolidado no formato escolhido em FORMATOS_EXPORTACAO.
+
+    Os formatos colunares geram um zip com `detalhamento.<ext>` e
+    `consolidado.<ext>`; o consolidado vai sem a linha TOTAL para manter os
+    tipos das colunas.
+    """
+    if formato == "xlsx":
+        exportar_excel(destino, relatorio, coluna_grupo, df_final)
+    elif formato == "xlsx-streaming":
+        exportar_excel_streaming(destino, relatorio, coluna_grupo, df_final)
+    elif formato in FORMATOS_COLUNARES:
+        with zipfile.ZipFile(destino, "w", zipfile.ZIP_STORED) as pacote:
+            if df_final is not None:
+                with pacote.open(f"detalhamento.{formato}", "w") as arquivo:
+                    exportar_tabela(df_final, arquivo, formato)
+            with pacote.open(f"consolidado.{formato}", "w") as arquivo:
+                exportar_tabela(relatorio, arquivo, formato)
+    else:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+# ---------------- PROCESSAMENTO PARALELO ----------------
+
+def _processar_particao(particao, coluna_salario, coluna_grupo, parametros, colunas_parametros=None):
+    """Executado em um processo do pool: custos e somas parciais de uma partição"""
+    parametros = parametros_por_linha(particao, parametros, colunas_parametros)
+    resultados = calcular_colunas_custo(particao[coluna_salario], parametros)
+    parcial = agregar_por_grupo(
+        pd.concat([particao, resultados], axis=1), coluna_grupo, coluna_salario, parametros.get("centavos", False)
+    )
+    return resultados, parcial
+
+
+@instrumentar("processar_paralelo")
+def processar_paralelo(df_input, coluna_salario, coluna_grupo, parametros, n_workers=None, tamanho_particao=TAMANHO_PARTICAO_PADRAO, colunas_parametros=None, progresso=None):
+    """
+    Calcula e agrega a planilha em partições distribuídas em um ProcessPoolExecutor.
+
+    As partições têm tamanho fixo e são combinadas na ordem original, então o
+    resultado não depende do número de workers: com `n_workers=1` (execução
+    serial, sem pool) a saída é idêntica, bit a bit, à de qualquer outro
+    valor. Só as colunas de salário, de grupo e as de `colunas_parametros`
+    são enviadas aos processos. `progresso(partições prontas, total)` é
+    chamado à medida que as partições terminam, na ordem original.
+
+    Retorna (detalhamento, relatorio consolidado).
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    colunas = list(dict.fromkeys([coluna_salario, coluna_grupo, *(colunas_parametros or {}).values()]))
+    particoes = [
+        df_input[colunas].iloc[inicio:inicio + tamanho_particao]
+        for inicio in range(0, len(df_input), tamanho_particao)
+    ] or [df_input[colunas]]
+    argumentos = (
+        particoes,
+        [coluna_salario] * len(particoes),
+        [coluna_grupo] * len(particoes),
+        [parametros] * len(particoes),
+        [colunas_parametros] * len(particoes),
+    )
+
+    def acompanhar(saidas):
+        prontas = []
+        for saida in saidas:
+            prontas.append(saida)
+            if progresso is not None:
+                progresso(len(prontas), len(particoes))
+        return prontas
+
+    if n_workers == 1 or len(particoes) == 1:
+        saidas = acompanhar(map(_processar_particao, *argumentos))
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(particoes))) as executor:
+            saidas = acompanhar(executor.map(_processar_particao, *argumentos))
+
+    with etapa("pd.concat partições"):
+        resultados = pd.concat([r for r, _ in saidas])
+        agregado = pd.concat([p for _, p in saidas]).groupby(level=0, sort=True).sum()
+        df_final = pd.concat([df_input, resultados], axis=1)
+    return df_final, finalizar_relatorio(agregado, parametros.get("centavos", False))
+
+
+def medir_speedup(df_input, coluna_salario, coluna_grupo, parametros, workers=(1, 2, 4, 8), tamanho_particao=TAMANHO_PARTICAO_PADRAO, colunas_parametros=None):
+    """
+    Tempo de processar_paralelo para cada número de workers.
+
+    A referência é sempre a execução serial (`n_workers=1`), medida uma vez
+    mesmo que 1 não esteja em `workers`. Retorna um DataFrame com segundos,
+    speed-up e eficiência em relação a ela, e se o relatório consolidado
+    saiu idêntico ao serial.
+    """
+    def executar(n):
+        inicio = time.perf_counter()
+        _, relatorio = processar_paralelo(
+            df_input, coluna_salario, coluna_grupo, parametros, n, tamanho_particao, colunas_parametros
+        )
+        return time.perf_counter() - inicio, relatorio
+
+    referencia = executar(1)
+    linhas = []
+    for n in workers:
+        segundos, relatorio = referencia if n == 1 else executar(n)
+        linhas.append({
+            "Workers": n,
+            "Segundos": segundos,
+            "Speed-up": referencia[0] / segundos,
+            "Eficiência": referencia[0] / segundos / n,
+            "Idêntico ao serial": relatorio.equals(referencia[1]),
+        })
+    return pd.DataFrame(linhas)
+
+# ---------------- RENDERIZAÇÃO ----------------
+LIMITE_GRUPOS_GRAFICO = 30
+TAMANHOS_PAGINA = (100, 500, 1000)
+
+
+def top_n_com_outros(relatorio, coluna_grupo, n=LIMITE_GRUPOS_GRAFICO, coluna_valor="Custo Total Anual"):
+    """
+    Os `n` grupos de maior `coluna_valor` e uma linha "Outros" com a soma do resto.
+
+    Mantém o gráfico com no máximo n + 1 barras, qualquer que seja o número
+    de grupos. A coluna do grupo vira texto para o eixo ser categórico.
+    """
+    ordenado = relatorio.sort_values(coluna_valor, ascending=False)
+    topo = ordenado.head(n).reset_index(drop=True)
+    topo[coluna_grupo] = topo[coluna_grupo].astype(str)
+    resto = ordenado.iloc[n:]
+    if resto.empty:
+        return topo
+
+    outros = resto.drop(columns=coluna_grupo).sum(numeric_only=True).to_frame().T
+    outros.insert(0, coluna_grupo, f"Outros ({len(resto)} grupos)")
+    return pd.concat([topo, outros.astype(topo.dtypes.to_dict())], ignore_index=True)
+
+
+def pagina(df, numero, tamanho=TAMANHOS_PAGINA[0]):
+    """
+    Linhas da página `numero` (a partir de 1) de `df`.
+
+    O número é limitado ao intervalo válido. Retorna (linhas, número da
+    página mostrada, total de páginas).
+    """
+    total_paginas = max(1, -(-len(df) // tamanho))
+    numero = min(max(1, int(numero)), total_paginas)
+    return df.iloc[(numero - 1) * tamanho:numero * tamanho], numero, total_paginas
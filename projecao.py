@@ -0,0 +1,304 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from calculo import REGIMES
+from instrumentacao import instrumentar
+from processamento import parametros_por_linha
+from tabelas import TABELAS_TRIBUTARIAS
+
+MESES_PROJECAO_PADRAO = 24
+MES_DISSIDIO_PADRAO = 5
+TAMANHO_BLOCO_PROJECAO = 10_000
+
+# Desembolso de cada mês, na ordem das colunas da projeção
+COMPONENTES_PROJECAO = (
+    "valor_nota_fiscal",
+    "salario",
+    "decimo_terceiro",
+    "ferias",
+    "fgts",
+    "multa_fgts",
+    "inss_patronal",
+    "rat",
+    "terceiros",
+    "vale_transporte",
+    "beneficios",
+)
+
+ROTULOS_PROJECAO = {
+    "valor_nota_fiscal": "Nota Fiscal (PJ)",
+    "salario": "Salário",
+    "decimo_terceiro": "13º Salário",
+    "ferias": "Férias",
+    "fgts": "FGTS",
+    "multa_fgts": "Multa FGTS (40%)",
+    "inss_patronal": "INSS Patronal",
+    "rat": "RAT",
+    "terceiros": "Terceiros/Sistema S",
+    "vale_transporte": "Vale Transporte",
+    "beneficios": "Benefícios",
+}
+
+# ---------------- RESULTADO ----------------
+
+class ProjecaoCustos(NamedTuple):
+    """
+    Projeção mês a mês de uma folha.
+
+    `custo` é a matriz funcionários × meses do desembolso total; `componentes`
+    traz, por mês, a soma da folha em cada parcela de COMPONENTES_PROJECAO;
+    `ativos` é o número de funcionários ativos em cada mês.
+    """
+    meses: pd.PeriodIndex
+    custo: np.ndarray
+    componentes: pd.DataFrame
+    ativos: np.ndarray
+
+# ---------------- AUXILIARES ----------------
+
+def _coluna(valor, dtype=float):
+    """Parâmetro como coluna (n, 1) para combinar com os meses; escalares passam direto"""
+    valor = np.asarray(valor, dtype=dtype)
+    return valor[:, None] if valor.ndim else valor
+
+
+def _mes_absoluto(datas, n, padrao):
+    """
+    Mês absoluto (ano * 12 + mês - 1) de cada data, como coluna; datas vazias viram `padrao`.
+
+    Aceita datas, texto ISO (aaaa-mm-dd) ou dd/mm/aaaa; outro texto levanta ValueError.
+    """
+    if datas is None:
+        return np.full((n, 1), padrao)
+    if np.ndim(datas) == 0:
+        datas = [datas] * n
+    serie = pd.Series(datas).reset_index(drop=True)
+    vazias = serie.isna() | serie.astype(str).str.strip().eq("")
+    try:
+        convertidas = pd.to_datetime(serie.mask(vazias), format="ISO8601")
+    except ValueError:
+        convertidas = pd.to_datetime(serie.mask(vazias), format="%d/%m/%Y", errors="coerce")
+        invalidas = convertidas.isna() & ~vazias
+        if invalidas.any():
+            nome = f" na coluna '{serie.name}'" if serie.name is not None else ""
+            raise ValueError(f"Data inválida{nome}: {serie[invalidas].iloc[0]} (use dd/mm/aaaa ou aaaa-mm-dd)") from None
+    meses = (convertidas.dt.year * 12 + convertidas.dt.month - 1).to_numpy(dtype=float)
+    return np.where(np.isnan(meses), padrao, meses)[:, None]
+
+
+def _teto_por_ano(anos):
+    """
+    Teto do INSS de cada ano.
+
+    Anos depois da última tabela cadastrada repetem a última (e anteriores à
+    primeira, a primeira): a projeção não inventa tabelas futuras.
+    """
+    cadastrados = sorted(TABELAS_TRIBUTARIAS)
+    return np.array([
+        TABELAS_TRIBUTARIAS[max([a for a in cadastrados if a <= ano], default=cadastrados[0])].teto_inss
+        for ano in anos
+    ])
+
+# ---------------- PROJEÇÃO MENSAL ----------------
+
+def _projetar_bloco(salario, regime, incluir, n_pass, v_pass, beneficios, rat_perc, terceiros_perc, t, teto, adm, desl, reajuste_perc, mes_dissidio, mes_ferias, competencia):
+    """Parcelas (n × meses) de um bloco de funcionários; todos os argumentos já fatiados"""
+    n = len(salario)
+    t0 = t[0]
+    mes = t % 12 + 1
+    ano = t // 12
+
+    if np.ndim(regime):
+        lucro = _coluna(regime == REGIMES[1], bool)
+        clt = _coluna(regime == REGIMES[0], bool) | lucro
+    else:
+        clt, lucro = "CLT" in regime, regime == REGIMES[1]
+
+    ativo = (t >= adm) & (t <= desl)
+    ativo_clt = ativo & clt
+    saida = t == desl
+
+    # Reajuste no mês do dissídio, contado a partir do início da projeção ou da admissão
+    dissidio = _coluna(mes_dissidio) - 1
+    referencia = np.maximum(adm, t0)
+    crescimento = 1 + _coluna(reajuste_perc) / 100
+
+    def salario_no_mes(meses):
+        reajustes = np.floor((meses - dissidio) / 12) - np.floor((referencia - dissidio) / 12)
+        return salario[:, None] * crescimento ** np.maximum(reajustes, 0)
+
+    s = salario_no_mes(t)
+    zero = np.zeros((n, len(t)))
+    parcelas = dict.fromkeys(COMPONENTES_PROJECAO, zero)
+
+    parcelas["valor_nota_fiscal"] = np.where(ativo & ~clt, s, 0.0)
+    parcelas["salario"] = salario_clt = np.where(ativo_clt, s, 0.0)
+
+    provisiona = ativo_clt & _coluna(incluir, bool)
+    if competencia:
+        # Provisões mensais, como em calcular_custos
+        decimo = np.where(provisiona, s / 12, 0.0)
+        ferias = np.where(provisiona, s / 12 + s / 3 / 12, 0.0)
+    else:
+        # 13º: 1ª parcela em novembro, 2ª em dezembro (ou na rescisão), por avos do ano
+        inicio_ano = ano * 12
+        avos = np.clip(np.minimum(desl, inicio_ano + 11) - np.maximum(adm, inicio_ano) + 1, 0, 12) / 12
+        primeira = (mes == 11) & ~saida
+        quitacao = (mes == 12) | saida
+        ja_adiantado = np.where((mes == 12) & (adm <= t - 1), 0.5 * salario_no_mes(t - 1), 0.0)
+        decimo = (
+            np.where(provisiona & primeira, 0.5 * s * avos, 0.0)
+            + np.where(provisiona & quitacao, (s - ja_adiantado) * avos, 0.0)
+        )
+
+        # Férias: 1/3 no mês de gozo, a partir de 12 meses de casa; proporcionais + 1/3 na rescisão
+        if mes_ferias is None:
+            admissao_conhecida = np.isfinite(adm)
+            mes_ferias = np.where(admissao_conhecida, np.mod(np.where(admissao_conhecida, adm, 0), 12) + 1, 1)
+        else:
+            mes_ferias = _coluna(mes_ferias)
+        gozo = (mes == mes_ferias) & (t - adm >= 12)
+        desl_finito = np.where(np.isfinite(desl), desl, 0)
+        ultimo_gozo = desl_finito - np.mod(desl_finito - (mes_ferias - 1), 12)
+        ultimo_gozo = np.where(ultimo_gozo - adm >= 12, ultimo_gozo, adm)
+        proporcao = np.clip(desl - ultimo_gozo, 0, 12) / 12
+        ferias = (
+            np.where(provisiona & gozo, s / 3, 0.0)
+            + np.where(provisiona & saida, s * 4 / 3 * proporcao, 0.0)
+        )
+    parcelas["decimo_terceiro"] = decimo
+    parcelas["ferias"] = ferias
+
+    if competencia:
+        parcelas["fgts"] = fgts = salario_clt * 0.08
+        parcelas["multa_fgts"] = fgts * 0.40
+    else:
+        parcelas["fgts"] = (salario_clt + decimo + ferias) * 0.08
+        # Saldo estimado com o salário da rescisão: 8% sobre 12 salários, o 13º e o 1/3 por ano
+        servico = desl - np.where(np.isfinite(adm), adm, t0) + 1
+        parcelas["multa_fgts"] = np.where(ativo_clt & saida, 0.40 * 0.08 * s * servico * (1 + 1 / 12 + 1 / 36), 0.0)
+
+    if np.any(lucro):
+        if competencia:
+            base = np.minimum(salario_clt, teto)
+        else:
+            base = np.minimum(salario_clt + ferias, teto) + np.minimum(decimo, teto)
+        base = np.where(lucro, base, 0.0)
+        parcelas["inss_patronal"] = base * 0.20
+        parcelas["rat"] = base * (_coluna(rat_perc) / 100)
+        parcelas["terceiros"] = base * (_coluna(terceiros_perc) / 100)
+
+    vt_total = _coluna(n_pass) * _coluna(v_pass) * 22
+    parcelas["vale_transporte"] = np.where(ativo_clt, np.maximum(0, vt_total - np.minimum(vt_total, s * 0.06)), 0.0)
+    parcelas["beneficios"] = np.where(ativo, beneficios, 0.0)
+
+    return parcelas, ativo
+
+
+@instrumentar("projetar_custos")
+def projetar_custos(salarios, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, inicio=None, meses=MESES_PROJECAO_PADRAO, reajuste_perc=0.0, mes_dissidio=MES_DISSIDIO_PADRAO, admissao=None, desligamento=None, mes_ferias=None, competencia=False):
+    """
+    Desembolso mês a mês de cada funcionário durante `meses` meses a partir de `inicio`.
+
+    A folha é avaliada como uma matriz funcionários × meses, sem laço por
+    funcionário nem por mês (só por blocos de TAMANHO_BLOCO_PROJECAO linhas,
+    para limitar a memória). Os parâmetros são os de calcular_custos_lote e
+    qualquer um pode ser um array por funcionário, além de:
+
+    - `inicio`: primeiro mês ("AAAA-MM", data ou Period; padrão: mês atual);
+    - `reajuste_perc` e `mes_dissidio`: reajuste anual aplicado no mês do
+      dissídio, a partir do início da projeção ou da admissão;
+    - `admissao` e `desligamento`: datas por funcionário (vazio = já
+      contratado / sem desligamento); fora desse intervalo não há custo;
+    - `mes_ferias`: mês de gozo das férias (padrão: mês da admissão);
+    - `competencia`: com True, 13º, férias e multa do FGTS são provisionados
+      todo mês como em calcular_custos; com False (padrão), são pagos quando
+      acontecem: 13º em novembro e dezembro, 1/3 de férias no mês de gozo,
+      verbas proporcionais e multa do FGTS na rescisão.
+
+    O teto do INSS patronal segue a tabela do ano de cada mês. Diferente de
+    "Custo Total Mensal", o desembolso inclui o salário bruto dos CLT.
+    """
+    salario = np.asarray(salarios, dtype=float)
+    n = len(salario)
+    periodo = pd.Period(pd.Timestamp.today() if inicio is None else inicio, freq="M")
+    t = periodo.year * 12 + periodo.month - 1 + np.arange(meses)
+    teto = _teto_por_ano(t // 12)
+    adm = _mes_absoluto(admissao, n, -np.inf)
+    desl = _mes_absoluto(desligamento, n, np.inf)
+    beneficios = _coluna(vr) + _coluna(va) + _coluna(saude) + _coluna(odonto) + _coluna(seguro) + _coluna(home) + _coluna(epi) + _coluna(outros)
+
+    custo = np.zeros((n, meses))
+    totais = dict.fromkeys(COMPONENTES_PROJECAO, 0.0)
+    ativos = np.zeros(meses, dtype="int64")
+
+    if np.ndim(regime):
+        regime = np.asarray(regime, dtype=object)
+
+    def fatia(valor, linhas):
+        return np.asarray(valor)[linhas] if np.ndim(valor) else valor
+
+    for inicio_bloco in range(0, n, TAMANHO_BLOCO_PROJECAO):
+        linhas = slice(inicio_bloco, inicio_bloco + TAMANHO_BLOCO_PROJECAO)
+        parcelas, ativo = _projetar_bloco(
+            salario[linhas], fatia(regime, linhas),
+            fatia(incluir, linhas), fatia(n_pass, linhas), fatia(v_pass, linhas), fatia(beneficios, linhas),
+            fatia(rat_perc, linhas), fatia(terceiros_perc, linhas), t, teto,
+            adm[linhas], desl[linhas], fatia(reajuste_perc, linhas), fatia(mes_dissidio, linhas),
+            fatia(mes_ferias, linhas), competencia
+        )
+        destino = custo[linhas]
+        for nome in COMPONENTES_PROJECAO:
+            destino += parcelas[nome]
+            totais[nome] = totais[nome] + parcelas[nome].sum(axis=0)
+        ativos += ativo.sum(axis=0)
+
+    indice = pd.period_range(periodo, periods=meses, freq="M", name="Mês")
+    componentes = pd.DataFrame(
+        {nome: np.broadcast_to(totais[nome], meses) for nome in COMPONENTES_PROJECAO}, index=indice
+    )
+    return ProjecaoCustos(indice, custo, componentes, ativos)
+
+
+def projetar_planilha(df_input, coluna_salario, parametros, colunas_parametros=None, coluna_admissao=None, coluna_desligamento=None, **opcoes):
+    """
+    projetar_custos de uma planilha, com os parâmetros por funcionário de parametros_por_linha.
+
+    Dependentes e ano da tabela não entram: a projeção não calcula o líquido
+    e usa a tabela do ano de cada mês.
+    """
+    efetivos = parametros_por_linha(df_input, parametros, colunas_parametros)
+    efetivos = {nome: valor for nome, valor in efetivos.items() if nome not in ("dependentes", "ano", "centavos")}
+    return projetar_custos(
+        df_input[coluna_salario], **efetivos,
+        admissao=None if coluna_admissao is None else df_input[coluna_admissao],
+        desligamento=None if coluna_desligamento is None else df_input[coluna_desligamento],
+        **opcoes
+    )
+
+# ---------------- RESUMOS ----------------
+
+def tabela_mensal(projecao):
+    """Parcelas com rótulos de exibição, o total e os ativos de cada mês"""
+    tabela = projecao.componentes.rename(columns=ROTULOS_PROJECAO)
+    tabela = tabela.loc[:, (tabela != 0).any()]
+    tabela["Desembolso Total"] = projecao.componentes.sum(axis=1)
+    tabela["Funcionários Ativos"] = projecao.ativos
+    return tabela
+
+
+def resumo_anual(projecao):
+    """Soma de cada parcela e do total por ano civil, com a média de ativos"""
+    tabela = tabela_mensal(projecao)
+    anos = tabela.index.year
+    resumo = tabela.drop(columns="Funcionários Ativos").groupby(anos).sum()
+    resumo["Média de Ativos"] = tabela["Funcionários Ativos"].groupby(anos).mean()
+    resumo.index.name = "Ano"
+    return resumo
+
+
+def custo_por_grupo(projecao, grupos):
+    """Desembolso de cada grupo (linhas) em cada mês (colunas)"""
+    return pd.DataFrame(projecao.custo, columns=projecao.meses).groupby(np.asarray(grupos)).sum()
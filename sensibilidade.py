@@ -0,0 +1,179 @@
+"""
+Sensibilidade (custo marginal) de cada funcionário.
+
+Custo Total Mensal e salário líquido são lineares por partes nas entradas:
+as faixas de INSS e IRRF, o teto do INSS patronal e o limite de 6% do
+desconto de VT só trocam a inclinação. Por isso as derivadas saem
+analiticamente, numa única passada vetorizada: a faixa de cada linha é
+localizada com searchsorted, como no cálculo, e a derivada é a inclinação
+do trecho em que o funcionário está, sem recalcular os custos com as
+entradas perturbadas.
+
+Nos pontos de quebra exatos vale o trecho de baixo, a mesma convenção das
+tabelas (o limite pertence à faixa que ele fecha).
+"""
+import numpy as np
+import pandas as pd
+
+from instrumentacao import instrumentar
+from processamento import parametros_por_linha
+from tabelas import ANO_PADRAO, obter_tabela
+
+# Entrada -> rótulo de exibição (unidade da variação)
+ENTRADAS_SENSIBILIDADE = {
+    "salario": "Salário (R$)",
+    "dependentes": "Dependentes (1)",
+    "beneficios": "Benefícios (R$)",
+    "n_pass": "Passagens por dia (1)",
+    "v_pass": "Valor da passagem (R$)",
+    "rat_perc": "RAT (p.p.)",
+    "terceiros_perc": "Terceiros (p.p.)",
+}
+
+SAIDAS_SENSIBILIDADE = {
+    "custo_mensal": "Custo Total Mensal",
+    "salario_liquido": "Salário Líquido",
+}
+
+PROVISOES = 1 / 12 + 1 / 12 + 1 / 3 / 12   # 13º + férias + 1/3, por real de salário
+FGTS_COM_MULTA = 0.08 * 1.40
+
+# ---------------- DERIVADAS ----------------
+
+def _inclinacoes_encargos(salario, dependentes, tabela):
+    """d INSS / d salário, d IRRF / d salário e d IRRF / d dependentes com as faixas de `tabela`"""
+    a = tabela._arrays
+    faixa_inss = np.minimum(np.searchsorted(a["limites_inss"], salario, side="left"), len(tabela.limites_inss) - 1)
+    d_inss = np.where((salario > 0) & (salario <= tabela.teto_inss), a["aliquotas_inss"][faixa_inss], 0.0)
+
+    base = salario - tabela.inss_lote(salario) - dependentes * tabela.deducao_dependente
+    faixa_irrf = np.searchsorted(a["limites_irrf"], base, side="left")
+    aliquota = a["aliquotas_irrf"][faixa_irrf]
+    # Fora do max(0, ...) o imposto não reage à entrada
+    aliquota = np.where(base * aliquota - a["deducoes_irrf"][faixa_irrf] > 0, aliquota, 0.0)
+    return d_inss, aliquota * (1 - d_inss), -aliquota * tabela.deducao_dependente
+
+
+def _derivadas_regime(d, salario, regime, incluir, n_pass, v_pass, rat_perc, terceiros_perc, dependentes, ano):
+    """Preenche `d` ((saída, entrada) -> array) para linhas de um único regime"""
+    n = len(salario)
+    d["custo_mensal", "beneficios"][:] = 1.0
+
+    if "CLT" not in regime:
+        d["custo_mensal", "salario"][:] = 1.0
+        d["salario_liquido", "salario"][:] = 0.85  # Estimativa
+        return
+
+    def coluna(valor):
+        return np.broadcast_to(np.asarray(valor, dtype=float), (n,))
+
+    n_pass, v_pass = coluna(n_pass), coluna(v_pass)
+    vt_total = (n_pass * v_pass) * 22
+    # Desconto de VT = min(VT, 6% do salário): segue o salário até alcançar o VT, depois segue o VT
+    segue_salario = salario * 0.06 <= vt_total
+    d_desconto_salario = np.where(segue_salario, 0.06, 0.0)
+    d_desconto_vt = np.where(segue_salario, 0.0, 1.0)
+
+    d_custo = np.where(np.asarray(incluir, dtype=bool), PROVISOES, 0.0) + FGTS_COM_MULTA - d_desconto_salario - 1.0
+    d_custo_vt = 1.0 - d_desconto_vt   # custo do VT = VT - desconto
+
+    d_inss, d_irrf, d_irrf_dependentes = np.zeros(n), np.zeros(n), np.zeros(n)
+    teto = np.empty(n)
+    anos = np.broadcast_to(np.asarray(ano), (n,)) if np.ndim(ano) else None
+    for valor in (pd.unique(anos) if anos is not None else [ano]):
+        tabela = obter_tabela(valor)
+        linhas = slice(None) if anos is None else anos == valor
+        d_inss[linhas], d_irrf[linhas], d_irrf_dependentes[linhas] = _inclinacoes_encargos(
+            salario[linhas], coluna(dependentes)[linhas], tabela
+        )
+        teto[linhas] = tabela.teto_inss
+
+    if regime == "CLT (Lucro Presumido/Real)":
+        rat, terceiros = coluna(rat_perc) / 100, coluna(terceiros_perc) / 100
+        base_inss = np.minimum(salario, teto)
+        d_custo += np.where(salario <= teto, 0.20 + rat + terceiros, 0.0)
+        d["custo_mensal", "rat_perc"][:] = base_inss / 100
+        d["custo_mensal", "terceiros_perc"][:] = base_inss / 100
+
+    d["custo_mensal", "salario"][:] = d_custo
+    d["custo_mensal", "n_pass"][:] = d_custo_vt * 22 * v_pass
+    d["custo_mensal", "v_pass"][:] = d_custo_vt * 22 * n_pass
+
+    d["salario_liquido", "salario"][:] = 1.0 - d_inss - d_irrf - d_desconto_salario
+    d["salario_liquido", "dependentes"][:] = -d_irrf_dependentes
+    d["salario_liquido", "n_pass"][:] = -d_desconto_vt * 22 * v_pass
+    d["salario_liquido", "v_pass"][:] = -d_desconto_vt * 22 * n_pass
+
+
+@instrumentar("sensibilidades_lote")
+def sensibilidades_lote(salarios, regime, incluir, n_pass, v_pass, vr=0.0, va=0.0, saude=0.0, odonto=0.0, seguro=0.0, home=0.0, epi=0.0, outros=0.0, rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=ANO_PADRAO):
+    """
+    Derivadas do Custo Total Mensal e do salário líquido de cada funcionário
+    em relação a cada entrada de ENTRADAS_SENSIBILIDADE.
+
+    Os parâmetros são os de calcular_custos_lote (qualquer um pode ser um
+    array por funcionário). Os benefícios entram somados: cada um deles tem
+    a mesma derivada, a de "beneficios". RAT e Terceiros variam em pontos
+    percentuais; dependentes e passagens, de um em um, tratados como
+    contínuos. Multiplicar a derivada por uma variação dá o impacto exato
+    enquanto o funcionário não muda de faixa.
+
+    Devolve um DataFrame com colunas (saída, entrada), em SAIDAS_SENSIBILIDADE
+    × ENTRADAS_SENSIBILIDADE, e NaN nas linhas de salário vazio. Se
+    `salarios` for uma Series, o índice é preservado.
+    """
+    indice = salarios.index if isinstance(salarios, pd.Series) else None
+    salario = np.asarray(salarios, dtype=float)
+    colunas = pd.MultiIndex.from_product([list(SAIDAS_SENSIBILIDADE), list(ENTRADAS_SENSIBILIDADE)])
+
+    # Uma linha da matriz por coluna, como em calcular_custos_lote
+    matriz = np.zeros((len(colunas), len(salario)))
+    d = dict(zip(colunas, matriz))
+
+    parametros = dict(
+        incluir=incluir, n_pass=n_pass, v_pass=v_pass, rat_perc=rat_perc,
+        terceiros_perc=terceiros_perc, dependentes=dependentes, ano=ano,
+    )
+    if np.ndim(regime):
+        codigos, regimes = pd.factorize(np.asarray(regime))
+        for codigo, valor in enumerate(regimes):
+            linhas = np.flatnonzero(codigos == codigo)
+            parcial = {chave: np.zeros(len(linhas)) for chave in d}
+            _derivadas_regime(
+                parcial, salario[linhas], str(valor),
+                **{nome: np.asarray(p)[linhas] if np.ndim(p) else p for nome, p in parametros.items()}
+            )
+            for chave, valores in parcial.items():
+                d[chave][linhas] = valores
+    else:
+        _derivadas_regime(d, salario, regime, **parametros)
+
+    matriz[:, np.isnan(salario)] = np.nan
+    return pd.DataFrame(matriz.T, index=indice, columns=colunas, copy=False)
+
+
+def sensibilidades_planilha(df_input, coluna_salario, parametros, colunas_parametros=None):
+    """sensibilidades_lote de uma planilha, com os parâmetros por funcionário de parametros_por_linha"""
+    efetivos = parametros_por_linha(df_input, parametros, colunas_parametros)
+    efetivos = {nome: valor for nome, valor in efetivos.items() if nome != "centavos"}
+    return sensibilidades_lote(df_input[coluna_salario], **efetivos)
+
+# ---------------- RESUMOS ----------------
+
+def resumo_sensibilidades(sensibilidades, grupos=None):
+    """
+    Derivadas da folha: soma das derivadas dos funcionários de cada grupo e
+    uma linha TOTAL (só ela, sem `grupos`). A soma é a variação do custo do
+    grupo quando a entrada muda igualmente para todos os seus funcionários.
+    """
+    total = sensibilidades.sum().to_frame("TOTAL").T
+    if grupos is None:
+        return total
+    por_grupo = sensibilidades.groupby(np.asarray(grupos)).sum()
+    return pd.concat([por_grupo, total])
+
+
+def tabela_sensibilidades(resumo, saida="custo_mensal"):
+    """Colunas de uma saída de resumo_sensibilidades (ou sensibilidades_lote) com os rótulos de exibição"""
+    tabela = resumo[saida].rename(columns=ENTRADAS_SENSIBILIDADE)
+    return tabela.loc[:, (tabela != 0).any()]
@@ -0,0 +1,296 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from calculo import REGIMES
+from instrumentacao import instrumentar
+from processamento import parametros_por_linha
+from tabelas import ANO_PADRAO, obter_tabela
+
+CENARIOS_PADRAO = 100_000
+ELEMENTOS_POR_LOTE = 4_000_000  # cenários × (grupos + 1) avaliados de uma vez
+BINS_HISTOGRAMA = 4096
+PERCENTIS_PADRAO = (5, 25, 50, 75, 95)
+
+# Provisões de 13º e férias + 1/3 por real de salário, como em calcular_custos
+_PROVISOES = 1 / 12 + 1 / 12 + 1 / 3 / 12
+
+# ---------------- INCERTEZAS ----------------
+
+class Incerteza(NamedTuple):
+    """Variável incerta: normal(media, desvio) cortada em [minimo, maximo]; desvio 0 = valor fixo"""
+    media: float = 0.0
+    desvio: float = 0.0
+    minimo: float = -np.inf
+    maximo: float = np.inf
+
+    def amostrar(self, rng, n):
+        if self.desvio == 0:
+            return np.full(n, float(np.clip(self.media, self.minimo, self.maximo)))
+        return np.clip(rng.normal(self.media, self.desvio, n), self.minimo, self.maximo)
+
+
+class Incertezas(NamedTuple):
+    """
+    Entradas incertas de uma simulação (percentuais).
+
+    - `crescimento`: variação dos salários no horizonte do planejamento;
+    - `inflacao_saude`: reajuste do plano de saúde;
+    - `demissao`: probabilidade de um CLT sair demitido sem justa causa, o
+      que dispara a multa de 40% do FGTS (100% = provisão integral, como no
+      cálculo determinístico); o número de demitidos de cada grupo é sorteado
+      por binomial;
+    - `rat`: reclassificação do RAT, {RAT (%): probabilidade}; None mantém o
+      RAT de cada funcionário.
+    """
+    crescimento: Incerteza = Incerteza()
+    inflacao_saude: Incerteza = Incerteza()
+    demissao: Incerteza = Incerteza(100.0, 0.0, 0.0, 100.0)
+    rat: dict = None
+
+# ---------------- CURVA DE CUSTO DO GRUPO ----------------
+
+class CurvaGrupo(NamedTuple):
+    """
+    Custo Total Mensal de um grupo como função do fator salarial m.
+
+    Somando calcular_custos em todos os funcionários, o custo do grupo é
+    linear em m, exceto pelo teto do INSS patronal (min(m·s, teto)) e pelo
+    limite de 6% do VT; cada funcionário contribui com um ponto de quebra
+    para cada um. Os pontos ficam ordenados com somas acumuladas, então
+    cada cenário custa dois searchsorted, qualquer que seja o tamanho do
+    grupo.
+    """
+    clt: int                 # funcionários CLT (sorteio das demissões)
+    linear: float            # coeficiente de m fora do INSS patronal e do VT
+    fixo: float              # benefícios
+    saude: float             # parte de `fixo` sujeita à inflação do plano de saúde
+    multa: float             # multa do FGTS provisionada, por unidade de m
+    quebras_teto: np.ndarray  # teto/s dos CLT Lucro Presumido/Real, ordenados
+    teto_antes: np.ndarray   # [peso·teto acumulado antes do ponto] para os pesos (1, rat, 20% + terceiros)
+    salario_depois: np.ndarray  # [peso·s acumulado a partir do ponto] para os mesmos pesos
+    quebras_vt: np.ndarray   # vt/(6%·s) dos CLT, ordenados
+    vt_depois: np.ndarray    # vt acumulado a partir do ponto
+    desconto_depois: np.ndarray  # 6%·s acumulado a partir do ponto
+
+
+def _acumulado_depois(valores):
+    """Soma de valores[k:] para k = 0..len, com zero no final"""
+    return np.append(np.cumsum(valores[::-1])[::-1], 0.0)
+
+
+def _acumulado_antes(valores):
+    """Soma de valores[:k] para k = 0..len"""
+    return np.concatenate([[0.0], np.cumsum(valores)])
+
+
+def montar_curva(salario, regime, incluir, n_pass, v_pass, vr, va, saude, odonto, seguro, home, epi, outros, rat_perc=2.0, terceiros_perc=5.8, ano=ANO_PADRAO):
+    """CurvaGrupo dos funcionários `salario`; os parâmetros podem ser arrays por funcionário"""
+    salario = np.asarray(salario, dtype=float)
+    n = len(salario)
+
+    def vetor(valor, dtype=float):
+        return np.broadcast_to(np.asarray(valor, dtype=dtype), n)
+
+    regime = vetor(regime, object)
+    lucro = regime == REGIMES[1]
+    clt = (regime == REGIMES[0]) | lucro
+    saude = vetor(saude)
+    beneficios = vetor(vr) + vetor(va) + saude + vetor(odonto) + vetor(seguro) + vetor(home) + vetor(epi) + vetor(outros)
+
+    codigos, anos = pd.factorize(vetor(ano, "int64"))
+    teto = np.array([obter_tabela(a).teto_inss for a in anos])[codigos]
+
+    # Provisões + FGTS + multa - salário (CLT, como em calcular_custos) e Nota Fiscal (PJ)
+    provisoes = np.where(vetor(incluir, bool), _PROVISOES, 0.0)
+    linear = np.where(clt, salario * (provisoes + 0.08 + 0.08 * 0.40 - 1), salario)
+
+    vt = (vetor(n_pass) * vetor(v_pass) * 22)[clt]
+    # Salário zero: quebra infinita (NaN com VT zero), ordenada depois das demais
+    with np.errstate(divide="ignore", invalid="ignore"):
+        quebras_teto = teto[lucro] / salario[lucro]
+        quebras_vt = vt / (0.06 * salario[clt])
+
+    ordem = np.argsort(quebras_teto)
+    s_lucro, teto_lucro = salario[lucro][ordem], teto[lucro][ordem]
+    pesos = np.stack([
+        np.ones(len(s_lucro)),
+        vetor(rat_perc)[lucro][ordem] / 100,
+        0.20 + vetor(terceiros_perc)[lucro][ordem] / 100,
+    ])
+
+    ordem_vt = np.argsort(quebras_vt)
+
+    return CurvaGrupo(
+        clt=int(clt.sum()),
+        linear=float(linear.sum()),
+        fixo=float(beneficios.sum()),
+        saude=float(saude.sum()),
+        multa=float((salario[clt] * 0.08 * 0.40).sum()),
+        quebras_teto=quebras_teto[ordem],
+        teto_antes=np.stack([_acumulado_antes(p * teto_lucro) for p in pesos]),
+        salario_depois=np.stack([_acumulado_depois(p * s_lucro) for p in pesos]),
+        quebras_vt=quebras_vt[ordem_vt],
+        vt_depois=_acumulado_depois(vt[ordem_vt]),
+        desconto_depois=_acumulado_depois(0.06 * salario[clt][ordem_vt]),
+    )
+
+
+def custo_da_curva(curva, fator, inflacao_saude=0.0, fracao_multa=1.0, rat_perc=None):
+    """
+    Custo Total Mensal do grupo para arrays de cenários.
+
+    `fator` multiplica todos os salários; `inflacao_saude` (%) reajusta o
+    plano de saúde; `fracao_multa` é a fração da multa do FGTS que de fato
+    acontece; `rat_perc` (%), se dado, substitui o RAT de todos.
+    """
+    fator = np.asarray(fator, dtype=float)
+
+    # Funcionários com teto/s < m batem no teto; os demais pagam sobre m·s
+    k = np.searchsorted(curva.quebras_teto, fator, side="left")
+    base = curva.teto_antes[:, k] + fator * curva.salario_depois[:, k]
+    encargos = base[2] + (base[1] if rat_perc is None else base[0] * (np.asarray(rat_perc) / 100))
+
+    # VT: vt - 6%·m·s enquanto m < vt/(6%·s), zero depois
+    j = np.searchsorted(curva.quebras_vt, fator, side="right")
+    vt = curva.vt_depois[j] - fator * curva.desconto_depois[j]
+
+    return (
+        curva.linear * fator
+        - curva.multa * fator * (1 - np.asarray(fracao_multa))
+        + curva.fixo + curva.saude * (np.asarray(inflacao_saude) / 100)
+        + encargos + vt
+    )
+
+# ---------------- SIMULAÇÃO EM LOTES ----------------
+
+def _simular_lote(curvas, incertezas, semente, n, faixas=None):
+    """
+    Sorteia `n` cenários e avalia o custo mensal de cada grupo e do total.
+
+    Sem `faixas`, devolve (mínimo, máximo, soma, soma dos quadrados) de cada
+    linha; com `faixas` (mínimos, máximos), devolve o histograma de cada
+    linha em BINS_HISTOGRAMA faixas iguais.
+    """
+    rng = np.random.default_rng(semente)
+    fator = 1 + incertezas.crescimento.amostrar(rng, n) / 100
+    inflacao = incertezas.inflacao_saude.amostrar(rng, n)
+    demissao = incertezas.demissao.amostrar(rng, n) / 100
+    rat = None
+    if incertezas.rat:
+        valores, probabilidades = zip(*incertezas.rat.items())
+        probabilidades = np.asarray(probabilidades, dtype=float)
+        rat = rng.choice(np.asarray(valores, dtype=float), n, p=probabilidades / probabilidades.sum())
+
+    custos = np.empty((len(curvas) + 1, n))
+    for linha, curva in enumerate(curvas):
+        demitidos = rng.binomial(curva.clt, demissao) / curva.clt if curva.clt else 1.0
+        custos[linha] = custo_da_curva(curva, fator, inflacao, demitidos, rat)
+    custos[-1] = custos[:-1].sum(axis=0)
+
+    if faixas is None:
+        return custos.min(axis=1), custos.max(axis=1), custos.sum(axis=1), (custos ** 2).sum(axis=1)
+
+    minimos, maximos = faixas
+    largura = np.where(maximos > minimos, maximos - minimos, 1.0)
+    posicao = ((custos - minimos[:, None]) / largura[:, None] * BINS_HISTOGRAMA).astype("int64")
+    posicao = np.clip(posicao, 0, BINS_HISTOGRAMA - 1) + np.arange(len(custos))[:, None] * BINS_HISTOGRAMA
+    return np.bincount(posicao.ravel(), minlength=len(custos) * BINS_HISTOGRAMA).reshape(len(custos), -1)
+
+
+def _percentis_do_histograma(contagens, minimo, maximo, percentis):
+    """Percentis por interpolação linear dentro da faixa do histograma"""
+    if maximo <= minimo:
+        return np.full(len(percentis), minimo)
+    acumulado = np.cumsum(contagens)
+    alvo = np.asarray(percentis) / 100 * acumulado[-1]
+    faixa = np.minimum(np.searchsorted(acumulado, alvo, side="left"), len(contagens) - 1)
+    antes = np.where(faixa > 0, acumulado[faixa - 1], 0)
+    dentro = np.where(contagens[faixa] > 0, (alvo - antes) / np.maximum(contagens[faixa], 1), 0.0)
+    largura = (maximo - minimo) / len(contagens)
+    return minimo + (faixa + dentro) * largura
+
+
+class ResultadoSimulacao(NamedTuple):
+    """
+    Faixas de custo de uma simulação.
+
+    `mensal` e `anual` têm uma linha por grupo e uma TOTAL, com média, desvio
+    e os percentis pedidos. `histograma_total` é (bordas, contagens) do custo
+    mensal total, para gráficos.
+    """
+    mensal: pd.DataFrame
+    anual: pd.DataFrame
+    histograma_total: tuple
+    cenarios: int
+
+
+@instrumentar("simular_custos")
+def simular_custos(curvas, incertezas=Incertezas(), cenarios=CENARIOS_PADRAO, semente=None, percentis=PERCENTIS_PADRAO, tamanho_lote=None, n_workers=0):
+    """
+    Simulação de Monte Carlo do custo mensal e anual de cada grupo.
+
+    `curvas` é {grupo: CurvaGrupo}. Os cenários são sorteados em lotes de
+    `tamanho_lote` (padrão: ELEMENTOS_POR_LOTE dividido pelo número de
+    grupos), cada um com uma semente filha de `semente`
+    (SeedSequence.spawn): o resultado é reprodutível e não depende de
+    `n_workers`. Com `n_workers` > 1 os lotes vão para um ProcessPoolExecutor.
+
+    A memória fica limitada a um lote: uma primeira passada acha mínimo,
+    máximo, média e desvio de cada grupo e a segunda, com as mesmas
+    sementes, monta um histograma de BINS_HISTOGRAMA faixas de onde saem os
+    percentis (erro menor que uma faixa). O custo anual é 12 vezes o mensal,
+    como no cálculo determinístico.
+    """
+    nomes = list(curvas)
+    curvas = list(curvas.values())
+    tamanho_lote = tamanho_lote or max(1_000, ELEMENTOS_POR_LOTE // (len(curvas) + 1))
+    tamanhos = [min(tamanho_lote, cenarios - inicio) for inicio in range(0, cenarios, tamanho_lote)]
+    sementes = np.random.SeedSequence(semente).spawn(len(tamanhos))
+
+    def executar(faixas=None):
+        argumentos = ([curvas] * len(tamanhos), [incertezas] * len(tamanhos), sementes, tamanhos,
+                      [faixas] * len(tamanhos))
+        n = min(n_workers or 1, len(tamanhos))
+        if n <= 1:
+            return list(map(_simular_lote, *argumentos))
+        with ProcessPoolExecutor(max_workers=n) as executor:
+            return list(executor.map(_simular_lote, *argumentos))
+
+    parciais = executar()
+    minimos = np.min([p[0] for p in parciais], axis=0)
+    maximos = np.max([p[1] for p in parciais], axis=0)
+    media = np.sum([p[2] for p in parciais], axis=0) / cenarios
+    desvio = np.sqrt(np.maximum(np.sum([p[3] for p in parciais], axis=0) / cenarios - media ** 2, 0.0))
+    contagens = np.sum(executar((minimos, maximos)), axis=0)
+
+    linhas = {}
+    for i, nome in enumerate(nomes + ["TOTAL"]):
+        valores = _percentis_do_histograma(contagens[i], minimos[i], maximos[i], percentis)
+        linhas[nome] = {"Média": media[i], "Desvio": desvio[i], **{f"P{p:g}": v for p, v in zip(percentis, valores)}}
+
+    mensal = pd.DataFrame.from_dict(linhas, orient="index")
+    bordas = np.linspace(minimos[-1], max(maximos[-1], minimos[-1]), BINS_HISTOGRAMA + 1)
+    return ResultadoSimulacao(mensal, mensal * 12, (bordas, contagens[-1]), cenarios)
+
+
+def simular_planilha(df_input, coluna_salario, coluna_grupo, parametros, colunas_parametros=None, **opcoes):
+    """simular_custos com uma CurvaGrupo por grupo da planilha e os parâmetros de parametros_por_linha"""
+    efetivos = parametros_por_linha(df_input, parametros, colunas_parametros)
+    efetivos = {nome: valor for nome, valor in efetivos.items() if nome not in ("dependentes", "centavos")}
+    salario = df_input[coluna_salario].to_numpy(dtype=float)
+    validas = ~np.isnan(salario)
+
+    codigos, grupos = pd.factorize(df_input[coluna_grupo])
+    curvas = {}
+    for codigo, grupo in enumerate(grupos):
+        linhas = (codigos == codigo) & validas
+        curvas[grupo] = montar_curva(
+            salario[linhas], **{nome: valor[linhas] if np.ndim(valor) else valor for nome, valor in efetivos.items()}
+        )
+    resultado = simular_custos(curvas, **opcoes)
+    for tabela in (resultado.mensal, resultado.anual):
+        tabela.index.name = coluna_grupo
+    return resultado
@@ -0,0 +1,164 @@
+import hashlib
+from bisect import bisect_left
+from dataclasses import dataclass
+from functools import cached_property
+
+# ---------------- TABELAS TRIBUTÁRIAS ----------------
+
+@dataclass(frozen=True)
+class TabelaTributaria:
+    """
+    Faixas de INSS do empregado e de IRRF mensal de um ano.
+
+    As tabelas são imutáveis e criadas uma única vez. Os valores acumulados de
+    INSS no início de cada faixa são pré-calculados, então cada consulta é um
+    bisect seguido de uma multiplicação e uma soma. Os métodos `*_lote`
+    aplicam as mesmas faixas a arrays NumPy com searchsorted.
+    """
+    ano: int
+    salario_minimo: float
+    limites_inss: tuple        # limite superior de cada faixa; o último é o teto
+    aliquotas_inss: tuple
+    limites_irrf: tuple        # limite superior de cada faixa, exceto a última
+    aliquotas_irrf: tuple
+    deducoes_irrf: tuple
+    deducao_dependente: float = 189.59
+
+    @property
+    def teto_inss(self):
+        return self.limites_inss[-1]
+
+    @cached_property
+    def versao(self):
+        """Impressão digital das faixas e valores: muda quando a tabela do ano é corrigida"""
+        return hashlib.sha256(repr(self).encode()).hexdigest()[:12]
+
+    @cached_property
+    def _bases_inss(self):
+        return (0.0,) + self.limites_inss[:-1]
+
+    @cached_property
+    def _acumulado_inss(self):
+        acumulado = [0.0]
+        for base, limite, aliquota in zip(self._bases_inss, self.limites_inss, self.aliquotas_inss):
+            acumulado.append(acumulado[-1] + (limite - base) * aliquota)
+        return tuple(acumulado[:-1])
+
+    # -------- Escalar --------
+
+    def inss(self, salario):
+        """INSS progressivo do empregado"""
+        base = min(max(salario, 0.0), self.teto_inss)
+        i = bisect_left(self.limites_inss, base)
+        return self._acumulado_inss[i] + (base - self._bases_inss[i]) * self.aliquotas_inss[i]
+
+    def irrf(self, salario, dependentes=0, inss=None):
+        """IRRF mensal; aceita o INSS já calculado para não repeti-lo"""
+        if inss is None:
+            inss = self.inss(salario)
+        base = salario - inss - (dependentes * self.deducao_dependente)
+        i = bisect_left(self.limites_irrf, base)
+        return max(0.0, base * self.aliquotas_irrf[i] - self.deducoes_irrf[i])
+
+    def salarios_limite_irrf(self, dependentes=0):
+        """
+        Salários brutos em que a base do IRRF (salário - INSS - dependentes)
+        cruza cada limite de faixa. A base é linear por partes no salário, então
+        cada limite é invertido dentro da faixa de INSS em que cai.
+        """
+        deducao = dependentes * self.deducao_dependente
+        salarios = []
+        for limite_irrf in self.limites_irrf:
+            for base, limite, aliquota, acumulado in zip(self._bases_inss, self.limites_inss, self.aliquotas_inss, self._acumulado_inss):
+                salario = (limite_irrf + deducao + acumulado - base * aliquota) / (1 - aliquota)
+                if base <= salario <= limite:
+                    salarios.append(salario)
+                    break
+            else:
+                salarios.append(limite_irrf + deducao + self.inss(self.teto_inss))
+        return tuple(salarios)
+
+    # -------- Vetorizado --------
+
+    @cached_property
+    def _arrays(self):
+        # numpy só é importado quando o caminho vetorizado é usado
+        import numpy as np
+        return {
+            "limites_inss": np.array(self.limites_inss),
+            "bases_inss": np.array(self._bases_inss),
+            "acumulado_inss": np.array(self._acumulado_inss),
+            "aliquotas_inss": np.array(self.aliquotas_inss),
+            "limites_irrf": np.array(self.limites_irrf),
+            "aliquotas_irrf": np.array(self.aliquotas_irrf),
+            "deducoes_irrf": np.array(self.deducoes_irrf),
+        }
+
+    def inss_lote(self, salarios):
+        """Versão vetorizada de `inss`"""
+        import numpy as np
+        a = self._arrays
+        base = np.clip(np.asarray(salarios, dtype=float), 0.0, self.teto_inss)
+        # salário vazio (NaN) cai depois do teto: limita o índice e o resultado sai NaN
+        i = np.minimum(np.searchsorted(a["limites_inss"], base, side="left"), len(self.limites_inss) - 1)
+        return a["acumulado_inss"][i] + (base - a["bases_inss"][i]) * a["aliquotas_inss"][i]
+
+    def irrf_lote(self, salarios, dependentes=0, inss=None):
+        """Versão vetorizada de `irrf`"""
+        import numpy as np
+        a = self._arrays
+        salarios = np.asarray(salarios, dtype=float)
+        if inss is None:
+            inss = self.inss_lote(salarios)
+        base = salarios - inss - (np.asarray(dependentes, dtype=float) * self.deducao_dependente)
+        i = np.searchsorted(a["limites_irrf"], base, side="left")
+        return np.maximum(0.0, base * a["aliquotas_irrf"][i] - a["deducoes_irrf"][i])
+
+
+_IRRF_2024 = dict(
+    limites_irrf=(2259.20, 2826.65, 3751.05, 4664.68),
+    aliquotas_irrf=(0.0, 0.075, 0.15, 0.225, 0.275),
+    deducoes_irrf=(0.0, 169.44, 381.44, 662.77, 896.00),
+)
+
+TABELAS_TRIBUTARIAS = {
+    2024: TabelaTributaria(
+        ano=2024,
+        salario_minimo=1412.00,
+        limites_inss=(1412.00, 2666.68, 4000.03, 7786.02),
+        aliquotas_inss=(0.075, 0.09, 0.12, 0.14),
+        **_IRRF_2024,
+    ),
+    # Mantém os valores que a calculadora sempre usou: teto e salário mínimo
+    # de 2025 com as faixas intermediárias de INSS e a tabela de IRRF de 2024.
+    2025: TabelaTributaria(
+        ano=2025,
+        salario_minimo=1518.00,
+        limites_inss=(1412.00, 2666.68, 4000.03, 8157.41),
+        aliquotas_inss=(0.075, 0.09, 0.12, 0.14),
+        **_IRRF_2024,
+    ),
+    # IRRF pela tabela vigente desde maio/2025; o redutor da Lei 15.270/2025
+    # não é modelado.
+    2026: TabelaTributaria(
+        ano=2026,
+        salario_minimo=1621.00,
+        limites_inss=(1621.00, 2902.84, 4354.27, 8475.55),
+        aliquotas_inss=(0.075, 0.09, 0.12, 0.14),
+        limites_irrf=(2428.80, 2826.65, 3751.05, 4664.68),
+        aliquotas_irrf=(0.0, 0.075, 0.15, 0.225, 0.275),
+        deducoes_irrf=(0.0, 182.16, 394.16, 675.49, 908.73),
+    ),
+}
+
+ANO_PADRAO = 2025
+
+
+def obter_tabela(ano=ANO_PADRAO):
+    """Tabela tributária do ano; erro claro se o ano não estiver cadastrado"""
+    try:
+        return TABELAS_TRIBUTARIAS[int(ano)]
+    except (KeyError, TypeError, ValueError):
+        # Ano vazio (NaN) ou não numérico numa coluna mapeada cai no mesmo erro
+        anos = ", ".join(str(a) for a in TABELAS_TRIBUTARIAS)
+        raise ValueError(f"Tabela tributária de {ano} não cadastrada (disponíveis: {anos})") from None
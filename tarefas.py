@@ -0,0 +1,262 @@
+"""
+Fila de tarefas em segundo plano para os cálculos longos de planilha.
+
+Uma FilaTarefas executa as funções enviadas em threads próprias, no máximo
+`max_simultaneas` ao mesmo tempo (as demais esperam na fila), e guarda o
+estado, o progresso e o resultado de cada tarefa para consulta posterior
+por id. A função recebe um argumento `progresso(fracao, mensagem)` para
+informar o andamento; ele também é o ponto em que um pedido de
+cancelamento interrompe a tarefa.
+
+O app compartilha uma única fila entre todas as sessões (limitando o
+cálculo simultâneo de vários usuários) e a CLI usa a mesma fila com
+`--progresso`.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from processamento import (
+    TAMANHO_BLOCO_PADRAO,
+    exportar_excel,
+    exportar_relatorio,
+    ler_blocos_de_varios,
+    processar_paralelo,
+    processar_para_temporario,
+)
+
+MAX_TAREFAS_SIMULTANEAS = int(os.environ.get("CUSTO_CLT_TAREFAS", 2))
+MAX_TAREFAS_GUARDADAS = 20
+
+NA_FILA = "na fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluída"
+FALHOU = "falhou"
+CANCELADA = "cancelada"
+ESTADOS_FINAIS = (CONCLUIDA, FALHOU, CANCELADA)
+
+
+class TarefaCancelada(Exception):
+    """Levantada dentro da tarefa, no próximo aviso de progresso, quando ela é cancelada"""
+
+# ---------------- TAREFA ----------------
+
+class Tarefa:
+    """
+    Estado de uma tarefa enviada à fila.
+
+    `progresso` vai de 0 a 1 (None quando o total não é conhecido, como na
+    leitura em blocos); `metadados` guarda o que quem enviou precisar para
+    reconhecer o resultado depois.
+    """
+
+    def __init__(self, descricao="", metadados=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.descricao = descricao
+        self.metadados = metadados or {}
+        self.estado = NA_FILA
+        self.progresso = 0.0
+        self.mensagem = "aguardando na fila"
+        self.criada = time.time()
+        self.iniciada = None
+        self.terminada = None
+        self.resultado = None
+        self.erro = None
+        self._cancelar = threading.Event()
+        self._fim = threading.Event()
+        self._futuro = None
+
+    @property
+    def terminou(self):
+        return self.estado in ESTADOS_FINAIS
+
+    def duracao(self):
+        """Segundos de execução até agora (ou até o fim)"""
+        if self.iniciada is None:
+            return 0.0
+        return (self.terminada or time.time()) - self.iniciada
+
+    def avisar(self, fracao=None, mensagem=None):
+        """Callback `progresso` entregue à função da tarefa"""
+        if self._cancelar.is_set():
+            raise TarefaCancelada()
+        self.progresso = None if fracao is None else min(max(float(fracao), 0.0), 1.0)
+        if mensagem is not None:
+            self.mensagem = mensagem
+
+
+def _liberar(tarefa):
+    """Fecha os arquivos do resultado de uma tarefa descartada (os temporários somem do disco)"""
+    if isinstance(tarefa.resultado, dict):
+        for valor in tarefa.resultado.values():
+            if callable(getattr(valor, "close", None)):
+                valor.close()
+
+# ---------------- FILA ----------------
+
+class FilaTarefas:
+    """Executa tarefas em até `max_simultaneas` threads e guarda as últimas `max_guardadas` terminadas"""
+
+    def __init__(self, max_simultaneas=MAX_TAREFAS_SIMULTANEAS, max_guardadas=MAX_TAREFAS_GUARDADAS):
+        self.max_simultaneas = max_simultaneas
+        self.max_guardadas = max_guardadas
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneas, thread_name_prefix="tarefa")
+        self._tarefas = OrderedDict()
+        self._trava = threading.Lock()
+
+    def enviar(self, funcao, *args, descricao="", metadados=None, **kwargs):
+        """Põe `funcao(*args, progresso=..., **kwargs)` na fila e devolve o id da tarefa"""
+        tarefa = Tarefa(descricao, metadados)
+        with self._trava:
+            self._tarefas[tarefa.id] = tarefa
+            self._podar()
+        tarefa._futuro = self._executor.submit(self._executar, tarefa, funcao, args, kwargs)
+        return tarefa.id
+
+    def _executar(self, tarefa, funcao, args, kwargs):
+        if tarefa._cancelar.is_set():
+            self._terminar(tarefa, CANCELADA, "cancelada antes de começar")
+            return
+        tarefa.estado = EXECUTANDO
+        tarefa.iniciada = time.time()
+        tarefa.mensagem = "iniciando"
+        try:
+            tarefa.resultado = funcao(*args, progresso=tarefa.avisar, **kwargs)
+        except TarefaCancelada:
+            self._terminar(tarefa, CANCELADA, "cancelada")
+        except Exception as erro:  # o erro fica na tarefa para quem consultar
+            tarefa.erro = erro
+            self._terminar(tarefa, FALHOU, str(erro))
+        else:
+            tarefa.progresso = 1.0
+            self._terminar(tarefa, CONCLUIDA, "concluída")
+
+    def _terminar(self, tarefa, estado, mensagem):
+        tarefa.estado = estado
+        tarefa.mensagem = mensagem
+        tarefa.terminada = time.time()
+        tarefa._fim.set()
+
+    def _podar(self):
+        """Descarta as terminadas mais antigas além de `max_guardadas`"""
+        terminadas = [t.id for t in self._tarefas.values() if t.terminou]
+        for id_tarefa in terminadas[:max(len(terminadas) - self.max_guardadas, 0)]:
+            _liberar(self._tarefas.pop(id_tarefa))
+
+    # -------- Consulta --------
+
+    def tarefa(self, id_tarefa):
+        """A Tarefa com esse id, ou None se não existe (ou já foi descartada)"""
+        with self._trava:
+            return self._tarefas.get(id_tarefa)
+
+    def listar(self):
+        with self._trava:
+            return list(self._tarefas.values())
+
+    def aguardar(self, id_tarefa, timeout=None):
+        """Espera a tarefa terminar e devolve o resultado; repassa o erro se ela falhou"""
+        tarefa = self.tarefa(id_tarefa)
+        if tarefa is None:
+            raise KeyError(f"Tarefa desconhecida: {id_tarefa}")
+        if not tarefa._fim.wait(timeout):
+            raise TimeoutError(f"Tarefa {id_tarefa} ainda em execução")
+        if tarefa.estado == FALHOU:
+            raise tarefa.erro
+        if tarefa.estado == CANCELADA:
+            raise TarefaCancelada(f"Tarefa {id_tarefa} cancelada")
+        return tarefa.resultado
+
+    def cancelar(self, id_tarefa):
+        """Pede o cancelamento; uma tarefa em execução para no próximo aviso de progresso"""
+        tarefa = self.tarefa(id_tarefa)
+        if tarefa is None or tarefa.terminou:
+            return False
+        tarefa._cancelar.set()
+        if tarefa._futuro is not None and tarefa._futuro.cancel():
+            self._terminar(tarefa, CANCELADA, "cancelada antes de começar")
+        return True
+
+    def remover(self, id_tarefa):
+        """Esquece uma tarefa terminada (e o resultado guardado)"""
+        with self._trava:
+            tarefa = self._tarefas.get(id_tarefa)
+            if tarefa is not None and tarefa.terminou:
+                _liberar(self._tarefas.pop(id_tarefa))
+                return True
+        return False
+
+    def encerrar(self, esperar=True):
+        self._executor.shutdown(wait=esperar, cancel_futures=not esperar)
+
+# ---------------- TAREFAS DE PLANILHA ----------------
+
+def calcular_planilha_tarefa(df_input, coluna_salario, coluna_grupo, parametros, colunas_parametros=None, formato="xlsx", n_workers=1, tamanho_particao=TAMANHO_BLOCO_PADRAO, progresso=None):
+    """
+    Detalhamento, consolidado e arquivo de exportação de uma planilha em memória.
+
+    Calcula em partições de `tamanho_particao` linhas com processar_paralelo
+    (em série com `n_workers=1`), avisando o progresso a cada partição.
+    Devolve um dicionário com df_final, relatorio, total_funcionarios,
+    exportacao (bytes no `formato` de FORMATOS_EXPORTACAO; None com
+    `formato=None`, quando quem chama grava a saída) e formato.
+    """
+    fracao_calculo = 1.0 if formato is None else 0.9
+
+    def por_particao(prontas, total):
+        if progresso is not None:
+            progresso(fracao_calculo * prontas / total, f"{prontas} de {total} partições calculadas")
+
+    df_final, relatorio = processar_paralelo(
+        df_input, coluna_salario, coluna_grupo, parametros, n_workers, tamanho_particao,
+        colunas_parametros, progresso=por_particao
+    )
+    exportacao = None
+    if formato is not None:
+        if progresso is not None:
+            progresso(fracao_calculo, "gerando o arquivo de exportação")
+        saida = BytesIO()
+        exportar_relatorio(saida, formato, relatorio, coluna_grupo, df_final)
+        exportacao = saida.getvalue()
+    return {
+        "df_final": df_final,
+        "relatorio": relatorio,
+        "total_funcionarios": len(df_final),
+        "exportacao": exportacao,
+        "formato": formato,
+    }
+
+
+def processar_arquivo_tarefa(entradas, coluna_salario, coluna_grupo, parametros, colunas_parametros=None, tamanho_bloco=TAMANHO_BLOCO_PADRAO, todas_abas=False, progresso=None):
+    """
+    Modo streaming como tarefa: lê as `entradas` ([(nome, bytes do arquivo)])
+    em blocos, uma após a outra, e grava o detalhamento num CSV gzip
+    temporário em disco (veja processar_para_temporario).
+
+    O total de linhas só é conhecido no fim, então o progresso informa as
+    linhas processadas. Devolve df_final=None, relatorio, total_funcionarios,
+    exportacao (consolidado em Excel) e detalhamento_csv_gz (arquivo
+    temporário aberto, fechado quando a tarefa é descartada).
+    """
+    def por_bloco(linhas, _):
+        if progresso is not None:
+            progresso(None, f"{linhas:,} linhas processadas")
+
+    relatorio, total, detalhamento = processar_para_temporario(
+        ler_blocos_de_varios([(nome, BytesIO(dados)) for nome, dados in entradas], tamanho_bloco, todas_abas),
+        coluna_salario, coluna_grupo, parametros, colunas_parametros, progresso=por_bloco
+    )
+    saida = BytesIO()
+    exportar_excel(saida, relatorio, coluna_grupo)
+    return {
+        "df_final": None,
+        "relatorio": relatorio,
+        "total_funcionarios": total,
+        "exportacao": saida.getvalue(),
+        "formato": "xlsx",
+        "detalhamento_csv_gz": detalhamento,
+    }
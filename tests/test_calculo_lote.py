@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from calculo import CAMPOS_CUSTOS, REGIMES, calcular_custos
+from calculo_lote import calcular_custos_lote, calcular_inss_funcionario_lote, calcular_irrf_lote
+from tabelas import TABELAS_TRIBUTARIAS, obter_tabela
+
+PARAMETROS = dict(
+    incluir=True, n_pass=2, v_pass=5.5, vr=550.0, va=250.0, saude=300.0, odonto=40.0,
+    seguro=25.0, home=100.0, epi=80.0, outros=10.0, rat_perc=3.0, terceiros_perc=5.8, dependentes=2,
+)
+
+
+def salarios_de_teste(ano):
+    """Grade com os limites das faixas, o teto do INSS e salários de zero a bem acima do teto"""
+    tabela = obter_tabela(ano)
+    return np.unique(np.r_[
+        0.0, 0.01, tabela.salario_minimo, tabela.limites_inss, tabela.teto_inss + 0.01,
+        tabela.limites_irrf, np.linspace(500.0, 60_000.0, 397),
+    ])
+
+
+def escalar(salarios, regime, **parametros):
+    return np.array([calcular_custos(s, regime, **parametros) for s in salarios])
+
+
+def test_lote_igual_ao_escalar_em_todo_regime_e_ano():
+    for ano in TABELAS_TRIBUTARIAS:
+        salarios = salarios_de_teste(ano)
+        for regime in REGIMES:
+            lote = calcular_custos_lote(salarios, regime, ano=ano, **PARAMETROS)
+            assert list(lote.columns) == list(CAMPOS_CUSTOS)
+            assert np.allclose(lote.to_numpy(), escalar(salarios, regime, ano=ano, **PARAMETROS), rtol=1e-12, atol=1e-9), (ano, regime)
+
+
+def test_lote_sem_provisoes_e_sem_vt():
+    parametros = {**PARAMETROS, "incluir": False, "n_pass": 0, "dependentes": 0}
+    salarios = salarios_de_teste(2025)
+    for regime in REGIMES:
+        lote = calcular_custos_lote(salarios, regime, **parametros)
+        assert np.allclose(lote.to_numpy(), escalar(salarios, regime, **parametros), rtol=1e-12, atol=1e-9), regime
+
+
+def test_parametros_por_funcionario():
+    rng = np.random.default_rng(7)
+    n = 600
+    salarios = rng.uniform(0.0, 25_000.0, n).round(2)
+    regimes = rng.choice(REGIMES, n)
+    anos = rng.choice(list(TABELAS_TRIBUTARIAS), n)
+    dependentes = rng.integers(0, 4, n)
+    vr = rng.choice([0.0, 550.0, 900.0], n)
+    parametros = {**PARAMETROS, "dependentes": dependentes, "vr": vr}
+
+    lote = calcular_custos_lote(salarios, regimes, ano=anos, **parametros).to_numpy()
+    esperado = np.array([
+        calcular_custos(
+            salarios[i], regimes[i], ano=anos[i],
+            **{**PARAMETROS, "dependentes": dependentes[i], "vr": vr[i]}
+        )
+        for i in range(n)
+    ])
+    assert np.allclose(lote, esperado, rtol=1e-12, atol=1e-9)
+
+
+def test_salario_vazio_vira_nan_e_indice_preservado():
+    salarios = pd.Series([3000.0, np.nan, 9000.0], index=[10, 20, 30])
+    lote = calcular_custos_lote(salarios, REGIMES[0], **PARAMETROS)
+    assert list(lote.index) == [10, 20, 30]
+    assert np.isnan(lote.loc[20, "custo_mensal"])
+    assert np.allclose(lote.loc[[10, 30]].to_numpy(), escalar([3000.0, 9000.0], REGIMES[0], **PARAMETROS))
+
+
+def test_inss_e_irrf_iguais_as_tabelas():
+    for ano in TABELAS_TRIBUTARIAS:
+        tabela = obter_tabela(ano)
+        salarios = salarios_de_teste(ano)
+        assert np.allclose(calcular_inss_funcionario_lote(salarios, ano), [tabela.inss(s) for s in salarios])
+        assert np.allclose(calcular_irrf_lote(salarios, 1, ano), [tabela.irrf(s, 1) for s in salarios])
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculo import COMPONENTES, REGIMES
+from calculo_lote import calcular_custos_lote
+from centavos import (
+    MEIO_PARA_CIMA,
+    MEIO_PARA_PAR,
+    TRUNCAR,
+    aplicar_fracao,
+    calcular_custos_centavos,
+    em_centavos,
+    em_reais,
+)
+from processamento import processar_paralelo, relatorio_com_total
+from tabelas import TABELAS_TRIBUTARIAS, obter_tabela
+
+PARAMETROS = dict(
+    incluir=True, n_pass=2, v_pass=5.55, vr=550.0, va=250.0, saude=300.33, odonto=40.0,
+    seguro=25.0, home=100.0, epi=80.0, outros=10.0, rat_perc=3.0, terceiros_perc=5.8, dependentes=2,
+)
+SALARIOS = np.random.default_rng(5).uniform(0.0, 40_000.0, 5000).round(2)
+
+
+def test_em_centavos_arredonda_o_valor_digitado():
+    assert em_centavos(12.345) == 1235
+    assert em_centavos(-12.345) == -1235
+    assert list(em_centavos([0.0, 0.004, 0.005, 1.10, 2.675])) == [0, 0, 1, 110, 268]
+
+
+def test_regras_de_arredondamento():
+    # 5 × 1/2 = 2,5 centavos; 7 × 1/2 = 3,5 centavos
+    assert list(aplicar_fracao(np.array([5, 7, -5]), 1, 2, MEIO_PARA_CIMA)) == [3, 4, -3]
+    assert list(aplicar_fracao(np.array([5, 7, -5]), 1, 2, MEIO_PARA_PAR)) == [2, 4, -2]
+    assert list(aplicar_fracao(np.array([5, 7, -5]), 1, 2, TRUNCAR)) == [2, 3, -2]
+    with pytest.raises(ValueError):
+        aplicar_fracao(np.array([5]), 1, 2, "banqueiro")
+
+
+def test_parcelas_a_menos_de_um_centavo_do_calculo_em_float():
+    for ano in TABELAS_TRIBUTARIAS:
+        faixas = len(obter_tabela(ano).limites_inss)
+        for regime in REGIMES:
+            exato = em_reais(calcular_custos_centavos(SALARIOS, regime, ano=ano, **PARAMETROS))
+            aproximado = calcular_custos_lote(SALARIOS, regime, ano=ano, **PARAMETROS)
+            diferenca = (exato - aproximado).abs().max()
+            assert (diferenca[list(COMPONENTES)] <= 0.01 + 1e-9).all(), (ano, regime)
+            # INSS arredondado faixa a faixa: até meio centavo por faixa
+            assert diferenca["inss_funcionario"] <= 0.005 * faixas + 1e-9, (ano, regime)
+
+
+def test_totais_fecham_com_as_parcelas():
+    for ano in TABELAS_TRIBUTARIAS:
+        for regime in REGIMES:
+            c = calcular_custos_centavos(SALARIOS, regime, ano=ano, **PARAMETROS)
+            assert all(str(tipo) == "Int64" for tipo in c.dtypes)
+            salario = em_centavos(SALARIOS)
+            soma = sum(c[campo].to_numpy(dtype=np.int64) for campo in COMPONENTES)
+            esperado = soma - salario if "CLT" in regime else soma
+            assert np.array_equal(c["custo_mensal"].to_numpy(dtype=np.int64), esperado), (ano, regime)
+            assert np.array_equal(c["custo_anual"].to_numpy(dtype=np.int64), esperado * 12), (ano, regime)
+            if "CLT" in regime:
+                liquido = salario - c["inss_funcionario"] - c["irrf_funcionario"] - c["desconto_vt"]
+                assert np.array_equal(c["salario_liquido"].to_numpy(dtype=np.int64), liquido.to_numpy(dtype=np.int64))
+
+
+def test_salario_vazio_fica_na():
+    c = calcular_custos_centavos(pd.Series([3000.0, np.nan], index=[7, 8]), REGIMES[1], **PARAMETROS)
+    assert list(c.index) == [7, 8]
+    assert c.loc[8].isna().all()
+    assert not c.loc[7].isna().any()
+
+
+def test_consolidado_fecha_com_o_detalhamento():
+    rng = np.random.default_rng(9)
+    df = pd.DataFrame({"salario": SALARIOS, "depto": rng.choice(["Vendas", "TI", "RH"], len(SALARIOS))})
+    parametros = {**PARAMETROS, "regime": REGIMES[1], "ano": 2025, "centavos": True}
+    detalhamento, relatorio = processar_paralelo(df, "salario", "depto", parametros, 1, tamanho_particao=700)
+
+    def centavos(valores):
+        return np.rint(np.asarray(valores) * 100).astype(np.int64)
+
+    por_grupo = detalhamento.groupby("depto")["Custo Total Mensal"].agg(lambda s: centavos(s).sum())
+    consolidado = relatorio.set_index("depto")["Custo Total Mensal"]
+    assert np.array_equal(centavos(consolidado.sort_index()), por_grupo.sort_index().to_numpy())
+
+    total = relatorio_com_total(relatorio, "depto").iloc[-1]
+    assert centavos(total["Custo Total Mensal"]) == centavos(detalhamento["Custo Total Mensal"]).sum()
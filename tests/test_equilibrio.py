@@ -0,0 +1,54 @@
+import numpy as np
+
+from calculo import REGIMES, calcular_custos
+from equilibrio import (
+    margem_para_salario,
+    salario_bruto_para_liquido,
+    salario_maximo_para_custo,
+    salario_maximo_para_margem,
+)
+from tabelas import TABELAS_TRIBUTARIAS
+
+PARAMETROS = dict(
+    incluir=True, n_pass=2, v_pass=5.5, vr=550.0, va=250.0, saude=300.0, odonto=0.0,
+    seguro=0.0, home=0.0, epi=0.0, outros=0.0, rat_perc=2.0, terceiros_perc=5.8, dependentes=1,
+)
+LIQUIDOS = np.array([1200.0, 2500.0, 4000.0, 7321.45, 15_000.0, 42_000.0])
+
+
+def test_bruto_para_liquido_volta_ao_liquido():
+    for ano in TABELAS_TRIBUTARIAS:
+        for regime in REGIMES:
+            brutos = salario_bruto_para_liquido(LIQUIDOS, regime, ano=ano, **PARAMETROS)
+            liquidos = [calcular_custos(b, regime, ano=ano, **PARAMETROS).salario_liquido for b in brutos]
+            assert np.allclose(liquidos, LIQUIDOS, rtol=0, atol=1e-6), (ano, regime)
+
+
+def test_bruto_para_liquido_e_o_menor_salario():
+    for regime in REGIMES:
+        brutos = salario_bruto_para_liquido(LIQUIDOS, regime, **PARAMETROS)
+        abaixo = [calcular_custos(b - 0.01, regime, **PARAMETROS).salario_liquido for b in brutos]
+        assert np.all(np.asarray(abaixo) < LIQUIDOS), regime
+
+
+def test_escalar_devolve_float():
+    bruto = salario_bruto_para_liquido(4000.0, REGIMES[0], **PARAMETROS)
+    assert isinstance(bruto, float)
+    assert abs(calcular_custos(bruto, REGIMES[0], **PARAMETROS).salario_liquido - 4000.0) < 1e-6
+
+
+def test_salario_maximo_para_custo_volta_ao_custo():
+    # Só no PJ o custo cresce com o salário; no CLT ele cai e qualquer salário cabe
+    alvos = np.array([1500.0, 5000.0, 12_345.67, 80_000.0])
+    salarios = salario_maximo_para_custo(alvos, "PJ", **PARAMETROS)
+    custos = [calcular_custos(s, "PJ", **PARAMETROS).custo_mensal for s in salarios]
+    assert np.allclose(custos, alvos, rtol=0, atol=1e-6)
+    assert np.isnan(salario_maximo_para_custo(0.0, "PJ", **PARAMETROS))
+    for regime in REGIMES[:2]:
+        assert np.isinf(salario_maximo_para_custo(5000.0, regime, **PARAMETROS))
+
+
+def test_margem_ida_e_volta():
+    receitas = np.array([10_000.0, 25_000.0, 60_000.0])
+    salarios = salario_maximo_para_margem(receitas, 30.0, "PJ", **PARAMETROS)
+    assert np.allclose(margem_para_salario(receitas, salarios, "PJ", **PARAMETROS), 30.0, rtol=0, atol=1e-9)
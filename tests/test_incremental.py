@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from incremental import CalculoIncremental
+from processamento import processar_paralelo
+
+PARAMETROS = dict(
+    regime="CLT (Lucro Presumido/Real)", incluir=True, n_pass=2, v_pass=5.5, vr=550.0, va=250.0,
+    saude=0.0, odonto=0.0, seguro=0.0, home=0.0, epi=0.0, outros=0.0,
+    rat_perc=2.0, terceiros_perc=5.8, dependentes=0, ano=2025,
+)
+
+
+def planilha(n=3000):
+    rng = np.random.default_rng(11)
+    df = pd.DataFrame({
+        "nome": [f"f{i}" for i in range(n)],
+        "salario": rng.uniform(1400.0, 30_000.0, n).round(2),
+        "depto": rng.choice(["Vendas", "TI", "RH", None], n),
+        "dependentes": rng.integers(0, 3, n).astype(float),
+    })
+    df.loc[[5, 17], "salario"] = np.nan
+    return df
+
+
+def conferir(incremental, df, parametros, colunas_parametros=None):
+    """Detalhamento idêntico e consolidado igual (a menos do arredondamento) ao de processar_paralelo"""
+    detalhamento, relatorio = processar_paralelo(df, "salario", "depto", parametros, 1, colunas_parametros=colunas_parametros)
+    pd.testing.assert_frame_equal(incremental.detalhamento(), detalhamento)
+    pd.testing.assert_frame_equal(
+        incremental.relatorio().set_index("depto").sort_index(),
+        relatorio.set_index("depto").sort_index(),
+        check_exact=False, rtol=1e-9,
+    )
+
+
+def test_carga_inicial_igual_ao_processamento_completo():
+    df = planilha()
+    conferir(CalculoIncremental(df, "salario", "depto", PARAMETROS), df, PARAMETROS)
+
+
+def test_sequencia_de_alteracoes_igual_ao_processamento_completo():
+    df = planilha()
+    incremental = CalculoIncremental(df, "salario", "depto", PARAMETROS)
+    parametros = dict(PARAMETROS)
+    for nome, valor in [
+        ("vr", 900.0), ("n_pass", 4), ("rat_perc", 3.0), ("incluir", False),
+        ("dependentes", 2), ("regime", "CLT (Simples Nacional)"), ("ano", 2026), ("regime", "PJ"),
+    ]:
+        parametros[nome] = valor
+        recalculados = incremental.atualizar(parametros)
+        assert recalculados
+        conferir(incremental, df, parametros)
+    assert incremental.atualizar(parametros) == ()
+
+
+def test_so_os_campos_dependentes_sao_recalculados():
+    df = planilha()
+    incremental = CalculoIncremental(df, "salario", "depto", PARAMETROS)
+    assert incremental.atualizar({**PARAMETROS, "vr": 700.0}) == ("vale_refeicao",)
+
+
+def test_parametro_mapeado_da_planilha():
+    df = planilha()
+    colunas = {"dependentes": "dependentes"}
+    incremental = CalculoIncremental(df, "salario", "depto", PARAMETROS, colunas)
+    conferir(incremental, df, PARAMETROS, colunas)
+    parametros = {**PARAMETROS, "v_pass": 6.0}
+    incremental.atualizar(parametros)
+    conferir(incremental, df, parametros, colunas)
+
+
+def test_troca_de_salarios():
+    df = planilha()
+    incremental = CalculoIncremental(df, "salario", "depto", PARAMETROS)
+    linhas = [0, 5, 42, 2999]
+    novos = [1800.0, 6500.0, np.nan, 25_000.0]
+    incremental.atualizar_salarios(linhas, novos)
+
+    alterado = df.copy()
+    alterado.loc[linhas, "salario"] = novos
+    conferir(incremental, alterado, PARAMETROS)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from calculo import REGIMES
+from calculo_lote import calcular_custos_lote
+from equilibrio import pontos_de_quebra
+from sensibilidade import ENTRADAS_SENSIBILIDADE, SAIDAS_SENSIBILIDADE, resumo_sensibilidades, sensibilidades_lote
+from tabelas import TABELAS_TRIBUTARIAS
+
+PARAMETROS = dict(
+    incluir=True, n_pass=2.0, v_pass=5.5, vr=550.0, va=250.0, saude=0.0, odonto=0.0,
+    seguro=0.0, home=0.0, epi=0.0, outros=0.0, rat_perc=2.0, terceiros_perc=5.8, dependentes=1.0,
+)
+# Entrada da sensibilidade -> parâmetro de calcular_custos_lote perturbado
+PERTURBADOS = {"dependentes": "dependentes", "beneficios": "vr", "n_pass": "n_pass", "v_pass": "v_pass",
+               "rat_perc": "rat_perc", "terceiros_perc": "terceiros_perc"}
+PASSO = 1e-3
+
+
+def salarios_longe_das_quebras(regime, ano):
+    """
+    Salários a mais de R$ 5 de qualquer ponto em que custo ou líquido mudam
+    de inclinação: o limite de 6% do VT anda ~R$ 2 com o PASSO em n_pass.
+    """
+    salarios = np.random.default_rng(2).uniform(100.0, 30_000.0, 3000).round(2)
+    quebras = pontos_de_quebra(regime, PARAMETROS["n_pass"], PARAMETROS["v_pass"], PARAMETROS["dependentes"], ano)
+    # O INSS patronal para no teto, que também é o último limite do INSS
+    distancia = np.abs(salarios[:, None] - quebras[None, :]).min(axis=1)
+    return salarios[distancia > 5.0]
+
+
+def diferenca_central(salarios, regime, ano, entrada):
+    """(custo mensal, salário líquido) por diferença central na `entrada`"""
+    def saidas(delta):
+        parametros = dict(PARAMETROS)
+        if entrada == "salario":
+            s = salarios + delta
+        else:
+            s = salarios
+            parametros[PERTURBADOS[entrada]] = parametros[PERTURBADOS[entrada]] + delta
+        r = calcular_custos_lote(s, regime, ano=ano, **parametros)
+        return r["custo_mensal"].to_numpy(), r["salario_liquido"].to_numpy()
+
+    (custo_mais, liquido_mais), (custo_menos, liquido_menos) = saidas(PASSO), saidas(-PASSO)
+    return (custo_mais - custo_menos) / (2 * PASSO), (liquido_mais - liquido_menos) / (2 * PASSO)
+
+
+def test_derivadas_iguais_as_diferencas_finitas():
+    for ano in TABELAS_TRIBUTARIAS:
+        for regime in REGIMES:
+            salarios = salarios_longe_das_quebras(regime, ano)
+            derivadas = sensibilidades_lote(salarios, regime, ano=ano, **PARAMETROS)
+            for entrada in ENTRADAS_SENSIBILIDADE:
+                custo, liquido = diferenca_central(salarios, regime, ano, entrada)
+                assert np.allclose(derivadas["custo_mensal", entrada], custo, rtol=1e-6, atol=1e-6), (ano, regime, entrada)
+                assert np.allclose(derivadas["salario_liquido", entrada], liquido, rtol=1e-6, atol=1e-6), (ano, regime, entrada)
+
+
+def test_regimes_por_funcionario_iguais_ao_regime_unico():
+    salarios = np.random.default_rng(4).uniform(1000.0, 20_000.0, 900).round(2)
+    regimes = np.array(REGIMES)[np.arange(len(salarios)) % len(REGIMES)]
+    misturado = sensibilidades_lote(salarios, regimes, **PARAMETROS)
+    for regime in REGIMES:
+        linhas = regimes == regime
+        assert np.allclose(misturado[linhas].to_numpy(), sensibilidades_lote(salarios[linhas], regime, **PARAMETROS).to_numpy())
+
+
+def test_formato_e_resumo():
+    salarios = pd.Series([3000.0, np.nan, 9000.0], index=[3, 4, 5])
+    derivadas = sensibilidades_lote(salarios, REGIMES[1], **PARAMETROS)
+    assert list(derivadas.index) == [3, 4, 5]
+    assert list(derivadas.columns) == [(s, e) for s in SAIDAS_SENSIBILIDADE for e in ENTRADAS_SENSIBILIDADE]
+    assert derivadas.loc[4].isna().all()
+
+    resumo = resumo_sensibilidades(derivadas, ["A", "B", "A"])
+    assert list(resumo.index) == ["A", "B", "TOTAL"]
+    assert np.allclose(resumo.loc["TOTAL"].to_numpy(), derivadas.sum().to_numpy())
+    assert np.allclose(resumo.loc["A"].to_numpy(), derivadas.loc[[3, 5]].sum().to_numpy())